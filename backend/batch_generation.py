@@ -0,0 +1,188 @@
+"""
+Batched, cached generation for offline jobs (evaluation, batch answering)
+- Prompts are sorted by token length and cut into batches (length bucketing),
+  so each batch is padded to a similar length
+- GenerationCache keeps generated text on disk as JSON lines, keyed by the
+  prompt, the generation settings and a hash of the model files: reruns only
+  generate prompts that changed, and an interrupted run resumes where it stopped
+- BatchGenerator runs the batches in this process, or in a pool of worker
+  processes that each load their own model and share the CPU cores
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+from tqdm import tqdm
+from structured_logging import get_logger
+
+log = get_logger("batch_generation")
+
+DEFAULT_BATCH_SIZE = 8
+
+
+def model_fingerprint(model_path):
+    """sha256 over the file names and contents of a model directory"""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(model_path):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, model_path).encode("utf-8"))
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+    return digest.hexdigest()
+
+
+class GenerationCache:
+    """prompt + settings + model hash → generated text, appended to a JSON lines file"""
+
+    def __init__(self, path, model_hash):
+        self.path = path
+        self.model_hash = model_hash
+        self._entries = {}
+        self._file = None
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Line cut off by an interrupted run
+                    self._entries[entry["key"]] = entry["text"]
+            log.info("Loaded %d cached generations from %s", len(self._entries), path)
+
+    def key(self, prompt, settings):
+        payload = json.dumps([self.model_hash, settings, prompt], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def put_many(self, items):
+        """Store (key, text) pairs and flush them to disk"""
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        for key, text in items:
+            self._entries[key] = text
+            self._file.write(json.dumps({"key": key, "text": text}, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def length_buckets(prompts, tokenizer, batch_size):
+    """Prompt indices grouped into batches of similar token length"""
+    lengths = [len(tokenizer.encode(prompt)) if tokenizer is not None else len(prompt.split()) for prompt in prompts]
+    order = sorted(range(len(prompts)), key=lambda i: lengths[i])
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def run_batch(generator, prompts, settings):
+    """Generated texts for one batch; a prompt that fails on its own gives None"""
+    try:
+        outputs = generator(prompts, batch_size=len(prompts), **settings)
+        # A pipeline returns one dict per prompt, or a list of dicts per prompt
+        return [(output[0] if isinstance(output, list) else output)["generated_text"] for output in outputs]
+    except Exception as e:
+        if len(prompts) == 1:
+            log.warning("Generation failed: %s", e)
+            return [None]
+        log.warning("Batch of %d failed (%s), generating its prompts one at a time", len(prompts), e)
+        return [run_batch(generator, [prompt], settings)[0] for prompt in prompts]
+
+
+def load_pipeline(model_path="./model", threads=None, seed=None):
+    """text2text pipeline as app.py builds it; threads limits torch's CPU threads (worker processes),
+    seed seeds python, numpy and torch in the process that loads it"""
+    import torch
+    from transformers import pipeline, set_seed
+    if threads:
+        torch.set_num_threads(threads)
+    if seed is not None:
+        set_seed(seed)
+    return pipeline("text2text-generation", model=model_path, tokenizer=model_path, max_new_tokens=500,
+                    device=0 if torch.cuda.is_available() else -1)
+
+
+def load_stub_generator(threads=None, seed=None):
+    from stub_models import StubGenerator
+    return StubGenerator()
+
+
+# ---- worker processes ----
+_worker_generator = None
+
+
+def _init_worker(loader, loader_kwargs):
+    global _worker_generator
+    _worker_generator = loader(**loader_kwargs)
+
+
+def _worker_batch(job):
+    batch, prompts, settings = job
+    return batch, run_batch(_worker_generator, prompts, settings)
+
+
+class BatchGenerator:
+    """generate(prompts, **settings) → one text (or None on failure) per prompt
+    generator / tokenizer: used in this process (workers=1)
+    loader: picklable function(threads=...) returning a generator, for workers > 1
+    cache: GenerationCache, or None"""
+
+    def __init__(self, generator, tokenizer, batch_size=DEFAULT_BATCH_SIZE, cache=None, workers=1,
+                 loader=None, loader_kwargs=None):
+        if workers > 1 and loader is None:
+            raise ValueError("workers > 1 needs a loader to build the generator in each worker")
+        self.generator = generator
+        self.tokenizer = tokenizer
+        self.batch_size = batch_size
+        self.cache = cache
+        self.workers = workers
+        self.loader = loader
+        self.loader_kwargs = loader_kwargs or {}
+        self.generated = 0
+        self.cached = 0
+
+    def generate(self, prompts, desc="Generating", **settings):
+        texts = [None] * len(prompts)
+        keys = [self.cache.key(prompt, settings) for prompt in prompts] if self.cache is not None else None
+        missing = []
+        for i, prompt in enumerate(prompts):
+            text = self.cache.get(keys[i]) if keys is not None else None
+            if text is None:
+                missing.append(i)
+            else:
+                texts[i] = text
+        self.cached += len(prompts) - len(missing)
+        if not missing:
+            return texts
+
+        batches = [[missing[i] for i in bucket]
+                   for bucket in length_buckets([prompts[i] for i in missing], self.tokenizer, self.batch_size)]
+        log.info("%s: %d cached, %d to generate in %d batches", desc, len(prompts) - len(missing), len(missing),
+                 len(batches))
+        jobs = [(batch, [prompts[i] for i in batch], settings) for batch in batches]
+
+        if self.workers > 1:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            context = multiprocessing.get_context("spawn")  # Fresh interpreters: no forked torch threads
+            with context.Pool(self.workers, initializer=_init_worker,
+                              initargs=(self.loader, {**self.loader_kwargs, "threads": threads})) as pool:
+                for batch, outputs in tqdm(pool.imap_unordered(_worker_batch, jobs), total=len(jobs), desc=desc):
+                    self._store(batch, outputs, texts, keys)
+        else:
+            for batch, batch_prompts, _ in tqdm(jobs, desc=desc):
+                self._store(batch, run_batch(self.generator, batch_prompts, settings), texts, keys)
+        return texts
+
+    def _store(self, batch, outputs, texts, keys):
+        for i, text in zip(batch, outputs):
+            texts[i] = text
+        self.generated += len(batch)
+        if keys is not None:
+            # Failed prompts are not cached, so the next run retries them
+            self.cache.put_many([(keys[i], text) for i, text in zip(batch, outputs) if text is not None])
@@ -0,0 +1,113 @@
+"""
+Benchmark: semantic off-domain gate
+
+Embeds corpus questions (in-domain, should pass) and a held-out set of
+off-domain messages (should be gated) with the retrieval encoder, then reports
+how often each is gated, the cost of a gate check on an existing query vector,
+and the generation time the gated off-domain messages would have cost.
+
+Usage (from backend/):
+    python benchmarks/bench_domain_gate.py [num_in_domain] [--generate]
+
+--generate times a few real chat_pipe generations to estimate the compute
+avoided per gated query (loads ./model).
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+from sentence_transformers import SentenceTransformer
+from domain_gate import DomainGate
+
+# Not in domain_prototypes.json
+OFF_DOMAIN_MESSAGES = [
+    "who is the best striker in the premier league",
+    "what time does the Arsenal game start",
+    "can you suggest a series to binge this weekend",
+    "what are the lyrics to my favourite song",
+    "my laptop keeps freezing what should I do",
+    "how do I install whatsapp on my phone",
+    "which matatu goes to Westlands",
+    "how much does a Toyota Vitz cost",
+    "is it going to be sunny this weekend",
+    "who is the president of Kenya",
+    "help me with my chemistry homework",
+    "how do I start a small business",
+    "what is the capital of France",
+    "tell me a joke",
+    "how do I make mandazi",
+    "what is the best programming language to learn",
+]
+
+GENERATION_PROMPT = (
+    "You are Eunoia, a warm, compassionate menstrual health companion.\n"
+    "Context: Menstrual cramps are caused by contractions of the uterus.\n"
+    "Question: {question}\nAnswer:"
+)
+
+
+def time_generation(questions):
+    from transformers import pipeline
+    chat_pipe = pipeline("text2text-generation", model="./model", tokenizer="./model", max_new_tokens=500)
+    chat_pipe(GENERATION_PROMPT.format(question=questions[0]))  # Warm-up
+    timings = []
+    for question in questions:
+        start = time.perf_counter()
+        chat_pipe(GENERATION_PROMPT.format(question=question), repetition_penalty=1.8, no_repeat_ngram_size=5,
+                  num_beams=4, early_stopping=True, temperature=0.85, top_p=0.9, do_sample=True)
+        timings.append(time.perf_counter() - start)
+    return float(np.mean(timings))
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    num_in_domain = int(args[0]) if args else 2000
+
+    embedder = SentenceTransformer("all-MiniLM-L6-v2")
+    encode = lambda texts: embedder.encode(texts, convert_to_numpy=True, batch_size=64)
+    gate = DomainGate.build(encode, cache_path="domain_gate_en.npz", encoder_id="all-MiniLM-L6-v2")
+
+    df = pd.read_csv("./menstrual_data.csv")
+    questions = df["question"].dropna().drop_duplicates().sample(frac=1.0, random_state=42)
+    questions = questions.head(num_in_domain).tolist()
+
+    in_vecs = encode(questions)
+    off_vecs = encode(OFF_DOMAIN_MESSAGES)
+
+    in_verdicts = [gate.score(v) for v in in_vecs]
+    off_verdicts = [gate.score(v) for v in off_vecs]
+
+    start = time.perf_counter()
+    for v in in_vecs:
+        gate.score(v)
+    check_us = (time.perf_counter() - start) / len(in_vecs) * 1e6
+
+    false_gates = [q for q, v in zip(questions, in_verdicts) if v.off_domain]
+    caught = sum(v.off_domain for v in off_verdicts)
+
+    print("=" * 60)
+    print(f"Domain gate (margin {gate.margin}, max in-domain {gate.max_in_domain})")
+    print("=" * 60)
+    print(f"In-domain questions gated:  {len(false_gates)}/{len(questions)} ({len(false_gates) / len(questions):.2%})")
+    print(f"Off-domain messages gated:  {caught}/{len(OFF_DOMAIN_MESSAGES)} ({caught / len(OFF_DOMAIN_MESSAGES):.2%})")
+    print(f"Gate check on an existing query vector: {check_us:.1f} µs")
+    for question in false_gates[:10]:
+        print(f"  false gate: {question[:80]!r}")
+    for message, verdict in zip(OFF_DOMAIN_MESSAGES, off_verdicts):
+        if not verdict.off_domain:
+            print(f"  missed: {message!r} (in {verdict.in_domain_score:.2f} / off {verdict.off_domain_score:.2f})")
+
+    if "--generate" in sys.argv:
+        avg_generation = time_generation(OFF_DOMAIN_MESSAGES[:5])
+        print(f"\nAverage generation: {avg_generation:.2f} s")
+        print(f"Generation time avoided for the {caught} gated off-domain messages: {avg_generation * caught:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark: Swahili retrieval via translate-then-retrieve vs the multilingual index
+
+Query set: `question_sw` from menstrual_data_sw.csv; the relevant rows for a query are
+all rows whose English answer equals the answer of the query's own row.
+
+- translate: translate_sw_to_en → all-MiniLM-L6-v2 → menstrual_index.faiss
+- multilingual: local multilingual encoder → menstrual_index_multilingual.faiss
+
+Usage (from backend/):
+    python benchmarks/bench_multilingual_retrieval.py [num_queries] [--output results.json]
+"""
+import os
+import sys
+import time
+import json
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+import numpy as np
+import pandas as pd
+import faiss
+from sentence_transformers import SentenceTransformer
+from build_multilingual_index import MULTILINGUAL_EMBEDDER_PATH
+from translation_utils import translate_sw_to_en, load_translation_models
+
+TOP_K_VALUES = [1, 3, 5, 10]
+RANDOM_SEED = 42
+
+
+def build_query_set(num_queries):
+    """Sample (swahili question, relevant row ids) pairs"""
+    df = pd.read_csv("./menstrual_data.csv")
+    df_sw = pd.read_csv("./menstrual_data_sw.csv")
+
+    answer_to_rows = {}
+    for row_id, answer in enumerate(df["answer"].fillna("").tolist()):
+        answer_to_rows.setdefault(answer, []).append(row_id)
+
+    questions_sw = df_sw["question_sw"].fillna("").tolist()
+    candidates = [row_id for row_id, q in enumerate(questions_sw) if q.strip()]
+    rng = np.random.default_rng(RANDOM_SEED)
+    sample = rng.choice(candidates, size=min(num_queries, len(candidates)), replace=False)
+
+    queries = []
+    for row_id in sample:
+        answer = df["answer"].iloc[row_id]
+        relevant = set(answer_to_rows.get(answer if isinstance(answer, str) else "", [row_id]))
+        queries.append((questions_sw[row_id], relevant))
+    return queries
+
+
+def search_translate(query, embedder, index, k):
+    """Current pipeline: sw→en translation, then English retrieval"""
+    query_en = translate_sw_to_en(query)
+    query_vec = embedder.encode([query_en], convert_to_numpy=True)
+    _, indices = index.search(query_vec, k)
+    return [int(i) for i in indices[0] if i >= 0]
+
+
+def search_multilingual(query, embedder, index, k):
+    """Multilingual index over the English answers: embed the Swahili query directly"""
+    query_vec = embedder.encode([query], convert_to_numpy=True, normalize_embeddings=True)
+    _, indices = index.search(query_vec, k)
+    return [int(i) for i in indices[0] if i >= 0]
+
+
+def run(name, search_fn, queries, embedder, index):
+    """Time each query and compute recall@k for every k"""
+    max_k = max(TOP_K_VALUES)
+    latencies = []
+    hits = {k: 0 for k in TOP_K_VALUES}
+
+    # Warm-up (model load, first-call allocations) is excluded from timings
+    search_fn(queries[0][0], embedder, index, max_k)
+
+    for query, relevant in queries:
+        start = time.perf_counter()
+        rows = search_fn(query, embedder, index, max_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        for k in TOP_K_VALUES:
+            if relevant.intersection(rows[:k]):
+                hits[k] += 1
+
+    latencies = np.array(latencies)
+    result = {
+        "latency_ms_mean": float(latencies.mean()),
+        "latency_ms_p50": float(np.percentile(latencies, 50)),
+        "latency_ms_p95": float(np.percentile(latencies, 95)),
+        "recall": {f"@{k}": hits[k] / len(queries) for k in TOP_K_VALUES},
+    }
+    print(f"\n{name}")
+    print(f"  Latency: mean {result['latency_ms_mean']:.1f} ms, p50 {result['latency_ms_p50']:.1f} ms, "
+          f"p95 {result['latency_ms_p95']:.1f} ms")
+    for k in TOP_K_VALUES:
+        print(f"  Recall@{k}: {result['recall'][f'@{k}']:.4f}")
+    return result
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    num_queries = int(args[0]) if args else 300
+    output_path = sys.argv[sys.argv.index("--output") + 1] if "--output" in sys.argv else None
+
+    print("=" * 60)
+    print("Swahili retrieval: translate-then-retrieve vs multilingual index")
+    print("=" * 60)
+
+    queries = build_query_set(num_queries)
+    print(f"Using {len(queries)} Swahili queries from question_sw")
+
+    load_translation_models()
+    results = {
+        "num_queries": len(queries),
+        "translate_then_retrieve": run(
+            "translate → all-MiniLM-L6-v2 → English index", search_translate, queries,
+            SentenceTransformer("all-MiniLM-L6-v2"), faiss.read_index("menstrual_index.faiss")),
+        "multilingual": run(
+            "multilingual encoder → English index", search_multilingual, queries,
+            SentenceTransformer(MULTILINGUAL_EMBEDDER_PATH), faiss.read_index("menstrual_index_multilingual.faiss")),
+    }
+
+    speedup = results["translate_then_retrieve"]["latency_ms_mean"] / results["multilingual"]["latency_ms_mean"]
+    print(f"\nMultilingual mode is {speedup:.1f}x faster per query on average")
+
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results saved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark: /chat front-door routing (intent + emotion) over a message replay
+
+Replays user messages saved under conversations/ (real traffic), then corpus
+questions from menstrual_data.csv / menstrual_data_sw.csv, and compares the
+compiled MessageRouter with the previous chain of keyword scans in chat() and
+detect_emotion. Reports time per message and where the two disagree.
+
+Usage (from backend/):
+    python benchmarks/bench_router.py [max_messages]
+"""
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+from message_router import MessageRouter
+
+FRONT_DOOR_SAMPLE = [
+    "hi", "Hello!", "hey there", "habari yako", "mambo vipi", "good morning",
+    "what is eunoia?", "who are you", "wewe ni nani",
+    "what's the weather like", "do you like football",
+    "how do I take care of myself during my period",
+    "my cramps are really painful", "I'm worried my period is late", "nina wasiwasi kuhusu hedhi yangu",
+]
+
+
+def replay_messages(limit):
+    """Saved user messages first, then corpus questions, then the built-in sample"""
+    messages = []
+    for path in sorted(glob.glob("./conversations/*.json")):
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for conversation in data.get("conversations", {}).values():
+            messages.extend(m["text"] for m in conversation.get("messages", [])
+                            if m.get("role") == "User" and m.get("text"))
+    for path, column in [("./menstrual_data.csv", "question"), ("./menstrual_data_sw.csv", "question_sw")]:
+        if os.path.exists(path) and len(messages) < limit:
+            with open(path, encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    if row.get(column):
+                        messages.append(row[column])
+                    if len(messages) >= limit:
+                        break
+    return (messages + FRONT_DOOR_SAMPLE)[:max(limit, len(FRONT_DOOR_SAMPLE))]
+
+
+def legacy_route(user_input):
+    """The keyword scans chat() and detect_emotion ran before the router"""
+    lowered = user_input.lower().strip()
+    greetings_en = ["hi", "hello", "hey", "good morning", "good evening", "good afternoon", "hi there", "hey there"]
+    greetings_sw = ["hujambo", "jambo", "mambo", "habari", "sasa", "mambo vipi", "habari yako"]
+    is_greeting = (
+        len(user_input.split()) <= 2 and (
+            any(word == lowered or word in lowered.split() for word in greetings_en) or
+            any(word == lowered or word in lowered.split() for word in greetings_sw)
+        )
+    ) or any(lowered.startswith(greeting) for greeting in greetings_en + greetings_sw)
+    off_topic_keywords = ["car", "cars", "weather", "football", "movie", "game", "song", "music"]
+    bot_questions_en = ["what does eunoia mean", "what is eunoia", "who are you", "what are you"]
+    bot_questions_sw = ["eunoia inamaanisha nini", "wewe ni nani", "nini wewe"]
+    if is_greeting:
+        intent = "greeting"
+    elif any(keyword in lowered for keyword in off_topic_keywords):
+        intent = "off_topic"
+    elif any(phrase in lowered for phrase in bot_questions_en + bot_questions_sw):
+        intent = "about_bot"
+    else:
+        intent = "medical"
+
+    t = user_input.lower()
+    if any(w in t for w in ["pain", "cramp", "hurt", "severe", "severely", "really painful", "extremely painful",
+                             "maumivu", "unaumia", "uumiza", "kuumiza", "makali"]):
+        emotion = "pain"
+    elif any(w in t for w in ["scared", "worried", "anxious", "afraid", "nervous", "panic",
+                               "wasiwasi", "hofu", "ogopa"]):
+        emotion = "anxious"
+    elif any(w in t for w in ["sad", "depressed", "down", "upset", "crying", "huzuni", "sikitika"]):
+        emotion = "sad"
+    else:
+        emotion = "neutral"
+    return intent, emotion
+
+
+def time_per_message(fn, messages, repeats=3):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        results = [fn(m) for m in messages]
+        best = min(best, time.perf_counter() - start)
+    return results, best / len(messages) * 1e6
+
+
+def main():
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    messages = replay_messages(limit)
+    router = MessageRouter()
+
+    legacy, legacy_us = time_per_message(legacy_route, messages)
+    routed, router_us = time_per_message(lambda m: tuple(router.route(m)), messages)
+
+    print("=" * 60)
+    print(f"Front-door routing over {len(messages)} replayed messages")
+    print("=" * 60)
+    print(f"legacy keyword scans: {legacy_us:7.2f} µs/message")
+    print(f"MessageRouter:        {router_us:7.2f} µs/message ({legacy_us / router_us:.1f}x)")
+    print(f"Intents: {dict(Counter(intent for intent, _ in routed))}")
+
+    changed = [(m, old, new) for m, old, new in zip(messages, legacy, routed) if old != new]
+    print(f"\nDisagreements: {len(changed)} ({len(changed) / len(messages):.2%})")
+    for kind, counts in [("intent", Counter((o[0], n[0]) for _, o, n in changed if o[0] != n[0])),
+                         ("emotion", Counter((o[1], n[1]) for _, o, n in changed if o[1] != n[1]))]:
+        for (old, new), count in counts.most_common():
+            example = next(m for m, o, n in changed if (o[0], n[0]) == (old, new) or (o[1], n[1]) == (old, new))
+            print(f"  {kind} {old} -> {new}: {count}  e.g. {example[:70]!r}")
+
+
+if __name__ == "__main__":
+    main()
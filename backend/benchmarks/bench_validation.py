@@ -0,0 +1,136 @@
+"""
+Benchmark: validate_and_clean_response on realistic ~500-token generations
+
+Generations are assembled from corpus answer sentences (menstrual_data.csv when
+present, otherwise a built-in sample) with the failure modes the validator
+exists for: repeated and near-repeated sentences, instruction echoes and
+generic closings. No model weights are loaded. The run is repeated with the
+rule set padded by synthetic rules to show that per-response cost stays flat
+as rules are added.
+
+Usage (from backend/):
+    python benchmarks/bench_validation.py [num_responses] [target_tokens] [extra_rules]
+"""
+import csv
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+from response_validation import validate_response, GENERIC_CLOSINGS
+from safety_rules import SafetyRuleEngine, RULES_PATH
+
+RANDOM_SEED = 42
+
+INSTRUCTION_ECHOES = [
+    "use a warm, detailed, compassionate response",
+    "follow this exactly",
+    "do not copy or repeat",
+]
+
+SAMPLE_SENTENCES = [
+    "Menstrual cramps are caused by prostaglandins that make the uterus contract",
+    "Applying a hot water bottle to your lower abdomen can relax the muscles and ease the pain",
+    "Over-the-counter pain relievers like ibuprofen work best when taken at the first sign of cramps",
+    "Gentle exercise such as walking or stretching increases blood flow and can reduce discomfort",
+    "A normal cycle lasts anywhere from 21 to 35 days, and it is common for it to vary a little",
+    "Stress, changes in weight and illness can all make a period arrive late",
+    "Pads should be changed every four to six hours, or sooner if they feel full",
+    "Polycystic ovary syndrome is a hormonal condition that can cause irregular periods",
+    "Drinking enough water and eating iron-rich foods helps your body during your period",
+    "If the pain is severe enough to stop you from going to school, it is worth seeing a doctor",
+]
+
+
+def load_sentences():
+    """Corpus answer sentences, or the built-in sample when the CSV is not available"""
+    if not os.path.exists("./menstrual_data.csv"):
+        return SAMPLE_SENTENCES
+    sentences = []
+    with open("./menstrual_data.csv", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            sentences.extend(s.strip() for s in (row.get("answer") or "").split(".") if len(s.strip()) > 20)
+            if len(sentences) > 20000:
+                break
+    return sentences or SAMPLE_SENTENCES
+
+
+def make_generation(rng, sentences, target_tokens):
+    """One synthetic generation of roughly target_tokens tokens (~0.75 words per token)"""
+    parts = []
+    words = 0
+    while words < target_tokens * 0.75:
+        roll = rng.random()
+        if parts and roll < 0.15:
+            parts.append(rng.choice(parts))  # Exact repeat
+        elif parts and roll < 0.25:
+            words_of = rng.choice(parts).split()
+            parts.append(" ".join(words_of[:-1]))  # Near repeat
+        elif roll < 0.28:
+            parts.append("Please " + rng.choice(INSTRUCTION_ECHOES))
+        else:
+            parts.append(rng.choice(sentences))
+        words += len(parts[-1].split())
+    if rng.random() < 0.3:
+        parts.append(rng.choice(GENERIC_CLOSINGS))
+    return ". ".join(parts) + "."
+
+
+def padded_rules(extra_rules, rng):
+    """The shipped rules plus synthetic detect/rewrite/drop rules that never match"""
+    with open(RULES_PATH, encoding="utf-8") as f:
+        rules = json.load(f)["rules"]
+    for i in range(extra_rules):
+        word = "".join(rng.choice("qxzj") for _ in range(6))
+        kind = ("detect", "rewrite", "drop_sentence")[i % 3]
+        rule = {"id": f"synthetic-{i}", "type": kind, "ignore_case": True, "phrases": [f"{word} advice {i}"]}
+        if kind == "rewrite":
+            rule["replacement"] = "advice"
+        rules.append(rule)
+    return SafetyRuleEngine(rules)
+
+
+def time_validation(generations, queries, rules):
+    # Warm-up
+    for text in generations[:10]:
+        validate_response(text, queries[0], rules)
+
+    timings = []
+    for i, text in enumerate(generations):
+        start = time.perf_counter()
+        validate_response(text, queries[i % len(queries)], rules)
+        timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    return timings
+
+
+def main():
+    num_responses = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    target_tokens = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    extra_rules = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+
+    rng = random.Random(RANDOM_SEED)
+    sentences = load_sentences()
+    generations = [make_generation(rng, sentences, target_tokens) for _ in range(num_responses)]
+    queries = ["how can I relieve period cramps?", "is it normal for my period to be late?"]
+
+    print("=" * 60)
+    print(f"validate_response: {num_responses} generations of ~{target_tokens} tokens")
+    print("=" * 60)
+    for rules in (SafetyRuleEngine.load(), padded_rules(extra_rules, rng)):
+        timings = time_validation(generations, queries, rules)
+        print(f"{len(rules.rules)} rules:")
+        print(f"  mean {statistics.mean(timings):8.1f} µs")
+        print(f"  p50  {timings[len(timings) // 2]:8.1f} µs")
+        print(f"  p95  {timings[int(len(timings) * 0.95)]:8.1f} µs")
+        print(f"  max  {timings[-1]:8.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Load test: replay corpus questions against the /chat endpoints
+
+Questions are sampled from menstrual_data.csv (`question`) and, for the Swahili
+share of the traffic, menstrual_data_sw.csv (`question_sw`). Each virtual user
+keeps one conversation, so history reads and writes grow as they would in
+production; --history-fraction mixes in GET /chat/history calls.
+
+Reports throughput, p50/p95/p99 latency and error rate per request kind, the
+/chat outcomes, and a per-stage breakdown from the difference in /metrics
+before and after the run.
+
+Targets:
+- --url http://host:5000 drives a running server over HTTP
+- without --url the app is imported and driven in-process through the Flask
+  test client, with its conversation DB in a temporary directory
+- --stub (in-process) sets STUB_MODELS=1: the generator, the embedder and the
+  translators are deterministic fakes (stub_models.py), so the run measures
+  retrieval, validation and storage overhead without any model weights
+
+Usage (from backend/):
+    python benchmarks/load_test.py --stub [--requests 500] [--concurrency 8]
+        [--sw-fraction 0.3] [--history-fraction 0.1] [--users 50] [--output report.json]
+    python benchmarks/load_test.py --url http://localhost:5000 --requests 200
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+RANDOM_SEED = 42
+METRIC_LINE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+
+
+def load_questions(path, column):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [row[column].strip() for row in csv.DictReader(f) if (row.get(column) or "").strip()]
+
+
+class HttpTarget:
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+class InProcessTarget:
+    """Flask test client per thread; the app (and its models or stubs) is imported once"""
+
+    def __init__(self, flask_app):
+        self.app = flask_app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        return response.status_code, response.get_data()
+
+
+def open_target(args):
+    if args.url:
+        return HttpTarget(args.url, args.timeout)
+    if args.stub:
+        os.environ["STUB_MODELS"] = "1"
+    workdir = tempfile.mkdtemp(prefix="eunoia-load-")
+    os.environ.setdefault("CONVERSATIONS_DB", os.path.join(workdir, "conversations.db"))
+    os.environ.setdefault("CONVERSATION_ARCHIVE_DIR", os.path.join(workdir, "archive"))
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    import app as app_module
+    return InProcessTarget(app_module.app)
+
+
+def scrape_metrics(target):
+    """{(metric, labels): value} from /metrics"""
+    status, body = target.request("GET", "/metrics")
+    samples = {}
+    if status != 200:
+        return samples
+    for line in body.decode("utf-8").splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            samples[(match.group(1), match.group(2))] = float(match.group(3))
+    return samples
+
+
+def stage_breakdown(before, after, chat_requests):
+    stages = {}
+    for (name, labels), value in after.items():
+        if name != "eunoia_stage_seconds_sum":
+            continue
+        stage = labels.split('"')[1]
+        count = after.get(("eunoia_stage_seconds_count", labels), 0) - before.get(("eunoia_stage_seconds_count", labels), 0)
+        total = value - before.get((name, labels), 0)
+        if count <= 0:
+            continue
+        stages[stage] = {
+            "calls": int(count),
+            "total_s": round(total, 4),
+            "mean_ms": round(total / count * 1000, 3),
+            "ms_per_chat": round(total / max(chat_requests, 1) * 1000, 3),
+        }
+    return dict(sorted(stages.items(), key=lambda item: -item[1]["total_s"]))
+
+
+def outcome_counts(before, after):
+    outcomes = {}
+    for (name, labels), value in after.items():
+        if name == "eunoia_chat_requests_total":
+            outcomes[labels.split('"')[1]] = int(value - before.get((name, labels), 0))
+    return outcomes
+
+
+def summarize(latencies, errors, wall_seconds):
+    result = {"requests": len(latencies), "errors": errors,
+              "error_rate": round(errors / len(latencies), 4) if latencies else 0.0,
+              "throughput_rps": round(len(latencies) / wall_seconds, 2) if wall_seconds else 0.0}
+    if latencies:
+        values = np.array(latencies) * 1000
+        result.update({
+            "mean_ms": round(float(values.mean()), 2),
+            "p50_ms": round(float(np.percentile(values, 50)), 2),
+            "p95_ms": round(float(np.percentile(values, 95)), 2),
+            "p99_ms": round(float(np.percentile(values, 99)), 2),
+            "max_ms": round(float(values.max()), 2),
+        })
+    return result
+
+
+def build_schedule(args, questions_en, questions_sw, rng):
+    """(kind, user index, question) for every request, decided up front so runs are repeatable"""
+    schedule = []
+    for _ in range(args.requests):
+        user = rng.randrange(args.users)
+        if rng.random() < args.history_fraction:
+            schedule.append(("history", user, None))
+        elif questions_sw and rng.random() < args.sw_fraction:
+            schedule.append(("chat_sw", user, rng.choice(questions_sw)))
+        else:
+            schedule.append(("chat_en", user, rng.choice(questions_en)))
+    return schedule
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay corpus questions against /chat and report latency")
+    parser.add_argument("--url", help="Base URL of a running server (default: drive the app in-process)")
+    parser.add_argument("--stub", action="store_true", help="In-process with stub models (STUB_MODELS=1)")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--sw-fraction", type=float, default=0.2, help="Share of /chat requests in Swahili mode")
+    parser.add_argument("--history-fraction", type=float, default=0.0, help="Share of GET /chat/history requests")
+    parser.add_argument("--users", type=int, default=50, help="Virtual users (one conversation each)")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed requests before the run")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=RANDOM_SEED)
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+    if args.url and args.stub:
+        parser.error("--stub runs the app in-process; start the server with STUB_MODELS=1 to stub a remote one")
+
+    questions_en = load_questions("./menstrual_data.csv", "question")
+    questions_sw = load_questions("./menstrual_data_sw.csv", "question_sw")
+    if not questions_en:
+        sys.exit("menstrual_data.csv has no questions")
+    if args.sw_fraction and not questions_sw:
+        print("⚠️ No question_sw in menstrual_data_sw.csv - sending English questions only")
+
+    rng = random.Random(args.seed)
+    schedule = build_schedule(args, questions_en, questions_sw, rng)
+    target = open_target(args)
+    run_id = f"load-{int(time.time())}"
+    conversations = {}  # user index -> conversation_id
+    conversations_lock = threading.Lock()
+
+    def send(job):
+        kind, user, question = job
+        user_id = f"{run_id}-u{user}"
+        with conversations_lock:
+            conversation_id = conversations.get(user)
+        start = time.perf_counter()
+        try:
+            if kind == "history":
+                path = f"/chat/history?user_id={user_id}&limit=20"
+                if conversation_id:
+                    path += f"&conversation_id={conversation_id}"
+                status, body = target.request("GET", path)
+            else:
+                status, body = target.request("POST", "/chat", {
+                    "message": question,
+                    "user_id": user_id,
+                    "conversation_id": conversation_id,
+                    "language": "sw" if kind == "chat_sw" else "en",
+                })
+                if status == 200 and conversation_id is None:
+                    with conversations_lock:
+                        conversations.setdefault(user, json.loads(body).get("conversation_id"))
+        except Exception as e:
+            return kind, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+        return kind, time.perf_counter() - start, None if status < 400 else f"HTTP {status}"
+
+    print(f"Target: {args.url or ('in-process, stub models' if args.stub else 'in-process')}")
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {args.users} users, "
+          f"sw {args.sw_fraction:.0%} of chat, history {args.history_fraction:.0%}")
+
+    for job in schedule[:args.warmup]:
+        send(job)
+
+    metrics_before = scrape_metrics(target)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(send, schedule))
+    wall_seconds = time.perf_counter() - start
+    metrics_after = scrape_metrics(target)
+
+    latencies, errors, error_kinds = defaultdict(list), Counter(), Counter()
+    for kind, seconds, error in results:
+        latencies[kind].append(seconds)
+        if error:
+            errors[kind] += 1
+            error_kinds[error] += 1
+    chat_requests = len(latencies["chat_en"]) + len(latencies["chat_sw"])
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "wall_seconds": round(wall_seconds, 3),
+        "overall": summarize([s for _, s, _ in results], sum(errors.values()), wall_seconds),
+        "by_kind": {kind: summarize(values, errors[kind], wall_seconds) for kind, values in sorted(latencies.items())},
+        "errors": dict(error_kinds.most_common(10)),
+        "outcomes": outcome_counts(metrics_before, metrics_after),
+        "stages": stage_breakdown(metrics_before, metrics_after, chat_requests),
+    }
+
+    overall = report["overall"]
+    print(f"\nThroughput: {overall['throughput_rps']} req/s over {report['wall_seconds']} s, "
+          f"errors {overall['errors']} ({overall['error_rate']:.1%})")
+    print(f"{'kind':<10}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'err':>6}")
+    for kind, row in [("all", overall)] + list(report["by_kind"].items()):
+        print(f"{kind:<10}{row['requests']:>7}{row.get('p50_ms', 0):>10}{row.get('p95_ms', 0):>10}"
+              f"{row.get('p99_ms', 0):>10}{row.get('max_ms', 0):>10}{row['errors']:>6}")
+    if report["outcomes"]:
+        print("\nOutcomes: " + ", ".join(f"{k} {v}" for k, v in sorted(report["outcomes"].items())))
+    if report["stages"]:
+        print(f"\n{'stage':<22}{'calls':>8}{'mean ms':>10}{'ms/chat':>10}{'total s':>10}")
+        for stage, row in report["stages"].items():
+            print(f"{stage:<22}{row['calls']:>8}{row['mean_ms']:>10}{row['ms_per_chat']:>10}{row['total_s']:>10}")
+    for error, count in report["errors"].items():
+        print(f"⚠️ {count}x {error}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
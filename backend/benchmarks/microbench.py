@@ -0,0 +1,281 @@
+"""
+Micro-benchmarks for the CPU-bound text functions, with stored baselines
+
+Benchmarks (per call, over a fixed fixture set):
+- retrieval_filter: context_processing.filter_candidates + drop_excluded_sentences
+  on 15 search candidates, as in retrieve_context
+- summarize_context: five retrieved answers trimmed to 120 words
+- validate_and_clean_response: ~250-token generations with repeats and echoes
+- create_empathetic_response[context] / [annotated]: fallback built from raw
+  context text, and from the precomputed sentence annotations of the rows
+- detect_emotion: MessageRouter.emotion on corpus questions
+- naturalize_swahili / preprocess_swahili_query: Swahili answers and questions
+
+Fixtures come from menstrual_data.csv / menstrual_data_sw.csv when present
+(built-in samples otherwise; the baseline records which). No model weights are
+loaded. Timings are the best of --repeat runs, each at least --min-time long.
+
+Usage (from backend/):
+    python benchmarks/microbench.py run [--only name,name] [--save]
+    python benchmarks/microbench.py compare [--tolerance 0.10]
+
+`run --save` writes benchmarks/baselines/microbench.json; `compare` re-runs and
+exits with status 1 when a benchmark is slower than its baseline by more than
+the tolerance. The committed baseline is a reference (built-in fixtures, one
+development machine); timings are per machine, so record your own with
+`run --save` before changing code and compare against that.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+from bench_validation import SAMPLE_SENTENCES, make_generation
+from context_processing import filter_candidates, drop_excluded_sentences, summarize_context
+from corpus_store import CorpusStore
+from empathetic_response import create_empathetic_response
+from message_router import MessageRouter
+from response_validation import validate_and_clean_response
+from sentence_annotations import SentenceAnnotations
+from swahili_text import naturalize_swahili, preprocess_swahili_query
+
+RANDOM_SEED = 42
+BASELINE_PATH = os.path.join("benchmarks", "baselines", "microbench.json")
+FIXTURE_SIZE = 200
+
+SAMPLE_QUESTIONS = [
+    "How can I relieve period cramps?",
+    "Is it normal for my period to be late?",
+    "I'm scared because my period is very heavy this month",
+    "What is PCOS and how does it affect periods?",
+    "Can I go swimming during my period?",
+    "Why do I feel so sad before my period?",
+]
+
+SAMPLE_SW = [
+    ("Ninaumwa na tumbo wakati wa hedhi, nifanye nini?",
+     "Maumivu ya hedhi husababishwa na misuli ya uterasi. Chupa ya maji moto inaweza kusaidia. Kunywa maji mengi na pumzika."),
+    ("Kwa nini hedhi yangu imechelewa?",
+     "Msongo wa mawazo na mabadiliko ya uzito yanaweza kuchelewesha hedhi. Ni kawaida mzunguko kubadilika kidogo."),
+    ("Je, ni kawaida kutokwa na damu nyingi?",
+     "Ikiwa unabadilisha pedi kila saa moja, ni vizuri kumwona daktari. Kula vyakula vyenye madini ya chuma."),
+]
+
+
+# ------------------ Fixtures ------------------
+def read_csv_columns(path, columns):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return [tuple(row.get(column) or "" for column in columns) for row in csv.DictReader(f)]
+
+
+def build_fixtures(rng):
+    rows = read_csv_columns("./menstrual_data.csv", ["question", "answer"])
+    rows_sw = read_csv_columns("./menstrual_data_sw.csv", ["question_sw", "answer_sw"])
+    source = "corpus" if rows else "sample"
+    if not rows:
+        rows = [(question, ". ".join(rng.sample(SAMPLE_SENTENCES, 4)) + ".") for question in SAMPLE_QUESTIONS * 10]
+    if not rows_sw or not any(question for question, _ in rows_sw):
+        rows_sw = SAMPLE_SW
+        source += "+sample_sw"
+
+    store = CorpusStore.from_texts([answer for _, answer in rows])
+    questions = [question for question, _ in rows if question.strip()]
+    row_ids = [int(row_id) for row_id in store.row_ids]
+    sentences = [s.strip() for text in store.texts[:2000] for s in text.split(".") if len(s.strip()) > 20]
+
+    picked_questions = [rng.choice(questions) for _ in range(FIXTURE_SIZE)]
+    candidate_sets = []
+    for _ in range(FIXTURE_SIZE):
+        # top_k * 3 candidates in search order, distances spread like all-MiniLM L2 distances
+        candidate_rows = rng.sample(row_ids, min(15, len(row_ids)))
+        distances = sorted(rng.uniform(0.4, 1.6) for _ in candidate_rows)
+        candidate_sets.append(list(zip(candidate_rows, distances)))
+    contexts = ["\n".join(store.get(row) for row, _ in candidates[:5]) for candidates in candidate_sets]
+    context_rows = [[row for row, _ in candidates[:5]] for candidates in candidate_sets]
+    generations = [make_generation(rng, sentences or SAMPLE_SENTENCES, 250) for _ in range(FIXTURE_SIZE)]
+    emotions = [rng.choice(["pain", "anxious", "sad", "neutral"]) for _ in range(FIXTURE_SIZE)]
+    sw = [rng.choice([pair for pair in rows_sw if pair[0].strip() and pair[1].strip()]) for _ in range(FIXTURE_SIZE)]
+
+    return {
+        "source": source,
+        "store": store,
+        "annotations": SentenceAnnotations.build(store),
+        "questions": picked_questions,
+        "candidate_sets": candidate_sets,
+        "contexts": contexts,
+        "summarize_inputs": [drop_excluded_sentences(context) for context in contexts],
+        "context_rows": context_rows,
+        "generations": generations,
+        "emotions": emotions,
+        "questions_sw": [question for question, _ in sw],
+        "answers_sw": [answer for _, answer in sw],
+    }
+
+
+# ------------------ Benchmarks ------------------
+def define_benchmarks(fx):
+    """name -> (function running one pass over the fixtures, calls per pass)"""
+    router = MessageRouter()
+    store, annotations, n = fx["store"], fx["annotations"], FIXTURE_SIZE
+
+    def retrieval_filter():
+        for question, candidates in zip(fx["questions"], fx["candidate_sets"]):
+            texts, _ = filter_candidates(candidates, store, question, 5, 0.5)
+            drop_excluded_sentences("\n".join(texts))
+
+    def summarize():
+        for context in fx["summarize_inputs"]:
+            summarize_context(context, max_words=120)
+
+    def validate():
+        for question, generation in zip(fx["questions"], fx["generations"]):
+            validate_and_clean_response(generation, question)
+
+    def empathetic_context():
+        random.seed(RANDOM_SEED)
+        for question, context, emotion in zip(fx["questions"], fx["contexts"], fx["emotions"]):
+            create_empathetic_response(question, context, emotion)
+
+    def empathetic_annotated():
+        random.seed(RANDOM_SEED)
+        for question, context, emotion, rows in zip(fx["questions"], fx["contexts"], fx["emotions"],
+                                                    fx["context_rows"]):
+            create_empathetic_response(question, context, emotion, context_rows=rows, annotations=annotations)
+
+    def emotion():
+        for question in fx["questions"]:
+            router.emotion(question)
+
+    def naturalize():
+        for answer in fx["answers_sw"]:
+            naturalize_swahili(answer)
+
+    def preprocess():
+        for question in fx["questions_sw"]:
+            preprocess_swahili_query(question)
+
+    return {
+        "retrieval_filter": (retrieval_filter, n),
+        "summarize_context": (summarize, n),
+        "validate_and_clean_response": (validate, n),
+        "create_empathetic_response[context]": (empathetic_context, n),
+        "create_empathetic_response[annotated]": (empathetic_annotated, n),
+        "detect_emotion": (emotion, n),
+        "naturalize_swahili": (naturalize, n),
+        "preprocess_swahili_query": (preprocess, n),
+    }
+
+
+def measure(fn, calls, repeat, min_time):
+    """Best and median µs per call over `repeat` runs of enough passes to last min_time"""
+    fn()  # Warm-up (regex compilation, caches)
+    start = time.perf_counter()
+    fn()
+    one_pass = max(time.perf_counter() - start, 1e-9)
+    passes = max(1, math.ceil(min_time / one_pass))
+    per_call = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(passes):
+            fn()
+        per_call.append((time.perf_counter() - start) / (passes * calls) * 1e6)
+    return {"best_us": round(min(per_call), 3), "median_us": round(statistics.median(per_call), 3)}
+
+
+def run_benchmarks(args):
+    rng = random.Random(RANDOM_SEED)
+    fixtures = build_fixtures(rng)
+    benchmarks = define_benchmarks(fixtures)
+    only = set(args.only.split(",")) if args.only else None
+    unknown = (only or set()) - set(benchmarks)
+    if unknown:
+        sys.exit(f"Unknown benchmark(s): {', '.join(sorted(unknown))}. Available: {', '.join(benchmarks)}")
+
+    results = {}
+    for name, (fn, calls) in benchmarks.items():
+        if only and name not in only:
+            continue
+        results[name] = measure(fn, calls, args.repeat, args.min_time)
+        print(f"  {name:<40}{results[name]['best_us']:>12.2f} µs{results[name]['median_us']:>12.2f} µs")
+    meta = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()} {platform.node()}",
+        "fixtures": fixtures["source"],
+    }
+    return meta, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the text-processing functions")
+    parser.add_argument("command", choices=["run", "compare"])
+    parser.add_argument("--only", help="Comma-separated benchmark names")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per repeat")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="run: store the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="compare: allowed slowdown (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    print(f"{'':<42}{'best':>12}{'median':>15}")
+    meta, results = run_benchmarks(args)
+
+    if args.command == "run":
+        if args.save:
+            baseline = {"meta": meta, "results": results}
+            if os.path.exists(args.baseline) and args.only:
+                # Partial run: keep the other benchmarks' baselines
+                with open(args.baseline) as f:
+                    baseline["results"] = {**json.load(f)["results"], **results}
+            os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+            with open(args.baseline, "w") as f:
+                json.dump(baseline, f, indent=2)
+            print(f"\n✅ Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        sys.exit(f"No baseline at {args.baseline}. Record one first: python benchmarks/microbench.py run --save")
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    for key in ("python", "machine", "fixtures"):
+        if baseline["meta"].get(key) != meta[key]:
+            print(f"⚠️ Baseline {key} differs ({baseline['meta'].get(key)} vs {meta[key]}) - timings may not be comparable")
+
+    print(f"\n{'benchmark':<42}{'baseline':>12}{'now':>12}{'change':>10}")
+    regressions = []
+    for name, result in results.items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<42}{'-':>12}{result['best_us']:>12.2f}{'new':>10}")
+            continue
+        change = result["best_us"] / base["best_us"] - 1
+        flag = ""
+        if change > args.tolerance:
+            flag = "  ❌ REGRESSION"
+            regressions.append(name)
+        elif change < -args.tolerance:
+            flag = "  ✅ faster"
+        print(f"{name:<42}{base['best_us']:>12.2f}{result['best_us']:>12.2f}{change:>+10.1%}{flag}")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} benchmark(s) slower than baseline by more than {args.tolerance:.0%}: "
+              f"{', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\n✅ No regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Stress test: concurrent appends for one user against a conversation store
+
+Starts several processes, each running several threads, and has every worker
+append messages for the SAME user to its own conversation (all conversations
+share the user's JSON file / SQLite rows). Afterwards every conversation must
+contain exactly its worker's messages, in order; anything missing, duplicated
+or reordered is a lost update.
+
+Usage (from backend/):
+    python benchmarks/stress_conversation_store.py [--store json|sqlite|cached]
+        [--processes 4] [--threads 8] [--messages 40]
+
+Runs in a temporary directory. --store cached wraps SQLite in the write-behind
+cache, which is per process, so it runs threads in a single process.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+from conversation_store import open_store, CachedConversationStore, MAX_STORED_MESSAGES
+
+USER_ID = "stress-user"
+
+
+def open_workdir_store(kind, workdir):
+    store = open_store("sqlite" if kind == "cached" else kind,
+                       os.path.join(workdir, "conversations"), os.path.join(workdir, "conversations.db"))
+    if kind == "cached":
+        return CachedConversationStore(store, flush_interval=0.05)
+    return store
+
+
+def conversation_for(process_index, thread_index):
+    return f"p{process_index}-t{thread_index}"
+
+
+def run_process(kind, workdir, process_index, threads, messages):
+    store = open_workdir_store(kind, workdir)
+    errors = []
+
+    def worker(thread_index):
+        conversation_id = conversation_for(process_index, thread_index)
+        try:
+            for i in range(messages):
+                store.append_message(USER_ID, conversation_id, "User", f"{conversation_id}:{i}")
+        except Exception as e:
+            errors.append(f"{conversation_id}: {e!r}")
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    if isinstance(store, CachedConversationStore):
+        store.close()
+    for error in errors:
+        print(f"  worker error: {error}")
+    return len(errors)
+
+
+def verify(kind, workdir, processes, threads, messages):
+    store = open_workdir_store("sqlite" if kind == "cached" else kind, workdir)
+    lost = 0
+    for p in range(processes):
+        for t in range(threads):
+            conversation_id = conversation_for(p, t)
+            expected = [f"{conversation_id}:{i}" for i in range(messages)]
+            got = [m["text"] for m in store.messages(USER_ID, conversation_id)]
+            if got != expected:
+                lost += 1
+                missing = len(set(expected) - set(got))
+                print(f"  {conversation_id}: expected {len(expected)} messages, got {len(got)} ({missing} missing)")
+    return lost
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", choices=["json", "sqlite", "cached"], default="json")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--messages", type=int, default=40)
+    args = parser.parse_args()
+    if args.messages > MAX_STORED_MESSAGES:
+        parser.error(f"--messages must be at most {MAX_STORED_MESSAGES} (stores keep only the last {MAX_STORED_MESSAGES})")
+    processes = 1 if args.store == "cached" else args.processes
+
+    with tempfile.TemporaryDirectory() as workdir:
+        start = time.perf_counter()
+        if processes == 1:
+            errors = run_process(args.store, workdir, 0, args.threads, args.messages)
+        else:
+            with multiprocessing.Pool(processes) as pool:
+                errors = sum(pool.starmap(run_process, [(args.store, workdir, p, args.threads, args.messages)
+                                                         for p in range(processes)]))
+        elapsed = time.perf_counter() - start
+        lost = verify(args.store, workdir, processes, args.threads, args.messages)
+
+    total = processes * args.threads * args.messages
+    print("=" * 60)
+    print(f"{args.store} store: {processes} processes x {args.threads} threads x {args.messages} appends, one user")
+    print("=" * 60)
+    print(f"Appends: {total} in {elapsed:.2f}s ({total / elapsed:.0f}/s)")
+    print(f"Worker errors: {errors}")
+    print(f"Conversations with lost or reordered messages: {lost}/{processes * args.threads}")
+    sys.exit(1 if lost or errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Build a multilingual FAISS index over the English answers
+Used when the backend runs with EMBEDDING_MODE=multilingual: Swahili queries
+are embedded directly with a multilingual encoder and retrieve English answers,
+with no sw→en translation before retrieval. Only English answers are indexed
+because the retrieved context feeds English generation.
+
+- Encoder: a multilingual sentence-transformer stored locally in ./multilingual_embedder
+  (downloaded once from the Hugging Face hub if missing)
+- Ids: the English CSV row ids, like menstrual_index.faiss
+- Only rows missing from an existing index are embedded; pass --rebuild to start over
+- menstrual_index_multi.faiss (English and Swahili answers under language-tagged ids)
+  is no longer read; build this index again and delete it
+"""
+import pandas as pd
+import faiss
+import os
+import sys
+from sentence_transformers import SentenceTransformer
+from corpus_store import (CorpusStore, new_id_index, add_with_row_ids, is_id_mapped,
+                          indexed_row_ids)
+
+MULTILINGUAL_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+MULTILINGUAL_EMBEDDER_PATH = "./multilingual_embedder"
+INDEX_PATH = "menstrual_index_multilingual.faiss"
+OLD_INDEX_PATH = "menstrual_index_multi.faiss"  # Language-tagged ids, not compatible
+
+
+def load_multilingual_embedder():
+    """Load the local multilingual encoder, downloading it once if needed"""
+    if not os.path.exists(MULTILINGUAL_EMBEDDER_PATH):
+        print(f"⬇️ Downloading {MULTILINGUAL_MODEL_NAME}...")
+        embedder = SentenceTransformer(MULTILINGUAL_MODEL_NAME)
+        embedder.save(MULTILINGUAL_EMBEDDER_PATH)
+        print(f"✅ Saved multilingual encoder to {MULTILINGUAL_EMBEDDER_PATH}")
+        return embedder
+    return SentenceTransformer(MULTILINGUAL_EMBEDDER_PATH)
+
+
+if __name__ == "__main__":
+    rebuild = "--rebuild" in sys.argv
+
+    print("Building multilingual FAISS index...")
+
+    df = pd.read_csv("./menstrual_data.csv")
+    store = CorpusStore.from_texts(df["answer"].fillna("").tolist())
+    print(f"✅ Loaded {len(store)} English answers")
+
+    if os.path.exists(OLD_INDEX_PATH):
+        print(f"ℹ️ {OLD_INDEX_PATH} uses the old language-tagged ids and is no longer read, you can delete it")
+
+    index_multi = None
+    if not rebuild and os.path.exists(INDEX_PATH):
+        index_multi = faiss.read_index(INDEX_PATH)
+        if not is_id_mapped(index_multi):
+            index_multi = None
+        else:
+            print(f"✅ Loaded existing multilingual index ({index_multi.ntotal} vectors)")
+
+    already_indexed = set(indexed_row_ids(index_multi).tolist()) if index_multi is not None else set()
+
+    new_row_ids = [row_id for row_id in store.row_ids.tolist() if row_id not in already_indexed]
+    if not new_row_ids:
+        print("✅ Multilingual index is up to date, nothing to add")
+        exit(0)
+
+    embedder = load_multilingual_embedder()
+    new_row_ids, new_texts = store.subset(new_row_ids)
+    print(f"Creating embeddings for {len(new_texts)} rows...")
+    # Normalized vectors so L2 distance tracks cosine similarity across languages
+    new_embeddings = embedder.encode(new_texts, convert_to_numpy=True,
+                                     normalize_embeddings=True, show_progress_bar=True)
+    if index_multi is None:
+        index_multi = new_id_index(new_embeddings.shape[1])
+    add_with_row_ids(index_multi, new_embeddings, new_row_ids)
+    added = len(new_row_ids)
+
+    faiss.write_index(index_multi, INDEX_PATH)
+    print(f"✅ Saved {INDEX_PATH} ({index_multi.ntotal} vectors, {added} added)")
+    print("   Start the backend with EMBEDDING_MODE=multilingual to use it")
@@ -1,12 +1,35 @@
 """
 Build FAISS index for Swahili corpus
 Run this after translating the CSV to create a Swahili-specific index
+
+The index is id-mapped: every vector carries its original CSV row id, so
+partially translated files stay aligned with menstrual_data_sw.csv.
+By default only rows that are new or whose answer_sw text changed since the
+last build are embedded, so it can be re-run after every translation batch.
+embeddings_sw.npy is kept in id-map order and a hash of every indexed text is
+stored in embeddings_sw_hashes.json; if either is missing or does not match the
+index, the index is rebuilt from scratch. Pass --rebuild to force that.
 """
+import hashlib
+import json
 import pandas as pd
 import numpy as np
 import faiss
 import os
+import sys
 from sentence_transformers import SentenceTransformer
+from corpus_store import CorpusStore, new_id_index, add_with_row_ids, is_id_mapped, indexed_row_ids
+
+INDEX_PATH = "menstrual_index_sw.faiss"
+EMBEDDINGS_PATH = "embeddings_sw.npy"
+HASHES_PATH = "embeddings_sw_hashes.json"
+
+rebuild = "--rebuild" in sys.argv
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
 
 print("Building Swahili FAISS index...")
 
@@ -17,27 +40,74 @@ if not os.path.exists("./menstrual_data_sw.csv"):
     exit(1)
 
 df_sw = pd.read_csv("./menstrual_data_sw.csv")
-corpus_sw = df_sw["answer_sw"].fillna("").tolist()
 
-# Filter out empty translations
-corpus_sw = [text for text in corpus_sw if text and text.strip()]
-print(f"✅ Loaded {len(corpus_sw)} Swahili translations")
+# Keep original row ids - empty translations are skipped, not renumbered
+store_sw = CorpusStore.from_texts(df_sw["answer_sw"].fillna("").tolist())
+current_hashes = {int(row_id): text_hash(text) for row_id, text in zip(store_sw.row_ids, store_sw.texts)}
+print(f"✅ Loaded {len(store_sw)} Swahili translations")
 
-# Create embeddings
-print("Creating embeddings...")
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
-embeddings_sw = embedder.encode(corpus_sw, convert_to_numpy=True, show_progress_bar=True)
+index_sw = None
+embeddings_sw = None
+indexed_hashes = {}
+if not rebuild and os.path.exists(INDEX_PATH):
+    index_sw = faiss.read_index(INDEX_PATH)
+    if not is_id_mapped(index_sw):
+        print("⚠️ Existing index is not id-mapped (built before row ids were tracked), rebuilding")
+        index_sw = None
+    elif not os.path.exists(EMBEDDINGS_PATH) or not os.path.exists(HASHES_PATH):
+        print(f"⚠️ {EMBEDDINGS_PATH} or {HASHES_PATH} is missing, rebuilding")
+        index_sw = None
+    else:
+        embeddings_sw = np.load(EMBEDDINGS_PATH)
+        with open(HASHES_PATH, encoding="utf-8") as f:
+            indexed_hashes = {int(row_id): h for row_id, h in json.load(f).items()}
+        if len(embeddings_sw) != index_sw.ntotal or set(indexed_hashes) != set(indexed_row_ids(index_sw).tolist()):
+            print(f"⚠️ {EMBEDDINGS_PATH} / {HASHES_PATH} do not match the index "
+                  f"({len(embeddings_sw)} embeddings, {index_sw.ntotal} indexed rows), rebuilding")
+            index_sw = None
+        else:
+            print(f"✅ Loaded existing Swahili index ({index_sw.ntotal} rows)")
+if index_sw is None:
+    embeddings_sw = None
+    indexed_hashes = {}
 
-# Build FAISS index
-dimension = embeddings_sw.shape[1]
-index_sw = faiss.IndexFlatL2(dimension)
-index_sw.add(embeddings_sw)
+# Rows whose text changed (or that were emptied) since they were embedded
+indexed_ids = indexed_row_ids(index_sw) if index_sw is not None else np.zeros(0, dtype=np.int64)
+keep = np.array([current_hashes.get(int(row_id)) == indexed_hashes[int(row_id)] for row_id in indexed_ids], dtype=bool)
+stale = len(indexed_ids) - int(keep.sum())
+kept_ids = set(indexed_ids[keep].tolist())
+new_row_ids = [row_id for row_id in store_sw.row_ids.tolist() if row_id not in kept_ids]
 
-# Save
-np.save("embeddings_sw.npy", embeddings_sw)
-faiss.write_index(index_sw, "menstrual_index_sw.faiss")
-print(f"✅ Saved Swahili embeddings and index")
-print(f"   - embeddings_sw.npy ({embeddings_sw.shape})")
-print(f"   - menstrual_index_sw.faiss")
+if not new_row_ids and not stale:
+    print("✅ Swahili index is up to date, nothing to add")
+    exit(0)
+
+if stale:
+    # Rebuild the index from the kept embeddings; only changed rows are embedded again
+    print(f"{stale} indexed rows changed or were removed since the last build")
+    embeddings_sw = embeddings_sw[keep]
+    index_sw = new_id_index(embeddings_sw.shape[1])
+    add_with_row_ids(index_sw, embeddings_sw, indexed_ids[keep])
+
+new_embeddings = None
+if new_row_ids:
+    new_row_ids, new_texts = store_sw.subset(new_row_ids)
+    print(f"Creating embeddings for {len(new_texts)} new or changed rows...")
+    embedder = SentenceTransformer("all-MiniLM-L6-v2")
+    new_embeddings = embedder.encode(new_texts, convert_to_numpy=True, show_progress_bar=True)
 
+    if index_sw is None:
+        index_sw = new_id_index(new_embeddings.shape[1])
+    add_with_row_ids(index_sw, new_embeddings, new_row_ids)
 
+    # Embeddings are kept in the same order as the index id map
+    embeddings_sw = new_embeddings if embeddings_sw is None else np.vstack([embeddings_sw, new_embeddings])
+
+# Save
+np.save(EMBEDDINGS_PATH, embeddings_sw)
+faiss.write_index(index_sw, INDEX_PATH)
+with open(HASHES_PATH, "w", encoding="utf-8") as f:
+    json.dump({str(row_id): current_hashes[int(row_id)] for row_id in indexed_row_ids(index_sw)}, f)
+print(f"✅ Saved Swahili embeddings and index")
+print(f"   - {EMBEDDINGS_PATH} ({embeddings_sw.shape})")
+print(f"   - {INDEX_PATH} ({index_sw.ntotal} rows, {len(new_row_ids)} embedded, {stale} stale removed)")
@@ -2,7 +2,7 @@
 Complete Swahili Index Setup Script
 This script will:
 1. Translate the entire CSV to Swahili (in batches)
-2. Build the Swahili FAISS index
+2. Add each finished batch to the Swahili FAISS index (incremental, id-mapped)
 
 Note: Full translation of 22,306 rows will take approximately 12-18 hours
 You can run this script and let it complete overnight.
@@ -103,6 +103,9 @@ def main():
                 print(f"To resume, run: python translate_csv.py {start_row} {BATCH_SIZE}")
                 return
             
+            # Index the newly translated rows right away (incremental, keeps row ids)
+            build_swahili_index()
+            
             start_row += BATCH_SIZE
             batch_num += 1
             
@@ -121,9 +124,9 @@ def main():
         print(f"Or run this script again to continue automatically.")
         return
     
-    # Build index after translation is complete
+    # Final incremental pass picks up anything the batch builds missed
     print(f"\n{'='*70}")
-    print("Translation complete! Building Swahili index...")
+    print("Translation complete! Updating Swahili index...")
     print(f"{'='*70}")
     
     if build_swahili_index():
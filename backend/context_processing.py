@@ -0,0 +1,110 @@
+"""
+Context filtering and summarization between the FAISS search and the prompt
+- filter_candidates(): relevance filter over the search candidates
+  (similarity or word overlap, off-topic puberty text, non-Kenyan programs)
+- drop_excluded_sentences(): removes sentences that mention non-Kenyan programs
+- summarize_context(): trims context to a word budget on sentence boundaries
+Pure text functions, no models: rag_engine.py times them as the retrieval_filter and
+summarize stages, benchmarks/microbench.py times them directly.
+"""
+from sentence_annotations import NON_KENYAN_PHRASES, PUBERTY_TERMS
+
+# Puberty/menarche text (PUBERTY_TERMS) is only relevant when the question is about starting periods
+PUBERTY_QUERY_TERMS = ["menarche", "first period", "puberty", "start", "begin"]
+
+# Program references from the Indian sources in the corpus (not relevant for a Kenyan audience)
+INDIAN_PROGRAM_PHRASES = [
+    "anms", "ashas", "awwwws", "auxiliary nurse", "auxiliary admiles",
+    "pradhan mantri", "bhartiya janaushadhi", "pmbjp", "janaushadhi",
+    "beti bachao", "beti padhao", "rural india", "indian cities",
+    "indian villages", "hdi gender inequality", "gender equality in india"
+]
+# Sentence-level post-filter also catches their Swahili translations; it is the
+# annotation flag FLAG_NON_KENYAN, so the annotated fallback drops the same sentences
+EXCLUDED_SENTENCE_PHRASES = NON_KENYAN_PHRASES
+
+
+def filter_candidates(candidates, store, query, top_k=5, similarity_threshold=0.5, traced_candidates=None):
+    """Keep up to top_k relevant candidate texts
+    candidates: (row id, L2 distance) pairs in search order; store: row id -> text (.get)
+    traced_candidates: list to append {"row", "score"} for every candidate seen (tracing)
+    Returns (texts, row ids)"""
+    retrieved_texts = []
+    retrieved_rows = []
+    seen_texts = set()  # Avoid duplicates
+    query_lower = query.lower()
+    query_words = set(query_lower.split())
+    allows_puberty = any(term in query_lower for term in PUBERTY_QUERY_TERMS)
+
+    for idx, distance in candidates:
+        # Index ids are CSV row ids; empty rows are never in the store
+        text = store.get(idx)
+        if text is None:
+            continue
+
+        similarity_score = 1.0 / (1.0 + distance)  # Convert distance to similarity
+        if traced_candidates is not None:
+            traced_candidates.append({"row": int(idx), "score": round(float(similarity_score), 4)})
+
+        # Check if text is relevant to query (contains key terms)
+        text_lower = text.lower()
+        word_overlap = len(query_words & set(text_lower.split())) / max(len(query_words), 1)
+
+        # More lenient filtering - include if similarity is reasonable OR word overlap exists
+        if (similarity_score >= similarity_threshold or word_overlap > 0.15) and text not in seen_texts:
+            # Skip if text contains irrelevant terms and query doesn't mention them
+            is_irrelevant = not allows_puberty and any(term in text_lower for term in PUBERTY_TERMS)
+            has_indian_references = any(phrase in text_lower for phrase in INDIAN_PROGRAM_PHRASES)
+
+            if not is_irrelevant and not has_indian_references:
+                retrieved_texts.append(text)
+                retrieved_rows.append(int(idx))
+                seen_texts.add(text)
+
+                if len(retrieved_texts) >= top_k:
+                    break
+
+    return retrieved_texts, retrieved_rows
+
+
+def drop_excluded_sentences(text):
+    """Sentences of text without non-Kenyan program references, rejoined with '. '"""
+    if not text:
+        return text
+    filtered_sentences = []
+    for sent in text.split('.'):
+        sent_lower = sent.lower()
+        if sent.strip() and not any(phrase in sent_lower for phrase in EXCLUDED_SENTENCE_PHRASES):
+            filtered_sentences.append(sent.strip())
+    return '. '.join(filtered_sentences)  # "" when every sentence was filtered out
+
+
+def summarize_context(context, max_words=120):
+    """Summarize context to max_words, keeping most relevant information"""
+    if not context:
+        return ""
+
+    # Split into sentences
+    sentences = context.split('.')
+    sentences = [s.strip() for s in sentences if s.strip()]
+
+    # Count words
+    word_count = 0
+    selected_sentences = []
+
+    for sent in sentences:
+        words = sent.split()
+        if word_count + len(words) <= max_words:
+            selected_sentences.append(sent)
+            word_count += len(words)
+        else:
+            # If adding this sentence would exceed limit, check if it's short enough to fit partially
+            remaining = max_words - word_count
+            if remaining > 20:  # Only if we have significant space left
+                # Take first part of sentence
+                words_to_take = words[:remaining]
+                if words_to_take:
+                    selected_sentences.append(' '.join(words_to_take))
+            break
+
+    return '. '.join(selected_sentences)
@@ -0,0 +1,151 @@
+"""
+Compressed archival tier for idle conversations
+- ConversationArchive keeps one gzip file per user; each archived conversation
+  is one JSON line (metadata + messages) appended as its own gzip member
+- compact() moves conversations idle for longer than max_idle_days out of the
+  hot store, which keeps their metadata (marked archived) so the sidebar still
+  lists them; app.py restores one transparently when it is opened
+- Reports the hot-store bytes reclaimed and the time to read every compacted
+  user's hot data (conversation list + latest conversation) before and after
+
+Usage (from backend/; stop the app first, or use POST /admin/conversations/compact):
+    python conversation_archive.py [--store sqlite|json] [--max-idle-days 30]
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from conversation_store import (LockStripes, file_lock, JsonConversationStore, SqliteConversationStore)
+from structured_logging import get_logger
+
+log = get_logger("conversation_archive")
+
+ARCHIVE_DIR = "./conversations_archive"
+DEFAULT_MAX_IDLE_DAYS = 30
+
+
+class ConversationArchive:
+    """Per-user gzip JSON-lines files of archived conversations"""
+
+    def __init__(self, directory=ARCHIVE_DIR, compresslevel=9):
+        self.directory = directory
+        self.compresslevel = compresslevel
+        os.makedirs(directory, exist_ok=True)
+        self._stripes = LockStripes()
+
+    def user_file(self, user_id):
+        return os.path.join(self.directory, f"{user_id}.jsonl.gz")
+
+    def _read(self, path):
+        """{conversation_id: record}; a member cut short by a crash mid-append is skipped"""
+        records = {}
+        if not os.path.exists(path):
+            return records
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    records[record["conversation_id"]] = record
+        except (EOFError, gzip.BadGzipFile, ValueError) as e:
+            log.warning("Truncated conversation archive %s: %s", path, e)
+        return records
+
+    def put(self, user_id, record):
+        """Append one conversation record; durable when this returns"""
+        path = self.user_file(user_id)
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._stripes(user_id), file_lock(path):
+            with open(path, "ab") as f:
+                f.write(gzip.compress(line, compresslevel=self.compresslevel))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def get(self, user_id, conversation_id):
+        path = self.user_file(user_id)
+        with self._stripes(user_id), file_lock(path):
+            return self._read(path).get(conversation_id)
+
+    def remove(self, user_id, conversation_id):
+        """Drop a restored conversation, rewriting the user's archive atomically"""
+        path = self.user_file(user_id)
+        with self._stripes(user_id), file_lock(path):
+            records = self._read(path)
+            if records.pop(conversation_id, None) is None:
+                return
+            if not records:
+                os.remove(path)
+                return
+            tmp_path = path + ".tmp"
+            with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=self.compresslevel) as f:
+                for record in records.values():
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, path)
+
+    def size_bytes(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.name.endswith(".jsonl.gz"))
+
+
+def hot_read_seconds(store, user_ids):
+    """Time to read each user's conversation list and latest conversation from the hot store"""
+    start = time.perf_counter()
+    for user_id in user_ids:
+        store.list_conversations(user_id)
+        store.messages(user_id)
+    return time.perf_counter() - start
+
+
+def compact(store, archive, max_idle_days=DEFAULT_MAX_IDLE_DAYS):
+    """Archive every conversation not updated for max_idle_days; returns a report dict"""
+    cutoff = (datetime.now() - timedelta(days=max_idle_days)).isoformat()
+    # Measure the durable store, not the in-memory cache in front of it
+    hot_store = getattr(store, "backing", store)
+    user_ids = list(store.user_ids())
+
+    bytes_before = store.storage_bytes()
+    read_before = hot_read_seconds(hot_store, user_ids)
+    compacted_users, archived = set(), 0
+    for user_id in user_ids:
+        for conversation in store.list_conversations(user_id):
+            if conversation.get("archived") or (conversation.get("updated_at") or "") >= cutoff:
+                continue
+            if store.archive_conversation(user_id, conversation["conversation_id"], archive):
+                archived += 1
+                compacted_users.add(user_id)
+    if archived:
+        store.reclaim_space()
+    bytes_after = store.storage_bytes()
+    read_after = hot_read_seconds(hot_store, user_ids)
+
+    return {
+        "cutoff": cutoff,
+        "users": len(user_ids),
+        "users_compacted": len(compacted_users),
+        "conversations_archived": archived,
+        "hot_bytes_before": bytes_before,
+        "hot_bytes_after": bytes_after,
+        "bytes_reclaimed": bytes_before - bytes_after,
+        "archive_bytes": archive.size_bytes(),
+        "hot_read_ms_before": round(read_before * 1000, 2),
+        "hot_read_ms_after": round(read_after * 1000, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive idle conversations out of the hot store")
+    parser.add_argument("--store", choices=["sqlite", "json"], default="sqlite")
+    parser.add_argument("--db", default="./conversations.db")
+    parser.add_argument("--source", default="./conversations")
+    parser.add_argument("--archive", default=ARCHIVE_DIR)
+    parser.add_argument("--max-idle-days", type=float, default=DEFAULT_MAX_IDLE_DAYS)
+    args = parser.parse_args()
+
+    store = SqliteConversationStore(args.db) if args.store == "sqlite" else JsonConversationStore(args.source)
+    report = compact(store, ConversationArchive(args.archive), args.max_idle_days)
+    print(f"✅ Archived {report['conversations_archived']} conversations from {report['users_compacted']}"
+          f"/{report['users']} users (idle since before {report['cutoff']})")
+    print(f"   Hot store: {report['hot_bytes_before']:,} → {report['hot_bytes_after']:,} bytes "
+          f"({report['bytes_reclaimed']:,} reclaimed); archive {report['archive_bytes']:,} bytes")
+    print(f"   Hot read (lists + latest conversation, all users): "
+          f"{report['hot_read_ms_before']} → {report['hot_read_ms_after']} ms")
@@ -0,0 +1,1101 @@
+"""
+Conversation storage backends
+- ConversationStore is the interface app.py talks to
+- SqliteConversationStore: conversations and messages tables, message inserts
+  trimmed to the newest MAX_STORED_MESSAGES, indexed tail reads, WAL mode so
+  readers never block the writer
+- JsonConversationStore: the original one-file-per-user JSON format
+- CachedConversationStore: opt-in write-behind cache in front of either, for a
+  single process; reads and appends never wait on disk, a background writer
+  flushes in batches
+- open_store() picks JSON (the default in app.py) or SQLite by name; switching
+  to SQLite never moves data by itself: `python conversation_store.py migrate`
+  bulk-copies conversations/ into SQLite first
+"""
+import argparse
+import base64
+import glob
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from structured_logging import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+log = get_logger("conversation_store")
+
+# Messages kept per conversation; every store drops older ones on append
+MAX_STORED_MESSAGES = 50
+DEFAULT_TITLE = "New Chat"
+
+
+def new_conversation_id():
+    return datetime.now().strftime("%Y%m%d%H%M%S%f")
+
+
+def title_from_message(text):
+    return (text or "Chat")[:50]
+
+
+def recency_key(conversation):
+    """Sort key for conversation lists: most recently updated first, ties by id"""
+    return [conversation.get("updated_at") or "", conversation["conversation_id"]]
+
+
+def encode_cursor(*values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Values packed by encode_cursor; ValueError for anything else"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(values, list) or not all(isinstance(v, (str, int)) for v in values):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return values
+
+
+def _message_position(messages, before):
+    """Index in messages of the message a list cursor points at
+    List cursors hold the message's timestamp and how many messages from it to the
+    end share that timestamp, so equal timestamps never straddle a page boundary"""
+    values = decode_cursor(before)
+    if not isinstance(values[0], str):
+        raise ValueError(f"Invalid cursor: {before!r}")
+    timestamp = values[0]
+    same = [i for i, m in enumerate(messages) if m["timestamp"] == timestamp]
+    if len(values) < 2 or not same:
+        return sum(1 for m in messages if m["timestamp"] < timestamp)
+    from_end = values[1]
+    return same[len(same) - from_end] if 0 < from_end <= len(same) else same[0]
+
+
+def message_window(messages, limit, before=None):
+    """(up to `limit` messages before the cursor, oldest first; cursor for older messages or None)
+    for stores that hold a conversation's messages as a list"""
+    end = _message_position(messages, before) if before else len(messages)
+    start = max(0, end - limit)
+    next_cursor = None
+    if start > 0:
+        timestamp = messages[start]["timestamp"]
+        next_cursor = encode_cursor(timestamp, sum(1 for m in messages[start:] if m["timestamp"] == timestamp))
+    return messages[start:end], next_cursor
+
+
+class ConversationStore:
+    """Storage interface for per-user conversations"""
+
+    def create_conversation(self, user_id, conversation_id=None, timestamp=None):
+        """Create an empty conversation and return its id"""
+        raise NotImplementedError
+
+    def append_message(self, user_id, conversation_id, role, text, timestamp=None):
+        """Append one message, creating the conversation if needed"""
+        raise NotImplementedError
+
+    def write_batch(self, user_id, ops):
+        """Apply queued writes for one user in order: ("create", conversation_id, timestamp)
+        or ("append", conversation_id, role, text, timestamp)"""
+        for op in ops:
+            if op[0] == "create":
+                self.create_conversation(user_id, op[1], op[2])
+            else:
+                self.append_message(user_id, *op[1:])
+
+    def messages(self, user_id, conversation_id=None, limit=MAX_STORED_MESSAGES):
+        """Last `limit` messages of a conversation (the most recently updated one if conversation_id is None)"""
+        raise NotImplementedError
+
+    def list_conversations(self, user_id):
+        """Conversation metadata, most recently updated first"""
+        raise NotImplementedError
+
+    def conversation_info(self, user_id, conversation_id=None):
+        """Metadata of one conversation (the most recently updated one if conversation_id is None), or None"""
+        for conversation in self.list_conversations(user_id):
+            if not conversation_id or conversation["conversation_id"] == conversation_id:
+                return conversation
+        return None
+
+    def conversation_page(self, user_id, limit, cursor=None):
+        """(up to `limit` conversations after cursor in list order, cursor for the next page or None)"""
+        conversations = self.list_conversations(user_id)
+        if cursor:
+            after = decode_cursor(cursor)
+            conversations = [c for c in conversations if recency_key(c) < after]
+        page = conversations[:limit]
+        next_cursor = encode_cursor(*recency_key(page[-1])) if len(conversations) > limit else None
+        return page, next_cursor
+
+    def message_page(self, user_id, conversation_id, limit, before=None):
+        """(up to `limit` messages older than the cursor, oldest first; cursor for older messages or None)"""
+        return message_window(self.messages(user_id, conversation_id), limit, before)
+
+    def get_conversation(self, user_id, conversation_id):
+        """Conversation metadata plus messages, or None"""
+        raise NotImplementedError
+
+    def delete_conversation(self, user_id, conversation_id):
+        """Delete one conversation; False if it did not exist"""
+        raise NotImplementedError
+
+    def clear_user(self, user_id):
+        """Delete all of a user's conversations"""
+        raise NotImplementedError
+
+    def user_ids(self):
+        """Every user with stored conversations"""
+        raise NotImplementedError
+
+    def archive_conversation(self, user_id, conversation_id, archive):
+        """Move a conversation's messages into archive (a ConversationArchive), keeping its
+        metadata here marked archived; False if missing or already archived"""
+        raise NotImplementedError
+
+    def restore_conversation(self, user_id, conversation_id, archive):
+        """Bring an archived conversation's messages back; False if it was not archived"""
+        raise NotImplementedError
+
+    def storage_bytes(self):
+        """Size of the hot store on disk"""
+        raise NotImplementedError
+
+    def reclaim_space(self):
+        """Return space freed by archiving to the filesystem, where the backend needs it"""
+
+
+class LockStripes:
+    """Fixed pool of locks; a key always maps to the same lock, unrelated keys rarely share one"""
+
+    def __init__(self, count=64):
+        self._locks = [threading.Lock() for _ in range(count)]
+
+    def __call__(self, key):
+        return self._locks[zlib.crc32(key.encode("utf-8")) % len(self._locks)]
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive advisory lock on path + '.lock', shared by every process (gunicorn workers)"""
+    if fcntl is None:  # No advisory locks on this platform: in-process locking only
+        yield
+        return
+    with open(path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def atomic_write_json(path, data):
+    """Write to a temp file in the same directory, fsync, then rename over path:
+    readers see the old file or the new one, never a truncated one"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class JsonConversationStore(ConversationStore):
+    """One JSON file per user holding all of their conversations (full rewrite on every change)
+
+    Every read-modify-write runs under the user's striped in-process lock and an
+    advisory file lock, and files are replaced atomically, so concurrent
+    requests for one user (tabs, retries, other workers) never lose messages.
+    """
+
+    def __init__(self, directory="./conversations"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._stripes = LockStripes()
+
+    def user_file(self, user_id):
+        return os.path.join(self.directory, f"{user_id}.json")
+
+    @staticmethod
+    def _empty(user_id):
+        return {"user_id": user_id, "conversations": {}, "last_updated": datetime.now().isoformat()}
+
+    def load_user(self, user_id, file_path=None):
+        """Load all conversations for a specific user"""
+        file_path = file_path or self.user_file(user_id)
+        if not os.path.exists(file_path):
+            return self._empty(user_id)
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except ValueError as e:
+            # Keep the unreadable file aside instead of letting the next save overwrite it
+            corrupt_path = f"{file_path}.corrupt-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            log.warning("Unreadable conversations file %s (%s), moved to %s", file_path, e, corrupt_path)
+            try:
+                os.replace(file_path, corrupt_path)
+            except OSError:
+                pass
+            return self._empty(user_id)
+        except Exception:
+            log.exception("Error loading conversations for %s", user_id)
+            return self._empty(user_id)
+        # Support both old format (single conversation) and new format (multiple conversations)
+        if "conversations" in data:
+            return data
+        # Migrate old format to new format
+        old_messages = data.get("messages", [])
+        if not old_messages:
+            return self._empty(user_id)
+        conversation_id = datetime.now().strftime("%Y%m%d%H%M%S")
+        return {
+            "user_id": user_id,
+            "conversations": {
+                conversation_id: {
+                    "conversation_id": conversation_id,
+                    "created_at": data.get("last_updated", datetime.now().isoformat()),
+                    "updated_at": data.get("last_updated", datetime.now().isoformat()),
+                    "title": title_from_message(old_messages[0].get("text")),
+                    "messages": old_messages
+                }
+            },
+            "last_updated": datetime.now().isoformat()
+        }
+
+    def index_file(self, user_id):
+        return os.path.join(self.directory, f"{user_id}.index")
+
+    @staticmethod
+    def _metadata(conversations):
+        conversation_list = [
+            {
+                "conversation_id": conv_id,
+                "title": conv.get("title", DEFAULT_TITLE),
+                "created_at": conv.get("created_at"),
+                "updated_at": conv.get("updated_at"),
+                "message_count": conv.get("message_count", 0) if conv.get("archived") else len(conv.get("messages", [])),
+                "archived": bool(conv.get("archived"))
+            }
+            for conv_id, conv in conversations.items()
+        ]
+        conversation_list.sort(key=recency_key, reverse=True)
+        return conversation_list
+
+    def save_user(self, user_id, conversations_data):
+        """Save all conversations for a specific user, then their metadata index"""
+        conversations_data["last_updated"] = datetime.now().isoformat()
+        atomic_write_json(self.user_file(user_id), conversations_data)
+        atomic_write_json(self.index_file(user_id), self._metadata(conversations_data["conversations"]))
+
+    @contextmanager
+    def locked_user(self, user_id):
+        """Load a user's data under both locks, yield it for changes, save it on exit"""
+        file_path = self.user_file(user_id)
+        with self._stripes(user_id), file_lock(file_path):
+            data = self.load_user(user_id)
+            yield data
+            self.save_user(user_id, data)
+
+    @staticmethod
+    def _create(data, conversation_id, now):
+        return data["conversations"].setdefault(conversation_id, {
+            "conversation_id": conversation_id,
+            "created_at": now,
+            "updated_at": now,
+            "title": DEFAULT_TITLE,
+            "messages": []
+        })
+
+    def _append(self, data, conversation_id, role, text, now):
+        conversation = self._create(data, conversation_id, now)
+        messages = conversation.get("messages", [])
+        messages.append({"role": role, "text": text, "timestamp": now})
+        # Keep last 50 messages to prevent file from getting too large
+        conversation["messages"] = messages[-MAX_STORED_MESSAGES:]
+        conversation["updated_at"] = now
+        # Title comes from the first user message, and stays once older messages are trimmed (as in SQLite)
+        if role == "User" and conversation.get("title", DEFAULT_TITLE) == DEFAULT_TITLE and not conversation.get("archived"):
+            conversation["title"] = title_from_message(text)
+
+    def create_conversation(self, user_id, conversation_id=None, timestamp=None):
+        conversation_id = conversation_id or new_conversation_id()
+        with self.locked_user(user_id) as data:
+            self._create(data, conversation_id, timestamp or datetime.now().isoformat())
+        return conversation_id
+
+    def append_message(self, user_id, conversation_id, role, text, timestamp=None):
+        with self.locked_user(user_id) as data:
+            self._append(data, conversation_id, role, text, timestamp or datetime.now().isoformat())
+
+    def write_batch(self, user_id, ops):
+        """One load and one save for the whole batch"""
+        with self.locked_user(user_id) as data:
+            for op in ops:
+                if op[0] == "create":
+                    self._create(data, op[1], op[2])
+                else:
+                    self._append(data, *op[1:])
+
+    def messages(self, user_id, conversation_id=None, limit=MAX_STORED_MESSAGES):
+        if not conversation_id:
+            # If no conversation_id provided, use the most recent conversation (first in the index)
+            conversations = self.list_conversations(user_id)
+            if not conversations:
+                return []
+            conversation_id = conversations[0]["conversation_id"]
+        conversation = self.load_user(user_id)["conversations"].get(conversation_id)
+        if conversation is None:
+            return []
+        return conversation.get("messages", [])[-limit:] if limit else []
+
+    def list_conversations(self, user_id):
+        """From the metadata index; files written before the index existed are read in full once"""
+        try:
+            with open(self.index_file(user_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            log.warning("Rebuilding unreadable conversation index for %s: %s", user_id, e)
+        return self._metadata(self.load_user(user_id)["conversations"])
+
+    def get_conversation(self, user_id, conversation_id):
+        conversation = self.load_user(user_id)["conversations"].get(conversation_id)
+        if conversation is None:
+            return None
+        return {
+            "conversation_id": conversation_id,
+            "title": conversation.get("title", DEFAULT_TITLE),
+            "created_at": conversation.get("created_at"),
+            "updated_at": conversation.get("updated_at"),
+            "messages": conversation.get("messages", [])
+        }
+
+    def delete_conversation(self, user_id, conversation_id):
+        with self.locked_user(user_id) as data:
+            return data["conversations"].pop(conversation_id, None) is not None
+
+    def clear_user(self, user_id):
+        file_path = self.user_file(user_id)
+        with self._stripes(user_id), file_lock(file_path):
+            for path in (file_path, self.index_file(user_id)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def user_ids(self):
+        return sorted(os.path.basename(path)[:-len(".json")]
+                      for path in glob.glob(os.path.join(self.directory, "*.json")))
+
+    def archive_conversation(self, user_id, conversation_id, archive):
+        with self.locked_user(user_id) as data:
+            conversation = data["conversations"].get(conversation_id)
+            if conversation is None or conversation.get("archived"):
+                return False
+            archive.put(user_id, conversation)
+            conversation["message_count"] = len(conversation.get("messages", []))
+            conversation["messages"] = []
+            conversation["archived"] = True
+            return True
+
+    def restore_conversation(self, user_id, conversation_id, archive):
+        with self.locked_user(user_id) as data:
+            conversation = data["conversations"].get(conversation_id)
+            if conversation is None or not conversation.get("archived"):
+                return False
+            record = archive.get(user_id, conversation_id)
+            if record is None:
+                return False
+            # Messages appended while archived come after the archived ones
+            messages = record.get("messages", []) + conversation.get("messages", [])
+            conversation["messages"] = messages[-MAX_STORED_MESSAGES:]
+            conversation.pop("archived", None)
+            conversation.pop("message_count", None)
+        archive.remove(user_id, conversation_id)
+        return True
+
+    def storage_bytes(self):
+        return sum(os.path.getsize(path) for pattern in ("*.json", "*.index")
+                   for path in glob.glob(os.path.join(self.directory, pattern)))
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    user_id TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    archived INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, conversation_id)
+);
+DROP INDEX IF EXISTS conversations_by_recency;
+CREATE INDEX IF NOT EXISTS conversations_by_user_recency ON conversations (user_id, updated_at, conversation_id);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_conversation ON messages (user_id, conversation_id, id);
+"""
+
+
+METADATA_COLUMNS = "conversation_id, title, created_at, updated_at, message_count, archived"
+
+
+def _metadata_row(row):
+    conversation = dict(row)
+    conversation["message_count"] = min(conversation["message_count"], MAX_STORED_MESSAGES)
+    conversation["archived"] = bool(conversation["archived"])
+    return conversation
+
+
+class SqliteConversationStore(ConversationStore):
+    """SQLite-backed store: one row per message, per-thread connections, WAL journal"""
+
+    def __init__(self, path="./conversations.db"):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(conversations)")}
+            if columns and "archived" not in columns:  # Databases created before the archive tier
+                conn.execute("ALTER TABLE conversations ADD COLUMN archived INTEGER NOT NULL DEFAULT 0")
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints; safe with WAL
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _create(conn, user_id, conversation_id, now):
+        conn.execute(
+            "INSERT OR IGNORE INTO conversations (user_id, conversation_id, title, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (user_id, conversation_id, DEFAULT_TITLE, now, now),
+        )
+
+    @staticmethod
+    def _trim(conn, user_id, conversation_id):
+        """Delete all but the newest MAX_STORED_MESSAGES messages (one index seek when nothing is over)"""
+        conn.execute(
+            "DELETE FROM messages WHERE user_id = ? AND conversation_id = ? AND id <= ("
+            "SELECT id FROM messages WHERE user_id = ? AND conversation_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+            (user_id, conversation_id, user_id, conversation_id, MAX_STORED_MESSAGES),
+        )
+
+    def _append(self, conn, user_id, conversation_id, role, text, now):
+        self._create(conn, user_id, conversation_id, now)
+        conn.execute(
+            "INSERT INTO messages (user_id, conversation_id, role, text, timestamp) VALUES (?, ?, ?, ?, ?)",
+            (user_id, conversation_id, role, text, now),
+        )
+        self._trim(conn, user_id, conversation_id)
+        # Title comes from the first user message
+        conn.execute(
+            "UPDATE conversations SET updated_at = ?, message_count = MIN(message_count + 1, ?), "
+            "title = CASE WHEN title = ? AND ? = 'User' THEN ? ELSE title END "
+            "WHERE user_id = ? AND conversation_id = ?",
+            (now, MAX_STORED_MESSAGES, DEFAULT_TITLE, role, title_from_message(text), user_id, conversation_id),
+        )
+
+    def create_conversation(self, user_id, conversation_id=None, timestamp=None):
+        conversation_id = conversation_id or new_conversation_id()
+        with self._connect() as conn:
+            self._create(conn, user_id, conversation_id, timestamp or datetime.now().isoformat())
+        return conversation_id
+
+    def append_message(self, user_id, conversation_id, role, text, timestamp=None):
+        with self._connect() as conn:
+            self._append(conn, user_id, conversation_id, role, text, timestamp or datetime.now().isoformat())
+
+    def write_batch(self, user_id, ops):
+        """The whole batch in one transaction"""
+        with self._connect() as conn:
+            for op in ops:
+                if op[0] == "create":
+                    self._create(conn, user_id, op[1], op[2])
+                else:
+                    self._append(conn, user_id, *op[1:])
+
+    def _latest_conversation_id(self, conn, user_id):
+        row = conn.execute(
+            "SELECT conversation_id FROM conversations WHERE user_id = ? "
+            "ORDER BY updated_at DESC, conversation_id DESC LIMIT 1",
+            (user_id,),
+        ).fetchone()
+        return row["conversation_id"] if row else None
+
+    def messages(self, user_id, conversation_id=None, limit=MAX_STORED_MESSAGES):
+        conn = self._connect()
+        if not conversation_id:
+            conversation_id = self._latest_conversation_id(conn, user_id)
+            if conversation_id is None:
+                return []
+        rows = conn.execute(
+            "SELECT role, text, timestamp FROM messages WHERE user_id = ? AND conversation_id = ? "
+            "ORDER BY id DESC LIMIT ?",
+            (user_id, conversation_id, limit),
+        ).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    def list_conversations(self, user_id):
+        rows = self._connect().execute(
+            f"SELECT {METADATA_COLUMNS} FROM conversations "
+            "WHERE user_id = ? ORDER BY updated_at DESC, conversation_id DESC",
+            (user_id,),
+        ).fetchall()
+        return [_metadata_row(row) for row in rows]
+
+    def conversation_info(self, user_id, conversation_id=None):
+        conn = self._connect()
+        if not conversation_id:
+            conversation_id = self._latest_conversation_id(conn, user_id)
+        row = conn.execute(
+            f"SELECT {METADATA_COLUMNS} FROM conversations WHERE user_id = ? AND conversation_id = ?",
+            (user_id, conversation_id),
+        ).fetchone()
+        return _metadata_row(row) if row is not None else None
+
+    def conversation_page(self, user_id, limit, cursor=None):
+        """Keyset pagination over (updated_at, conversation_id): one index range scan per page"""
+        query = f"SELECT {METADATA_COLUMNS} FROM conversations WHERE user_id = ?"
+        params = [user_id]
+        if cursor:
+            updated_at, conversation_id = decode_cursor(cursor)
+            query += " AND (updated_at < ? OR (updated_at = ? AND conversation_id < ?))"
+            params += [updated_at, updated_at, conversation_id]
+        query += " ORDER BY updated_at DESC, conversation_id DESC LIMIT ?"
+        rows = self._connect().execute(query, params + [limit + 1]).fetchall()
+        page = [_metadata_row(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(*recency_key(page[-1])) if len(rows) > limit else None
+        return page, next_cursor
+
+    def message_page(self, user_id, conversation_id, limit, before=None):
+        """Keyset pagination back through the stored messages; the cursor is the message id"""
+        conn = self._connect()
+        if not conversation_id:
+            conversation_id = self._latest_conversation_id(conn, user_id)
+            if conversation_id is None:
+                return [], None
+        query = "SELECT id, role, text, timestamp FROM messages WHERE user_id = ? AND conversation_id = ?"
+        params = [user_id, conversation_id]
+        if before:
+            message_id = decode_cursor(before)[0]
+            if not isinstance(message_id, int):
+                raise ValueError(f"Invalid cursor: {before!r}")
+            # Walks the conversation index backwards from the cursor
+            query += " AND id < ?"
+            params.append(message_id)
+        rows = conn.execute(query + " ORDER BY id DESC LIMIT ?", params + [limit + 1]).fetchall()
+        page = [dict(row) for row in reversed(rows[:limit])]
+        next_cursor = encode_cursor(page[0]["id"]) if len(rows) > limit else None
+        for message in page:
+            del message["id"]
+        return page, next_cursor
+
+    def get_conversation(self, user_id, conversation_id):
+        row = self._connect().execute(
+            "SELECT conversation_id, title, created_at, updated_at FROM conversations "
+            "WHERE user_id = ? AND conversation_id = ?",
+            (user_id, conversation_id),
+        ).fetchone()
+        if row is None:
+            return None
+        conversation = dict(row)
+        conversation["messages"] = self.messages(user_id, conversation_id)
+        return conversation
+
+    def delete_conversation(self, user_id, conversation_id):
+        with self._connect() as conn:
+            deleted = conn.execute(
+                "DELETE FROM conversations WHERE user_id = ? AND conversation_id = ?", (user_id, conversation_id)
+            ).rowcount
+            conn.execute("DELETE FROM messages WHERE user_id = ? AND conversation_id = ?", (user_id, conversation_id))
+        return deleted > 0
+
+    def clear_user(self, user_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM conversations WHERE user_id = ?", (user_id,))
+            conn.execute("DELETE FROM messages WHERE user_id = ?", (user_id,))
+
+    def import_user(self, user_id, conversations_data):
+        """Bulk insert a user's JSON data; conversations already in the database are skipped"""
+        imported = 0
+        with self._connect() as conn:
+            for conversation_id, conversation in conversations_data.get("conversations", {}).items():
+                messages = conversation.get("messages", [])[-MAX_STORED_MESSAGES:]
+                created_at = conversation.get("created_at") or datetime.now().isoformat()
+                archived = bool(conversation.get("archived"))
+                inserted = conn.execute(
+                    "INSERT OR IGNORE INTO conversations "
+                    "(user_id, conversation_id, title, created_at, updated_at, message_count, archived) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (user_id, conversation_id, conversation.get("title") or DEFAULT_TITLE, created_at,
+                     conversation.get("updated_at") or created_at,
+                     conversation.get("message_count", 0) if archived else len(messages), archived),
+                ).rowcount
+                if not inserted:
+                    continue
+                conn.executemany(
+                    "INSERT INTO messages (user_id, conversation_id, role, text, timestamp) VALUES (?, ?, ?, ?, ?)",
+                    [(user_id, conversation_id, m.get("role", "User"), m.get("text", ""),
+                      m.get("timestamp") or created_at) for m in messages],
+                )
+                imported += 1
+        return imported
+
+    def is_empty(self):
+        return self._connect().execute("SELECT 1 FROM conversations LIMIT 1").fetchone() is None
+
+    def user_ids(self):
+        return [row["user_id"] for row in self._connect().execute("SELECT DISTINCT user_id FROM conversations")]
+
+    def archive_conversation(self, user_id, conversation_id, archive):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")  # No appends between reading the messages and deleting them
+            row = conn.execute(
+                f"SELECT {METADATA_COLUMNS} FROM conversations WHERE user_id = ? AND conversation_id = ?",
+                (user_id, conversation_id),
+            ).fetchone()
+            if row is None or row["archived"]:
+                return False
+            messages = conn.execute(
+                "SELECT role, text, timestamp FROM messages WHERE user_id = ? AND conversation_id = ? ORDER BY id",
+                (user_id, conversation_id),
+            ).fetchall()
+            record = dict(row)
+            record["messages"] = [dict(m) for m in messages]
+            del record["archived"]
+            archive.put(user_id, record)
+            conn.execute("DELETE FROM messages WHERE user_id = ? AND conversation_id = ?", (user_id, conversation_id))
+            conn.execute("UPDATE conversations SET archived = 1 WHERE user_id = ? AND conversation_id = ?",
+                         (user_id, conversation_id))
+        return True
+
+    def restore_conversation(self, user_id, conversation_id, archive):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT archived FROM conversations WHERE user_id = ? AND conversation_id = ?",
+                (user_id, conversation_id),
+            ).fetchone()
+            if row is None or not row["archived"]:
+                return False
+            record = archive.get(user_id, conversation_id)
+            if record is None:
+                return False
+            # Messages appended while archived are re-inserted after the archived ones to keep id order
+            newer = conn.execute(
+                "SELECT role, text, timestamp FROM messages WHERE user_id = ? AND conversation_id = ? ORDER BY id",
+                (user_id, conversation_id),
+            ).fetchall()
+            conn.execute("DELETE FROM messages WHERE user_id = ? AND conversation_id = ?", (user_id, conversation_id))
+            messages = (record.get("messages", []) + [dict(m) for m in newer])[-MAX_STORED_MESSAGES:]
+            conn.executemany(
+                "INSERT INTO messages (user_id, conversation_id, role, text, timestamp) VALUES (?, ?, ?, ?, ?)",
+                [(user_id, conversation_id, m["role"], m["text"], m["timestamp"]) for m in messages],
+            )
+            conn.execute(
+                "UPDATE conversations SET archived = 0, message_count = ? WHERE user_id = ? AND conversation_id = ?",
+                (len(messages), user_id, conversation_id),
+            )
+        archive.remove(user_id, conversation_id)
+        return True
+
+    def storage_bytes(self):
+        return sum(os.path.getsize(path) for path in (self.path, self.path + "-wal") if os.path.exists(path))
+
+    def reclaim_space(self):
+        """Trim conversations stored before appends were trimmed, then checkpoint the WAL and
+        VACUUM so deleted message pages are returned to the filesystem"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "DELETE FROM messages WHERE id IN (SELECT id FROM (SELECT id, ROW_NUMBER() OVER ("
+                "PARTITION BY user_id, conversation_id ORDER BY id DESC) AS newest FROM messages) WHERE newest > ?)",
+                (MAX_STORED_MESSAGES,),
+            )
+            conn.execute("UPDATE conversations SET message_count = ? WHERE message_count > ?",
+                         (MAX_STORED_MESSAGES, MAX_STORED_MESSAGES))
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+
+
+class _CachedUser:
+    """Conversation metadata and loaded message tails for one user, plus writes not yet flushed"""
+
+    def __init__(self, conversations):
+        self.conversations = {c["conversation_id"]: c for c in conversations}
+        self.messages = {}  # conversation_id -> last MAX_STORED_MESSAGES messages, loaded on first use
+        self.pending = []   # write_batch ops
+        self.inflight = 0   # ops handed to the writer but not yet written
+
+
+class CachedConversationStore(ConversationStore):
+    """Write-behind cache in front of another store
+
+    Reads and appends are served from memory; a background writer flushes each
+    user's queued writes to the backing store in one write_batch call. Writes
+    are at most flush_interval seconds (or max_pending ops) behind the backing
+    store. Least recently used users without unflushed writes are evicted past
+    max_users. Call close() on shutdown to flush everything.
+
+    Single process only: a cached user is never re-read from the backing
+    store, so conversations written by another process (a second gunicorn
+    worker) are missing here until the user is evicted. Writes not flushed yet
+    are lost if the process crashes.
+    """
+
+    def __init__(self, backing, max_users=1000, flush_interval=1.0, max_pending=256):
+        self.backing = backing
+        self.max_users = max_users
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._pending_ops = 0
+        self._closed = False
+        self._hits = 0
+        self._misses = 0
+        self._flushed_ops = 0
+        self._flushes = 0
+        self._flush_errors = 0
+        self._writer = threading.Thread(target=self._run_writer, name="conversation-writer", daemon=True)
+        self._writer.start()
+
+    def _user(self, user_id):
+        """Cached entry for user_id; on a miss its metadata is read from the backing store
+        without holding the lock, so a cold user never blocks other requests"""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None:
+                self._users.move_to_end(user_id)
+                self._hits += 1
+                return entry
+        conversations = self.backing.list_conversations(user_id)
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:  # Unless another request loaded the user meanwhile
+                self._misses += 1
+                entry = self._users[user_id] = _CachedUser(conversations)
+                self._evict(keep=user_id)
+            return entry
+
+    def _evict(self, keep=None):
+        excess = len(self._users) - self.max_users
+        if excess <= 0:
+            return
+        cold = [user_id for user_id, entry in self._users.items()
+                if not entry.pending and not entry.inflight and user_id != keep]
+        for user_id in cold[:excess]:
+            del self._users[user_id]
+
+    @contextmanager
+    def _locked(self, user_id, conversation_id=None, tail=False):
+        """Hold the lock with user_id's entry cached; yields (entry, conversation_id)
+        tail: also load the conversation's messages (the most recently updated
+        conversation when conversation_id is None). Backing-store reads happen
+        before the lock is taken and are inserted only if still missing."""
+        while True:
+            entry = self._user(user_id)
+            loaded = None
+            with self._lock:
+                target = conversation_id or (max(entry.conversations.values(), key=recency_key)["conversation_id"]
+                                             if tail and entry.conversations else None)
+                needs_tail = tail and target in entry.conversations and target not in entry.messages
+            if needs_tail:
+                loaded = self.backing.messages(user_id, target)
+            with self._lock:
+                if self._users.get(user_id) is not entry:
+                    continue  # Evicted while loading: load it again
+                if loaded is not None and target in entry.conversations:
+                    entry.messages.setdefault(target, loaded)
+                yield entry, target
+                return
+
+    @staticmethod
+    def _tail(entry, conversation_id):
+        """Message list of a conversation (loaded by _locked); empty for a conversation not stored yet"""
+        return entry.messages.setdefault(conversation_id, [])
+
+    def _queue(self, entry, op):
+        entry.pending.append(op)
+        self._pending_ops += 1
+        if self._pending_ops >= self.max_pending:
+            self._wake.notify()
+
+    def create_conversation(self, user_id, conversation_id=None, timestamp=None):
+        conversation_id = conversation_id or new_conversation_id()
+        now = timestamp or datetime.now().isoformat()
+        with self._locked(user_id) as (entry, _):
+            if conversation_id not in entry.conversations:
+                entry.conversations[conversation_id] = {
+                    "conversation_id": conversation_id,
+                    "title": DEFAULT_TITLE,
+                    "created_at": now,
+                    "updated_at": now,
+                    "message_count": 0,
+                    "archived": False,
+                }
+                entry.messages[conversation_id] = []
+            self._queue(entry, ("create", conversation_id, now))
+        return conversation_id
+
+    def append_message(self, user_id, conversation_id, role, text, timestamp=None):
+        now = timestamp or datetime.now().isoformat()
+        with self._locked(user_id, conversation_id, tail=True) as (entry, _):
+            messages = self._tail(entry, conversation_id)
+            conversation = entry.conversations.setdefault(conversation_id, {
+                "conversation_id": conversation_id,
+                "title": DEFAULT_TITLE,
+                "created_at": now,
+                "updated_at": now,
+                "message_count": 0,
+                "archived": False,
+            })
+            messages.append({"role": role, "text": text, "timestamp": now})
+            del messages[:-MAX_STORED_MESSAGES]
+            conversation["updated_at"] = now
+            conversation["message_count"] = min(conversation["message_count"] + 1, MAX_STORED_MESSAGES)
+            if conversation["title"] == DEFAULT_TITLE and role == "User":
+                conversation["title"] = title_from_message(text)
+            self._queue(entry, ("append", conversation_id, role, text, now))
+
+    def messages(self, user_id, conversation_id=None, limit=MAX_STORED_MESSAGES):
+        with self._locked(user_id, conversation_id, tail=True) as (entry, conversation_id):
+            if conversation_id not in entry.conversations:
+                return []
+            messages = self._tail(entry, conversation_id)
+            return [dict(m) for m in messages[-limit:]] if limit else []
+
+    def list_conversations(self, user_id):
+        with self._locked(user_id) as (entry, _):
+            conversations = [dict(c) for c in entry.conversations.values()]
+        conversations.sort(key=recency_key, reverse=True)
+        return conversations
+
+    def conversation_info(self, user_id, conversation_id=None):
+        with self._locked(user_id) as (entry, _):
+            conversations = entry.conversations
+            if not conversation_id:
+                if not conversations:
+                    return None
+                return dict(max(conversations.values(), key=recency_key))
+            conversation = conversations.get(conversation_id)
+            return dict(conversation) if conversation is not None else None
+
+    def message_page(self, user_id, conversation_id, limit, before=None):
+        """From memory: the cached tail is everything the backing store keeps"""
+        with self._locked(user_id, conversation_id, tail=True) as (entry, conversation_id):
+            if conversation_id not in entry.conversations:
+                return [], None
+            messages = [dict(m) for m in self._tail(entry, conversation_id)]
+        return message_window(messages, limit, before)
+
+    def get_conversation(self, user_id, conversation_id):
+        with self._locked(user_id, conversation_id, tail=True) as (entry, _):
+            conversation = entry.conversations.get(conversation_id)
+            if conversation is None:
+                return None
+            result = {key: conversation[key] for key in ("conversation_id", "title", "created_at", "updated_at")}
+            result["messages"] = [dict(m) for m in self._tail(entry, conversation_id)]
+            return result
+
+    def delete_conversation(self, user_id, conversation_id):
+        with self._flush_lock:
+            self._flush_user(user_id)
+            with self._lock:
+                entry = self._users.get(user_id)
+                if entry is not None:
+                    entry.conversations.pop(conversation_id, None)
+                    entry.messages.pop(conversation_id, None)
+            return self.backing.delete_conversation(user_id, conversation_id)
+
+    def clear_user(self, user_id):
+        with self._flush_lock:
+            self._flush_user(user_id)
+            with self._lock:
+                self._users.pop(user_id, None)
+            self.backing.clear_user(user_id)
+
+    def user_ids(self):
+        self.flush()
+        return self.backing.user_ids()
+
+    def archive_conversation(self, user_id, conversation_id, archive):
+        with self._flush_lock:
+            self._flush_user(user_id)
+            archived = self.backing.archive_conversation(user_id, conversation_id, archive)
+            if archived:
+                with self._lock:
+                    entry = self._users.get(user_id)
+                    if entry is not None and conversation_id in entry.conversations:
+                        entry.conversations[conversation_id]["archived"] = True
+                        entry.messages.pop(conversation_id, None)
+            return archived
+
+    def restore_conversation(self, user_id, conversation_id, archive):
+        with self._flush_lock:
+            self._flush_user(user_id)
+            restored = self.backing.restore_conversation(user_id, conversation_id, archive)
+            if restored:
+                info = self.backing.conversation_info(user_id, conversation_id)
+                with self._lock:
+                    entry = self._users.get(user_id)
+                    if entry is not None:
+                        entry.conversations[conversation_id] = info
+                        entry.messages.pop(conversation_id, None)  # Reloaded from the backing store on next read
+            return restored
+
+    def storage_bytes(self):
+        return self.backing.storage_bytes()
+
+    def reclaim_space(self):
+        self.backing.reclaim_space()
+
+    def _take(self, user_id):
+        """Move a user's queued ops to the writer; caller holds the lock"""
+        entry = self._users.get(user_id)
+        if entry is None or not entry.pending:
+            return entry, []
+        ops, entry.pending = entry.pending, []
+        entry.inflight += len(ops)
+        self._pending_ops -= len(ops)
+        return entry, ops
+
+    def _write(self, user_id, entry, ops):
+        try:
+            self.backing.write_batch(user_id, ops)
+        except Exception:
+            log.exception("Error flushing conversations for %s", user_id)
+            with self._lock:
+                self._flush_errors += 1
+                # Put the batch back in front of anything queued since, retried on the next flush
+                entry.pending[:0] = ops
+                self._pending_ops += len(ops)
+                entry.inflight -= len(ops)
+            return False
+        with self._lock:
+            entry.inflight -= len(ops)
+            self._flushed_ops += len(ops)
+        return True
+
+    def _flush_user(self, user_id):
+        """Caller holds the flush lock"""
+        with self._lock:
+            entry, ops = self._take(user_id)
+        if ops:
+            self._write(user_id, entry, ops)
+
+    def flush_user(self, user_id):
+        with self._flush_lock:
+            self._flush_user(user_id)
+
+    def flush(self):
+        """Write every user's queued ops to the backing store"""
+        # Flushes run one at a time so a user's batches reach the backing store in order
+        with self._flush_lock:
+            with self._lock:
+                batches = [(user_id,) + self._take(user_id) for user_id in list(self._users)]
+                self._flushes += 1
+            for user_id, entry, ops in batches:
+                if ops:
+                    self._write(user_id, entry, ops)
+
+    def _run_writer(self):
+        while True:
+            with self._lock:
+                if self._pending_ops < self.max_pending and not self._closed:
+                    self._wake.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def close(self):
+        """Stop the writer after a final flush"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wake.notify()
+        self._writer.join()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "users_cached": len(self._users),
+                "pending_ops": self._pending_ops,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "flushes": self._flushes,
+                "flushed_ops": self._flushed_ops,
+                "flush_errors": self._flush_errors,
+                "max_users": self.max_users,
+                "flush_interval": self.flush_interval,
+            }
+
+
+STORE_KINDS = ("json", "sqlite")
+
+
+def open_store(kind, json_dir="./conversations", db_path="./conversations.db"):
+    """The JSON or SQLite store by name (CONVERSATION_STORE in app.py)"""
+    if kind == "json":
+        return JsonConversationStore(json_dir)
+    if kind == "sqlite":
+        return SqliteConversationStore(db_path)
+    raise ValueError(f"Unknown conversation store {kind!r}, expected one of {', '.join(STORE_KINDS)}")
+
+
+def migrate_json_to_sqlite(json_dir, sqlite_store):
+    """Copy every user file in json_dir into sqlite_store; returns (users, conversations imported)"""
+    source = JsonConversationStore(json_dir)
+    users = conversations = 0
+    for file_path in sorted(glob.glob(os.path.join(json_dir, "*.json"))):
+        user_id = os.path.splitext(os.path.basename(file_path))[0]
+        conversations += sqlite_store.import_user(user_id, source.load_user(user_id, file_path))
+        users += 1
+    return users, conversations
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Conversation store maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate = subparsers.add_parser("migrate", help="Copy conversations/*.json into the SQLite store")
+    migrate.add_argument("--source", default="./conversations")
+    migrate.add_argument("--db", default="./conversations.db")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        users, conversations = migrate_json_to_sqlite(args.source, SqliteConversationStore(args.db))
+        print(f"✅ Migrated {conversations} conversations from {users} user files into {args.db}")
@@ -0,0 +1,82 @@
+"""
+Row-id keyed corpus store and id-mapped FAISS helpers
+- Indexes carry the original CSV row id of every vector (IndexIDMap2)
+- CorpusStore maps those row ids back to answer text
+- Empty rows (e.g. answers not yet translated) are simply absent from both
+"""
+import numpy as np
+import faiss
+
+
+class CorpusStore:
+    """Compact row-id → text store (sorted id array + parallel text list)"""
+
+    def __init__(self, row_ids, texts):
+        order = np.argsort(np.asarray(row_ids, dtype=np.int64), kind="stable")
+        self.row_ids = np.asarray(row_ids, dtype=np.int64)[order]
+        self.texts = [texts[i] for i in order]
+
+    @classmethod
+    def from_texts(cls, texts):
+        """Build a store from a full CSV column, keeping only non-empty rows"""
+        row_ids = []
+        kept = []
+        for row_id, text in enumerate(texts):
+            if isinstance(text, str) and text.strip():
+                row_ids.append(row_id)
+                kept.append(text)
+        return cls(row_ids, kept)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __contains__(self, row_id):
+        return self._position(row_id) is not None
+
+    def _position(self, row_id):
+        pos = int(np.searchsorted(self.row_ids, row_id))
+        if pos < len(self.row_ids) and self.row_ids[pos] == row_id:
+            return pos
+        return None
+
+    def get(self, row_id):
+        """Return the text for a row id, or None if the row is empty/unknown (FAISS pads with -1)"""
+        if row_id < 0:
+            return None
+        pos = self._position(row_id)
+        return self.texts[pos] if pos is not None else None
+
+    def subset(self, row_ids):
+        """Return (row_ids, texts) for the given ids that exist in the store"""
+        ids = []
+        texts = []
+        for row_id in row_ids:
+            text = self.get(int(row_id))
+            if text is not None:
+                ids.append(int(row_id))
+                texts.append(text)
+        return np.asarray(ids, dtype=np.int64), texts
+
+
+def new_id_index(dimension):
+    """Create an empty L2 index that stores original row ids"""
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+
+
+def add_with_row_ids(index, embeddings, row_ids):
+    """Add embeddings to an id-mapped index under their original row ids"""
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    index.add_with_ids(embeddings, np.asarray(row_ids, dtype=np.int64))
+
+
+def is_id_mapped(index):
+    """True if the index returns original row ids rather than insertion positions"""
+    return hasattr(index, "id_map")
+
+
+def indexed_row_ids(index):
+    """Row ids already present in an index"""
+    if is_id_mapped(index):
+        return faiss.vector_to_array(index.id_map).astype(np.int64)
+    # Plain flat index: positions are the ids
+    return np.arange(index.ntotal, dtype=np.int64)
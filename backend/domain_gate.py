@@ -0,0 +1,128 @@
+"""
+Semantic off-domain gate
+- In-domain and off-domain prototype queries (domain_prototypes.json) are
+  embedded once and reduced to one normalized centroid per topic; centroids are
+  cached next to the app, keyed by the prototypes and the encoder
+- check() reuses the query vector already computed for FAISS: two small matrix
+  products, no extra encoding
+- A query is only gated when it is clearly off-domain: closer to an off-domain
+  topic than to every in-domain topic by a margin, and not similar enough to
+  any in-domain topic
+- Keeps counters of checked/gated queries and the generation time gated
+  queries did not spend
+- Off unless DOMAIN_GATE=on: measure the false-gate rate of the thresholds on
+  the real corpus with benchmarks/bench_domain_gate.py before enabling it
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import namedtuple
+import numpy as np
+
+PROTOTYPES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "domain_prototypes.json")
+
+# Gate only when best off-domain similarity - best in-domain similarity >= margin ...
+DEFAULT_MARGIN = 0.1
+# ... and the best in-domain similarity is below this
+DEFAULT_MAX_IN_DOMAIN = 0.45
+
+Verdict = namedtuple("Verdict", ["off_domain", "in_domain_score", "off_domain_score", "topic"])
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def topic_centroids(encode, topics):
+    """{topic: [texts]} -> (topic names, normalized centroid matrix), one encode call for all texts"""
+    names = list(topics)
+    texts = [text for name in names for text in topics[name]]
+    vectors = _normalize(encode(texts))
+    centroids, start = [], 0
+    for name in names:
+        count = len(topics[name])
+        centroids.append(vectors[start:start + count].mean(axis=0))
+        start += count
+    return names, _normalize(np.stack(centroids))
+
+
+class DomainGate:
+    """Nearest-centroid off-domain check on retrieval query vectors"""
+
+    def __init__(self, in_names, in_centroids, off_names, off_centroids,
+                 margin=DEFAULT_MARGIN, max_in_domain=DEFAULT_MAX_IN_DOMAIN):
+        self.in_names = list(in_names)
+        self.in_centroids = _normalize(in_centroids)
+        self.off_names = list(off_names)
+        self.off_centroids = _normalize(off_centroids)
+        self.margin = margin
+        self.max_in_domain = max_in_domain
+        self._lock = threading.Lock()
+        self._checked = 0
+        self._gated = 0
+        self._generations = 0
+        self._generation_seconds = 0.0
+
+    @classmethod
+    def build(cls, encode, prototypes_path=PROTOTYPES_PATH, cache_path=None, encoder_id="", **thresholds):
+        """Centroids from the prototype file, reusing cache_path when prototypes and encoder are unchanged"""
+        with open(prototypes_path, "rb") as f:
+            raw = f.read()
+        key = hashlib.sha1(raw + encoder_id.encode("utf-8")).hexdigest()
+        if cache_path and os.path.exists(cache_path):
+            cached = np.load(cache_path)
+            if str(cached["key"]) == key:
+                return cls([str(n) for n in cached["in_names"]], cached["in_centroids"],
+                           [str(n) for n in cached["off_names"]], cached["off_centroids"], **thresholds)
+
+        prototypes = json.loads(raw)
+        in_names, in_centroids = topic_centroids(encode, prototypes["in_domain"])
+        off_names, off_centroids = topic_centroids(encode, prototypes["off_domain"])
+        if cache_path:
+            np.savez(cache_path, key=np.array(key), in_names=np.array(in_names), in_centroids=in_centroids,
+                     off_names=np.array(off_names), off_centroids=off_centroids)
+        return cls(in_names, in_centroids, off_names, off_centroids, **thresholds)
+
+    def score(self, query_vec):
+        """Verdict for one query vector (shape (dim,) or (1, dim))"""
+        query = _normalize(np.asarray(query_vec, dtype=np.float32).reshape(-1))
+        in_scores = self.in_centroids @ query
+        off_scores = self.off_centroids @ query
+        best_in = float(in_scores.max())
+        best_off_index = int(off_scores.argmax())
+        best_off = float(off_scores[best_off_index])
+        off_domain = best_off - best_in >= self.margin and best_in < self.max_in_domain
+        return Verdict(off_domain, best_in, best_off, self.off_names[best_off_index])
+
+    def check(self, query_vec):
+        """score() plus counters"""
+        verdict = self.score(query_vec)
+        with self._lock:
+            self._checked += 1
+            self._gated += verdict.off_domain
+        return verdict
+
+    def observe_generation(self, seconds):
+        """Record the duration of one generation, used to estimate the compute gated queries avoided"""
+        with self._lock:
+            self._generations += 1
+            self._generation_seconds += seconds
+
+    def stats(self):
+        with self._lock:
+            avg_generation = self._generation_seconds / self._generations if self._generations else None
+            return {
+                "checked": self._checked,
+                "gated": self._gated,
+                "gated_fraction": round(self._gated / self._checked, 4) if self._checked else 0.0,
+                "generations": self._generations,
+                "avg_generation_seconds": round(avg_generation, 3) if avg_generation is not None else None,
+                "generation_seconds_avoided": round(avg_generation * self._gated, 1) if avg_generation is not None else None,
+                "margin": self.margin,
+                "max_in_domain": self.max_in_domain,
+                "in_domain_topics": self.in_names,
+                "off_domain_topics": self.off_names,
+            }
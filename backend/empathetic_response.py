@@ -0,0 +1,165 @@
+"""
+Empathetic fallback responses (validation → explanation → tips → closing)
+- Used when generation fails, echoes the instructions or comes out too short
+- Explanation and tip sentences come from the precomputed sentence annotations
+  of the retrieved corpus rows (sentence_annotations.py), or are classified on
+  the fly for other context
+- Built in English; translate (en → sw) is applied to the finished response
+"""
+import random
+from sentence_annotations import classify_text, FLAG_NON_KENYAN
+from structured_logging import get_logger
+
+log = get_logger("empathetic_response")
+
+# English empathetic openings (the whole response is translated at the end in Swahili mode)
+EMPATHETIC_OPENINGS = {
+    "pain": [
+        "I'm really sorry you're going through that — it can be so uncomfortable.",
+        "That sounds really tough, and I want you to know your feelings are completely valid.",
+        "I hear you, and I know how frustrating period pain can be.",
+        "I'm sorry you're dealing with this. Period pain is no joke."
+    ],
+    "anxious": [
+        "It's totally normal to feel worried about this, and I'm glad you're asking.",
+        "I understand this can feel scary or confusing. Let's walk through this together.",
+        "Your concerns are completely valid, and I'm here to help you understand.",
+        "It's okay to feel anxious about this — you're not alone in wondering."
+    ],
+    "sad": [
+        "I'm sorry you're going through this. Your feelings matter.",
+        "I hear you, and I want to help you feel better.",
+        "That sounds really difficult, and I'm here to support you."
+    ],
+    "neutral": [
+        "That's a great question!",
+        "I'm happy to help you understand this.",
+        "Absolutely! Let me walk you through this.",
+        "Of course! I'd be happy to explain."
+    ]
+}
+
+# English supportive closings
+SUPPORTIVE_CLOSINGS = {
+    "pain": [
+        "If your pain is severe or really interfering with your daily life, it's worth talking to a healthcare provider who can help you find the best solution.",
+        "Take care of yourself, and don't hesitate to reach out if you need more support.",
+        "I hope you find some relief soon. You're doing great by taking care of yourself."
+    ],
+    "anxious": [
+        "If you're really worried, don't hesitate to reach out to a healthcare provider who can give you personalized advice.",
+        "It's okay to have questions, and I'm here whenever you need support.",
+        "You're doing the right thing by asking questions and taking care of your health."
+    ],
+    "sad": [
+        "I'm here for you, and I want you to know that your feelings are completely valid.",
+        "Take care of yourself, and remember that you're not alone in this.",
+        "I hope this helps, and I'm always here if you need to talk more."
+    ],
+    "neutral": [
+        "I hope this helps! Feel free to ask if you have more questions.",
+        "You're doing great by asking questions and learning about your health.",
+        "I'm here whenever you need support or have more questions."
+    ]
+}
+
+
+def create_empathetic_response(user_input, context, emotion, language="en", context_rows=None,
+                               exclude_flags=FLAG_NON_KENYAN, annotations=None, translate=None):
+    """Create a warm, big-sister style response following: validation → explanation → tips → closing
+    context_rows: English corpus row ids the context was retrieved from (uses annotations)
+    annotations: SentenceAnnotations for the English corpus, or None
+    translate: en → sw function for Swahili mode, or None when translation is unavailable"""
+    fallback_message = f"{random.choice(EMPATHETIC_OPENINGS.get(emotion, EMPATHETIC_OPENINGS['neutral']))} I want to make sure I give you accurate information. Could you tell me a bit more about what specifically you'd like to know? I'm here to support you."
+    
+    opening = random.choice(EMPATHETIC_OPENINGS.get(emotion, EMPATHETIC_OPENINGS["neutral"]))
+    closing = random.choice(SUPPORTIVE_CLOSINGS.get(emotion, SUPPORTIVE_CLOSINGS["neutral"]))
+    
+    # Store original language for translation at the end
+    needs_translation = (language == "sw")
+    
+    # If we have context, create a detailed response following structure:
+    # 1. Validation + empathy
+    # 2. Clear explanation
+    # 3. Tips/actionable steps
+    # 4. Supportive closing
+    
+    # Sort context sentences into explanation and tip buckets. Retrieved corpus rows use the
+    # precomputed annotations (sentence_annotations.py); other context is classified on the fly
+    explanation_sentences, tip_sentences = [], []
+    if context_rows is not None and annotations is not None:
+        explanation_ids, tip_ids = annotations.fallback_sentences(context_rows, exclude_flags)
+        explanation_sentences = [annotations.text(i) for i in explanation_ids]
+        tip_sentences = [annotations.text(i) for i in tip_ids]
+    elif context:
+        explanation_sentences, tip_sentences = classify_text(context)
+
+    if explanation_sentences or tip_sentences:
+        # Build response following structure
+        response_parts = []
+        
+        # 1. Validation + empathy (opening)
+        response_parts.append(opening)
+        
+        # 2. Clear explanation (1-2 sentences)
+        if explanation_sentences:
+            # Take first 1-2 explanation sentences
+            for sent in explanation_sentences[:2]:
+                if sent and sent not in response_parts:
+                    response_parts.append(sent)
+        
+        # 3. Tips/actionable steps (2-3 sentences)
+        if tip_sentences:
+            # Take 2-3 actionable tips
+            for sent in tip_sentences[:3]:
+                if sent and sent not in response_parts:
+                    response_parts.append(sent)
+        
+        # If we don't have enough, use any useful sentences
+        if len(response_parts) < 4:
+            all_useful = explanation_sentences + tip_sentences
+            for sent in all_useful:
+                if sent and sent not in response_parts and len(response_parts) < 5:
+                    response_parts.append(sent)
+        
+        # Combine parts
+        if len(response_parts) > 1:
+            response = '. '.join(response_parts)
+            if not response.endswith('.'):
+                response += '.'
+            response += f' {closing}'
+            
+            # Ensure we have at least 4 sentences total
+            sentence_count = len([s for s in response.split('.') if s.strip()])
+            if sentence_count < 4:
+                # Add one more useful sentence if available
+                remaining = [s for s in (explanation_sentences + tip_sentences) if s not in response_parts]
+                if remaining:
+                    response = response.replace(closing, f'{remaining[0]}. {closing}')
+            
+            # Translate to Swahili if needed
+            if needs_translation:
+                try:
+                    if translate is not None:
+                        response = translate(response)
+                        log.debug("Empathetic response translated to Swahili")
+                except Exception as e:
+                    log.warning("Translation error in empathetic response: %s", e)
+                    # Keep English response as fallback
+            
+            return response
+    
+    # Fallback if no context
+    response = fallback_message
+    
+    # Translate to Swahili if needed
+    if needs_translation:
+        try:
+            if translate is not None:
+                response = translate(response)
+                log.debug("Fallback message translated to Swahili")
+        except Exception as e:
+            log.warning("Translation error in fallback: %s", e)
+            # Keep English response as fallback
+    
+    return response
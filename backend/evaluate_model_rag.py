@@ -2,22 +2,40 @@
 Evaluation Metrics Script for Model and RAG Implementation
 Evaluates both the fine-tuned Flan-T5 model and RAG retrieval system
 using the menstrual_data.csv dataset.
+Models, corpus and index come from rag_engine.build_engine(), and "with RAG"
+answers go through RagEngine.prepare()/complete(), the same pipeline /chat
+serves (STUB_MODELS=1 runs it with stub models).
+- Generation is batched by prompt length (batch_generation.py), optionally
+  across --workers processes, and cached in generation_cache.jsonl by prompt,
+  settings and model hash: a rerun only generates what changed, and an
+  interrupted run picks up where it stopped
+- BLEU/ROUGE/METEOR are computed in a pool of --metric-workers processes
+- Both runs decode with the same deterministic settings (EVAL_GENERATION_SETTINGS:
+  /chat's beam search without sampling) and generation is seeded with --seed, so
+  the RAG comparison only measures the context; both are saved in the results
+
+Usage (from backend/):
+    python evaluate_model_rag.py [--generation-samples 1000] [--batch-size 8] [--workers 1]
+        [--metric-workers N] [--no-cache] [--seed 42]
 """
 
+import argparse
+import random
 import pandas as pd
 import numpy as np
-import faiss
-import torch
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
-from sentence_transformers import SentenceTransformer
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 from nltk.translate.bleu_score import sentence_bleu, SmoothingFunction
 from nltk.translate.meteor_score import meteor_score
 from rouge_score import rouge_scorer
 import json
 from datetime import datetime
 import os
-from tqdm import tqdm
 import nltk
+from rag_engine import build_engine, Reply, GENERATION_KWARGS
+from batch_generation import (BatchGenerator, GenerationCache, model_fingerprint, load_pipeline, load_stub_generator,
+                              DEFAULT_BATCH_SIZE)
 
 # Download required NLTK data
 try:
@@ -36,83 +54,63 @@ except LookupError:
 # ==================== Configuration ====================
 MODEL_PATH = "./model"
 DATA_PATH = "./menstrual_data.csv"
-EMBEDDINGS_PATH = "./embeddings.npy"
-INDEX_PATH = "./menstrual_index.faiss"
 EVAL_RESULTS_PATH = "./evaluation_results.json"
+GENERATION_CACHE_PATH = "./generation_cache.jsonl"
 
 # Evaluation parameters
 TOP_K_VALUES = [1, 3, 5, 10]  # For retrieval metrics
 TEST_SIZE = 0.2  # Use 20% of data for testing
-MAX_RETRIEVAL_SAMPLES = 500  # Limit retrieval evaluation to this many samples for speed
-MAX_GENERATION_SAMPLES = 100  # Limit generation evaluation to this many samples for speed
+MAX_RETRIEVAL_SAMPLES = None  # Whole test split (retrieval is batched; set a number to limit it)
+MAX_GENERATION_SAMPLES = 1000  # Per run (with and without RAG); cached generations make reruns cheap
 RANDOM_SEED = 42
+EVAL_BATCH_SIZE = 256  # Texts per embedder.encode batch
+# Decoding for both runs (with and without RAG): /chat's settings without sampling, so
+# the comparison is deterministic and only the prompt differs between the two runs
+EVAL_GENERATION_SETTINGS = {key: value for key, value in GENERATION_KWARGS.items()
+                            if key not in ("temperature", "top_p")}
+EVAL_GENERATION_SETTINGS["do_sample"] = False
+METRICS = ['bleu', 'rouge1', 'rouge2', 'rougeL', 'meteor', 'semantic_similarity']
 
-# ==================== Load Models and Data ====================
-
-print("Loading models and data...")
-
-# Load fine-tuned model
-tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
-model = AutoModelForSeq2SeqLM.from_pretrained(MODEL_PATH)
-model.eval()
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model.to(device)
-
-chat_pipe = pipeline(
-    "text2text-generation",
-    model=model,
-    tokenizer=tokenizer,
-    max_new_tokens=500,
-    device=0 if torch.cuda.is_available() else -1
-)
-
-# Load embeddings and FAISS index
-embeddings = np.load(EMBEDDINGS_PATH)
-index = faiss.read_index(INDEX_PATH)
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
-
-# Load menstrual data
-df = pd.read_csv(DATA_PATH)
-print(f"Loaded {len(df)} question-answer pairs")
-
-# Split into train/test
-np.random.seed(RANDOM_SEED)
-test_indices = np.random.choice(len(df), size=int(len(df) * TEST_SIZE), replace=False)
-train_indices = np.setdiff1d(np.arange(len(df)), test_indices)
-
-test_df = df.iloc[test_indices].reset_index(drop=True)
-print(f"Test set size: {len(test_df)}")
-
-# Prepare corpus for retrieval
-corpus = df["answer"].fillna("").tolist()
-
-# Initialize metrics
+# Initialize metrics (module level: metric worker processes use them too)
 rouge_scorer = rouge_scorer.RougeScorer(['rouge1', 'rouge2', 'rougeL'], use_stemmer=True)
 smoothing = SmoothingFunction().method1
 
-# ==================== Helper Functions ====================
+# ==================== Load Models and Data ====================
+# Loaded by main() only, so worker processes importing this module stay light
+engine = chat_pipe = embedder = index = device = df = test_df = None
 
-def retrieve_context(query, top_k=5):
-    """Retrieve context using FAISS"""
-    query_vec = embedder.encode([query], convert_to_numpy=True)
-    distances, indices = index.search(query_vec, top_k)
+def load_models_and_data():
+    global engine, chat_pipe, embedder, index, device, df, test_df
+    import torch
     
-    retrieved_texts = []
-    for idx in indices[0]:
-        if idx < len(corpus):
-            retrieved_texts.append(corpus[idx])
+    print("Loading models and data...")
     
-    return "\n".join(retrieved_texts[:top_k]), indices[0][:top_k]
-
-def generate_response(query, context=None, use_rag=True):
-    """Generate response with or without RAG"""
-    if use_rag and context:
-        prompt = f"Context: {context}\n\nQuestion: {query}\nAnswer:"
-    else:
-        prompt = f"Question: {query}\nAnswer:"
+    # Fine-tuned model, embedder and FAISS index, loaded as app.py loads them
+    engine = build_engine()
+    chat_pipe = engine.generator
+    embedder = engine.embedder
+    index = engine.index
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    
+    # Load menstrual data
+    df = pd.read_csv(DATA_PATH)
+    print(f"Loaded {len(df)} question-answer pairs")
+    
+    # Split into train/test
+    np.random.seed(RANDOM_SEED)
+    test_indices = np.random.choice(len(df), size=int(len(df) * TEST_SIZE), replace=False)
     
-    result = chat_pipe(prompt, max_length=512, do_sample=False)
-    return result[0]["generated_text"].replace(prompt, "").strip()
+    test_df = df.iloc[test_indices].reset_index(drop=True)
+    print(f"Test set size: {len(test_df)}")
+
+# ==================== Helper Functions ====================
+
+def seed_everything(seed):
+    """Seed python, numpy and torch (workers are seeded by their loader)"""
+    random.seed(seed)
+    np.random.seed(seed)
+    import torch
+    torch.manual_seed(seed)
 
 def tokenize(text):
     """Simple tokenization for BLEU/METEOR"""
@@ -140,17 +138,41 @@ def compute_rouge(reference, candidate):
         'rougeL': scores['rougeL'].fmeasure
     }
 
-def compute_semantic_similarity(text1, text2):
-    """Compute cosine similarity between embeddings"""
-    emb1 = embedder.encode([text1], convert_to_numpy=True)
-    emb2 = embedder.encode([text2], convert_to_numpy=True)
-    similarity = np.dot(emb1[0], emb2[0]) / (np.linalg.norm(emb1[0]) * np.linalg.norm(emb2[0]))
-    return float(similarity)
+def score_pair(pair):
+    """BLEU, ROUGE and METEOR for one (reference, candidate) pair (runs in metric workers)"""
+    reference, candidate = pair
+    return {"bleu": compute_bleu(reference, candidate), **compute_rouge(reference, candidate),
+            "meteor": compute_meteor(reference, candidate)}
+
+def score_pairs(pairs, workers):
+    """score_pair over all pairs, in a process pool when workers > 1"""
+    if workers <= 1 or len(pairs) < 2:
+        return [score_pair(pair) for pair in pairs]
+    chunksize = max(1, len(pairs) // (workers * 8))
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(score_pair, pairs, chunksize=chunksize))
+
+def semantic_similarities(texts1, texts2):
+    """Cosine similarity of each pair, with both lists encoded in batches"""
+    emb1 = embedder.encode(list(texts1), batch_size=EVAL_BATCH_SIZE, convert_to_numpy=True)
+    emb2 = embedder.encode(list(texts2), batch_size=EVAL_BATCH_SIZE, convert_to_numpy=True)
+    norms = np.linalg.norm(emb1, axis=1) * np.linalg.norm(emb2, axis=1)
+    return np.einsum("ij,ij->i", emb1, emb2) / np.maximum(norms, 1e-12)
 
 # ==================== RAG Retrieval Metrics ====================
 
+def answer_groups(answers):
+    """Answer-to-ids map as group codes: rows sharing an answer text share a code
+    Returns (code per row of answers, function mapping answer texts to codes; -1 for NaN/unknown)"""
+    codes, uniques = pd.factorize(answers)
+    lookup = pd.Index(uniques)
+    return codes, lambda texts: lookup.get_indexer(texts)
+
 def evaluate_retrieval(test_df, top_k_values, max_samples=None):
-    """Evaluate retrieval quality"""
+    """Evaluate retrieval quality
+    All queries are encoded in one batched call and searched once at max(top_k_values);
+    every metric for every k is sliced from that one result. A retrieved row is relevant
+    when its answer is the test row's answer (duplicated answers all count)."""
     print("\n" + "="*60)
     print("Evaluating RAG Retrieval Metrics")
     print("="*60)
@@ -159,60 +181,54 @@ def evaluate_retrieval(test_df, top_k_values, max_samples=None):
     eval_df = test_df.head(max_samples) if max_samples and len(test_df) > max_samples else test_df
     print(f"Using {len(eval_df)} samples for retrieval evaluation (out of {len(test_df)} total test samples)")
     
+    # Ground truth: rows without a known answer are skipped, as before
+    row_codes, codes_for = answer_groups(df["answer"])
+    true_codes = codes_for(eval_df["answer"])
+    keep = true_codes >= 0
+    queries = eval_df["question"].fillna("").astype(str).to_numpy()[keep].tolist()
+    true_codes = true_codes[keep]
+    
+    # One batched encode and one search at the largest k
+    max_k = max(top_k_values)
+    query_vecs = embedder.encode(queries, batch_size=EVAL_BATCH_SIZE, convert_to_numpy=True,
+                                 show_progress_bar=True)
+    _, indices = index.search(np.ascontiguousarray(query_vecs, dtype=np.float32), max_k)
+    
+    # relevant[i, r]: the r-th result of query i has the query's answer (ids are CSV row ids; -1 = no result)
+    valid = (indices >= 0) & (indices < len(row_codes))
+    retrieved_codes = np.where(valid, row_codes[np.clip(indices, 0, len(row_codes) - 1)], -1)
+    relevant = (retrieved_codes == true_codes[:, None]) & valid
+    first_rank = np.where(relevant.any(axis=1), relevant.argmax(axis=1), max_k)  # 0-based, max_k = none
+    
+    # Context relevance: similarity between the query and the first 500 characters of the
+    # retrieved context; the distinct contexts of all queries and k are encoded in one batch
+    texts = [[engine.store.get(idx) or "" for idx in row if idx >= 0] for row in indices.tolist()]
+    contexts = {k: ["\n".join(row[:k])[:500] for row in texts] for k in top_k_values}
+    distinct = sorted({c for k in top_k_values for c in contexts[k] if c})
+    print(f"Encoding {len(distinct)} distinct contexts...")
+    context_vecs = embedder.encode(distinct, batch_size=EVAL_BATCH_SIZE, convert_to_numpy=True,
+                                   show_progress_bar=True) if distinct else np.zeros((0, query_vecs.shape[1]))
+    context_position = {c: i for i, c in enumerate(distinct)}
+    query_unit = query_vecs / np.maximum(np.linalg.norm(query_vecs, axis=1, keepdims=True), 1e-12)
+    context_unit = context_vecs / np.maximum(np.linalg.norm(context_vecs, axis=1, keepdims=True), 1e-12)
+    
     results = {}
     
     for top_k in top_k_values:
-        print(f"\nEvaluating with top_k={top_k}...")
-        
-        precision_scores = []
-        recall_scores = []
-        mrr_scores = []
-        relevance_scores = []
-        
-        for idx, row in tqdm(eval_df.iterrows(), total=len(eval_df), desc=f"Top-{top_k}"):
-            query = row["question"]
-            true_answer = row["answer"]
-            
-            # Retrieve contexts
-            context, retrieved_indices = retrieve_context(query, top_k=top_k)
-            
-            # Find ground truth index
-            true_idx = df[df["answer"] == true_answer].index
-            if len(true_idx) > 0:
-                true_idx = true_idx[0]
-            else:
-                continue
-            
-            # Precision@K: Is the true answer in retrieved results?
-            is_relevant = true_idx in retrieved_indices
-            precision_scores.append(1.0 if is_relevant else 0.0)
-            
-            # Recall@K: For retrieval, we consider if relevant answer is found
-            recall_scores.append(1.0 if is_relevant else 0.0)
-            
-            # MRR: Mean Reciprocal Rank
-            if is_relevant:
-                rank = np.where(retrieved_indices == true_idx)[0]
-                if len(rank) > 0:
-                    mrr_scores.append(1.0 / (rank[0] + 1))
-                else:
-                    mrr_scores.append(0.0)
-            else:
-                mrr_scores.append(0.0)
-            
-            # Context relevance: Semantic similarity between query and retrieved context
-            if context:
-                relevance = compute_semantic_similarity(query, context[:500])  # Limit length
-                relevance_scores.append(relevance)
-            else:
-                relevance_scores.append(0.0)
+        hits = first_rank < top_k
+        reciprocal_rank = np.where(hits, 1.0 / (first_rank + 1), 0.0)
+        positions = np.array([context_position.get(c, -1) for c in contexts[top_k]], dtype=np.int64)
+        relevance = np.zeros(len(queries))
+        has_context = positions >= 0
+        relevance[has_context] = np.einsum("ij,ij->i", query_unit[has_context], context_unit[positions[has_context]])
         
         results[f"top_{top_k}"] = {
-            "precision": np.mean(precision_scores),
-            "recall": np.mean(recall_scores),
-            "mrr": np.mean(mrr_scores),
-            "context_relevance": np.mean(relevance_scores),
-            "num_samples": len(precision_scores)
+            # Precision/recall@K: is a row with the true answer among the top K (as before)
+            "precision": float(hits.mean()) if len(hits) else 0.0,
+            "recall": float(hits.mean()) if len(hits) else 0.0,
+            "mrr": float(reciprocal_rank.mean()) if len(hits) else 0.0,
+            "context_relevance": float(relevance.mean()) if len(hits) else 0.0,
+            "num_samples": int(len(hits))
         }
         
         print(f"  Precision@{top_k}: {results[f'top_{top_k}']['precision']:.4f}")
@@ -224,85 +240,64 @@ def evaluate_retrieval(test_df, top_k_values, max_samples=None):
 
 # ==================== Model Generation Metrics ====================
 
-def evaluate_model_generation(test_df, use_rag=True, max_samples=None):
+def generate_candidates(queries, use_rag, generator):
+    """(candidate, outcome) per query; outcome is the /chat outcome or fallback reason
+    With RAG, each query is prepared by the engine (retrieval, context, prompt), all
+    prompts are generated in batches, and the engine checks and validates each answer"""
+    if use_rag:
+        turns = [engine.prepare(query, "en") for query in queries]
+        pending = [i for i, turn in enumerate(turns) if not isinstance(turn, Reply)]
+        texts = generator.generate([turns[i].prompt for i in pending], desc="Generating (RAG)",
+                                   **EVAL_GENERATION_SETTINGS)
+        replies = list(turns)
+        for i, text in zip(pending, texts):
+            replies[i] = engine.complete(turns[i], text)
+        return [(reply.response, reply.fallback_reason or reply.outcome) for reply in replies]
+    
+    prompts = [f"Question: {query}\nAnswer:" for query in queries]
+    texts = generator.generate(prompts, desc="Generating (no RAG)", **EVAL_GENERATION_SETTINGS)
+    return [(text.replace(prompt, "").strip(), "generated") if text is not None else ("", "generation_error")
+            for prompt, text in zip(prompts, texts)]
+
+def evaluate_model_generation(test_df, use_rag=True, max_samples=None, generator=None, metric_workers=1):
     """Evaluate model generation quality with or without RAG"""
     print("\n" + "="*60)
     print(f"Evaluating Model Generation Metrics (RAG={'ON' if use_rag else 'OFF'})")
     print("="*60)
     
-    bleu_scores = []
-    rouge1_scores = []
-    rouge2_scores = []
-    rougeL_scores = []
-    meteor_scores = []
-    semantic_similarities = []
-    
-    results_list = []
-    
-    # Limit to smaller subset for faster evaluation
     eval_subset = test_df.head(max_samples) if max_samples and len(test_df) > max_samples else test_df
     print(f"Using {len(eval_subset)} samples for generation evaluation (out of {len(test_df)} total test samples)")
     
-    for idx, row in tqdm(eval_subset.iterrows(), total=len(eval_subset), desc="Evaluating"):
-        query = row["question"]
-        reference = row["answer"]
-        
-        # Retrieve context if using RAG
-        context = None
-        if use_rag:
-            context, _ = retrieve_context(query, top_k=5)
-        
-        # Generate response
-        try:
-            candidate = generate_response(query, context, use_rag=use_rag)
-        except Exception as e:
-            print(f"Error generating response for query {idx}: {e}")
-            candidate = ""
-        
-        if not candidate:
-            continue
-        
-        # Compute metrics
-        bleu = compute_bleu(reference, candidate)
-        rouge = compute_rouge(reference, candidate)
-        meteor = compute_meteor(reference, candidate)
-        semantic = compute_semantic_similarity(reference, candidate)
-        
-        bleu_scores.append(bleu)
-        rouge1_scores.append(rouge['rouge1'])
-        rouge2_scores.append(rouge['rouge2'])
-        rougeL_scores.append(rouge['rougeL'])
-        meteor_scores.append(meteor)
-        semantic_similarities.append(semantic)
-        
-        results_list.append({
-            "query": query,
-            "reference": reference,
-            "candidate": candidate,
-            "bleu": bleu,
-            "rouge1": rouge['rouge1'],
-            "rouge2": rouge['rouge2'],
-            "rougeL": rouge['rougeL'],
-            "meteor": meteor,
-            "semantic_similarity": semantic
-        })
+    queries = eval_subset["question"].fillna("").astype(str).tolist()
+    references = eval_subset["answer"].fillna("").astype(str).tolist()
+    generated = generate_candidates(queries, use_rag, generator)
+    outcomes = Counter(outcome for _, outcome in generated)
     
-    results = {
-        "bleu": np.mean(bleu_scores),
-        "rouge1": np.mean(rouge1_scores),
-        "rouge2": np.mean(rouge2_scores),
-        "rougeL": np.mean(rougeL_scores),
-        "meteor": np.mean(meteor_scores),
-        "semantic_similarity": np.mean(semantic_similarities),
-        "std_bleu": np.std(bleu_scores),
-        "std_rouge1": np.std(rouge1_scores),
-        "std_rouge2": np.std(rouge2_scores),
-        "std_rougeL": np.std(rougeL_scores),
-        "std_meteor": np.std(meteor_scores),
-        "std_semantic": np.std(semantic_similarities),
-        "num_samples": len(bleu_scores),
-        "detailed_results": results_list[:10]  # Store first 10 for inspection
-    }
+    # Empty candidates are skipped, as before
+    kept = [i for i, (candidate, _) in enumerate(generated) if candidate]
+    pairs = [(references[i], generated[i][0]) for i in kept]
+    print(f"Scoring {len(pairs)} candidates with {metric_workers} metric worker(s)...")
+    scores = score_pairs(pairs, metric_workers)
+    semantic = semantic_similarities([reference for reference, _ in pairs], [candidate for _, candidate in pairs]) \
+        if pairs else np.zeros(0)
+    for score, similarity in zip(scores, semantic):
+        score["semantic_similarity"] = float(similarity)
+    
+    columns = {metric: np.array([score[metric] for score in scores]) for metric in METRICS}
+    n = len(scores)
+    results = {metric: float(columns[metric].mean()) if n else 0.0 for metric in METRICS}
+    std_names = {"semantic_similarity": "std_semantic"}
+    for metric in METRICS:
+        results[std_names.get(metric, f"std_{metric}")] = float(columns[metric].std()) if n else 0.0
+    results.update({
+        "num_samples": n,
+        # Half-width of the 95% confidence interval of each mean
+        "ci95": {metric: float(1.96 * columns[metric].std(ddof=1) / np.sqrt(n)) if n > 1 else None
+                 for metric in METRICS},
+        "outcomes": dict(outcomes),  # generated, or the fallback reason
+        "detailed_results": [{"query": queries[i], "reference": references[i], "candidate": generated[i][0], **score}
+                             for i, score in zip(kept[:10], scores[:10])]  # Store first 10 for inspection
+    })
     
     print(f"\nResults:")
     print(f"  BLEU: {results['bleu']:.4f} (±{results['std_bleu']:.4f})")
@@ -312,12 +307,41 @@ def evaluate_model_generation(test_df, use_rag=True, max_samples=None):
     print(f"  METEOR: {results['meteor']:.4f} (±{results['std_meteor']:.4f})")
     print(f"  Semantic Similarity: {results['semantic_similarity']:.4f} (±{results['std_semantic']:.4f})")
     print(f"  Evaluated {results['num_samples']} samples")
+    if n > 1:
+        print(f"  95% CI half-width: BLEU ±{results['ci95']['bleu']:.4f}, ROUGE-L ±{results['ci95']['rougeL']:.4f}")
+    print(f"  Outcomes: {', '.join(f'{k} {v}' for k, v in outcomes.most_common())}")
     
     return results
 
 # ==================== Main Evaluation ====================
 
 def main():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval and generation")
+    parser.add_argument("--retrieval-samples", type=int, default=MAX_RETRIEVAL_SAMPLES, help="Default: whole test split")
+    parser.add_argument("--generation-samples", type=int, default=MAX_GENERATION_SAMPLES, help="0 = whole test split")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Prompts per generation batch")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Generation processes, each with its own model copy and a share of the CPU cores")
+    parser.add_argument("--metric-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--cache", default=GENERATION_CACHE_PATH, help="Generated text cache (JSON lines)")
+    parser.add_argument("--no-cache", action="store_true", help="Generate everything again and cache nothing")
+    parser.add_argument("--seed", type=int, default=RANDOM_SEED, help="Generation seed (the test split uses RANDOM_SEED)")
+    args = parser.parse_args()
+    generation_samples = args.generation_samples or None
+    
+    load_models_and_data()
+    seed_everything(args.seed)
+    
+    stub = os.getenv("STUB_MODELS", "0") == "1"
+    cache = None
+    if not args.no_cache:
+        model_hash = "stub" if stub else model_fingerprint(MODEL_PATH)
+        cache = GenerationCache(args.cache, model_hash)
+    generator = BatchGenerator(
+        chat_pipe, engine.tokenizer, batch_size=args.batch_size, cache=cache, workers=args.workers,
+        loader=load_stub_generator if stub else load_pipeline,
+        loader_kwargs={"seed": args.seed} if stub else {"model_path": MODEL_PATH, "seed": args.seed})
+    
     print("="*60)
     print("Model and RAG Evaluation Script")
     print("="*60)
@@ -331,22 +355,32 @@ def main():
         "model_path": MODEL_PATH,
         "data_path": DATA_PATH,
         "test_size": len(test_df),
-        "retrieval_samples": MAX_RETRIEVAL_SAMPLES,
-        "generation_samples": MAX_GENERATION_SAMPLES,
+        "retrieval_samples": min(args.retrieval_samples or len(test_df), len(test_df)),
+        "generation_samples": min(generation_samples or len(test_df), len(test_df)),
         "device": device
     }
     
-    # 1. Evaluate RAG Retrieval
-    retrieval_results = evaluate_retrieval(test_df, TOP_K_VALUES, max_samples=MAX_RETRIEVAL_SAMPLES)
-    all_results["rag_retrieval"] = retrieval_results
-    
-    # 2. Evaluate Model with RAG
-    model_with_rag = evaluate_model_generation(test_df, use_rag=True, max_samples=MAX_GENERATION_SAMPLES)
-    all_results["model_with_rag"] = model_with_rag
-    
-    # 3. Evaluate Model without RAG (baseline)
-    model_without_rag = evaluate_model_generation(test_df, use_rag=False, max_samples=MAX_GENERATION_SAMPLES)
-    all_results["model_without_rag"] = model_without_rag
+    try:
+        # 1. Evaluate RAG Retrieval
+        retrieval_results = evaluate_retrieval(test_df, TOP_K_VALUES, max_samples=args.retrieval_samples)
+        all_results["rag_retrieval"] = retrieval_results
+        
+        # 2. Evaluate Model with RAG
+        model_with_rag = evaluate_model_generation(test_df, use_rag=True, max_samples=generation_samples,
+                                                   generator=generator, metric_workers=args.metric_workers)
+        all_results["model_with_rag"] = model_with_rag
+        
+        # 3. Evaluate Model without RAG (baseline)
+        model_without_rag = evaluate_model_generation(test_df, use_rag=False, max_samples=generation_samples,
+                                                      generator=generator, metric_workers=args.metric_workers)
+        all_results["model_without_rag"] = model_without_rag
+    finally:
+        if cache is not None:
+            cache.close()
+    all_results["generation"] = {"generated": generator.generated, "cached": generator.cached,
+                                 "batch_size": args.batch_size, "workers": args.workers, "seed": args.seed,
+                                 "settings": EVAL_GENERATION_SETTINGS}  # Same for with and without RAG
+    print(f"\nGenerations: {generator.generated} generated, {generator.cached} from cache")
     
     # 4. Compare RAG vs No-RAG
     print("\n" + "="*60)
@@ -354,7 +388,7 @@ def main():
     print("="*60)
     
     comparison = {}
-    for metric in ['bleu', 'rouge1', 'rouge2', 'rougeL', 'meteor', 'semantic_similarity']:
+    for metric in METRICS:
         with_rag = model_with_rag[metric]
         without_rag = model_without_rag[metric]
         improvement = ((with_rag - without_rag) / without_rag * 100) if without_rag > 0 else 0
@@ -0,0 +1,69 @@
+"""
+Conditional GET and response compression for the history endpoints
+- ETags are built from conversation metadata (id, updated_at, message count)
+  and the query parameters, so a matching If-None-Match is answered with 304
+  before any message is loaded or serialized
+- JSON bodies of at least COMPRESS_MIN_BYTES are brotli-encoded when the
+  client accepts it and the brotli package is installed, gzip otherwise
+"""
+import gzip
+import hashlib
+import json
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # Optional: pip install brotli
+    brotli = None
+
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # Close to gzip -6 speed, noticeably smaller output for JSON
+
+
+def make_etag(*parts):
+    return hashlib.sha1(json.dumps(parts, default=str).encode("utf-8")).hexdigest()[:32]
+
+
+def is_not_modified(request, etag):
+    # Weak comparison: proxies that re-encode the body mark our tag W/
+    return request.if_none_match.contains_weak(etag)
+
+
+def not_modified_response(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def choose_encoding(request):
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def finalize_response(response, request, etag=None, min_size=COMPRESS_MIN_BYTES):
+    """Attach the ETag and compress the body when it is worth it"""
+    if etag:
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "private, no-cache"  # Cache, but revalidate every time
+    response.vary.add("Accept-Encoding")
+    if response.direct_passthrough or "Content-Encoding" in response.headers:
+        return response
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+    encoding = choose_encoding(request)
+    if encoding == "br":
+        body = brotli.compress(body, quality=BROTLI_QUALITY)
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+    else:
+        return response
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    return response
@@ -0,0 +1,105 @@
+"""
+Compact character n-gram language identifier (English / Swahili)
+- Naive Bayes over hashed character 1-4 grams, trained offline on the project's
+  own corpora (see train_language_id.py)
+- The model is two small float32 arrays in an .npz file: loads in milliseconds,
+  classifies a chat message in microseconds, fully deterministic
+"""
+import re
+import numpy as np
+
+NGRAM_ORDERS = (1, 2, 3, 4)
+HASH_BITS = 15
+_PRIME = np.uint64(1099511628211)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_NON_LETTERS = re.compile(r"[^\w']+|[\d_]+")
+
+
+def normalize(text):
+    """Lowercase, keep letters only, pad with spaces so word edges become n-grams"""
+    return " " + " ".join(_NON_LETTERS.sub(" ", text.lower()).split()) + " "
+
+
+def ngram_buckets(text, orders=NGRAM_ORDERS, hash_bits=HASH_BITS):
+    """Hash every character n-gram of the text into [0, 2**hash_bits) (vectorized rolling hash)"""
+    padded = normalize(text)
+    if len(padded) <= 2:
+        return np.zeros(0, dtype=np.int64)  # No letters at all
+    codes = np.frombuffer(padded.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    shift = np.uint64(64 - hash_bits)
+    buckets = []
+    rolling = np.zeros(len(codes), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for n in range(1, max(orders) + 1):
+            count = len(codes) - n + 1
+            if count <= 0:
+                break
+            # Hash of the n-gram starting at i, built from the (n-1)-gram hash
+            rolling = rolling[:count] * _PRIME + codes[n - 1:]
+            if n in orders:
+                buckets.append(((rolling + np.uint64(n)) * _MIX) >> shift)
+    if not buckets:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(buckets).astype(np.int64)
+
+
+class LanguageIdentifier:
+    """Array-backed naive Bayes classifier"""
+
+    def __init__(self, labels, log_probs, log_priors, orders=NGRAM_ORDERS, hash_bits=HASH_BITS,
+                 default_label="en"):
+        self.labels = list(labels)
+        self.log_probs = np.asarray(log_probs, dtype=np.float32)
+        self.log_priors = np.asarray(log_priors, dtype=np.float32)
+        self.orders = tuple(int(n) for n in orders)
+        self.hash_bits = int(hash_bits)
+        self.default_label = default_label
+
+    @classmethod
+    def train(cls, texts_by_label, alpha=0.5, orders=NGRAM_ORDERS, hash_bits=HASH_BITS):
+        """Fit from {label: [texts]}; priors are uniform so traffic mix does not bias short messages"""
+        labels = sorted(texts_by_label)
+        counts = np.zeros((len(labels), 1 << hash_bits), dtype=np.float64)
+        for row, label in enumerate(labels):
+            texts = texts_by_label[label]
+            # Count in chunks: one bincount per chunk instead of one per text
+            for start in range(0, len(texts), 1000):
+                chunk = [ngram_buckets(text, orders, hash_bits) for text in texts[start:start + 1000]]
+                counts[row] += np.bincount(np.concatenate(chunk), minlength=counts.shape[1])
+        counts += alpha
+        log_probs = np.log(counts / counts.sum(axis=1, keepdims=True))
+        log_priors = np.full(len(labels), -np.log(len(labels)))
+        return cls(labels, log_probs, log_priors, orders, hash_bits)
+
+    def classify(self, text):
+        """Return (label, confidence) where confidence is the posterior of the winning label"""
+        buckets = ngram_buckets(text, self.orders, self.hash_bits)
+        if len(buckets) == 0:
+            return self.default_label, 0.0
+        scores = self.log_probs[:, buckets].sum(axis=1) + self.log_priors
+        scores = scores - scores.max()
+        posteriors = np.exp(scores)
+        posteriors /= posteriors.sum()
+        best = int(posteriors.argmax())
+        return self.labels[best], float(posteriors[best])
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            labels=np.array(self.labels),
+            log_probs=self.log_probs,
+            log_priors=self.log_priors,
+            orders=np.array(self.orders),
+            hash_bits=np.array(self.hash_bits),
+        )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(
+            [str(label) for label in data["labels"]],
+            data["log_probs"],
+            data["log_priors"],
+            tuple(data["orders"].tolist()),
+            int(data["hash_bits"]),
+        )
@@ -0,0 +1,124 @@
+"""
+One-pass intent and emotion router for the /chat front door
+- Lexicons are compiled once at startup; a message is lowercased and tokenized
+  a single time and intent and emotion come back together
+- Intents greeting, off_topic and about_bot are answered directly by chat(),
+  before any model, retrieval or history work; everything else is medical
+- Intent phrases match whole tokens ("car" no longer matches "care"); emotion
+  keywords are stems and match inside words ("cramp" in "cramping",
+  "ogopa" in "naogopa"), overlapping ones included
+"""
+import re
+import string
+from collections import namedtuple
+from phrase_rewriter import compile_phrases
+
+GREETINGS = [
+    "hi", "hello", "hey", "good morning", "good evening", "good afternoon", "hi there", "hey there",
+    "hujambo", "jambo", "mambo", "habari", "sasa", "mambo vipi", "habari yako",
+]
+OFF_TOPIC_KEYWORDS = ["car", "cars", "weather", "football", "movie", "game", "song", "music"]
+BOT_QUESTIONS = [
+    "what does eunoia mean", "what is eunoia", "who are you", "what are you",
+    "eunoia inamaanisha nini", "wewe ni nani", "nini wewe",
+]
+# Checked in this order: the first emotion with a matching keyword wins
+EMOTION_KEYWORDS = {
+    "pain": ["pain", "cramp", "hurt", "severe", "severely", "really painful", "extremely painful",
+             "maumivu", "unaumia", "uumiza", "kuumiza", "makali"],
+    "anxious": ["scared", "worried", "anxious", "afraid", "nervous", "panic", "wasiwasi", "hofu", "ogopa"],
+    "sad": ["sad", "depressed", "down", "upset", "crying", "huzuni", "sikitika"],
+}
+
+# Short messages made only of a greeting ("hi there", "habari yako") count as greetings
+GREETING_MAX_TOKENS = 2
+INTENT_PRIORITY = ("greeting", "off_topic", "about_bot")
+SHORT_CIRCUIT_INTENTS = frozenset(INTENT_PRIORITY)
+
+# Punctuation becomes whitespace, then str.split() tokenizes (much cheaper than a regex)
+_PUNCTUATION = str.maketrans({ch: " " for ch in string.punctuation.replace("'", "") + "“”‘’…–—¿¡"})
+
+
+def tokenize(lowered):
+    return lowered.translate(_PUNCTUATION).split()
+
+
+class Route(namedtuple("Route", ["intent", "emotion"])):
+    __slots__ = ()
+
+    @property
+    def short_circuit(self):
+        """True when chat() answers without retrieval or generation"""
+        return self.intent in SHORT_CIRCUIT_INTENTS
+
+
+class MessageRouter:
+    """Compiled lexicon classifier: route(text) -> Route(intent, emotion)"""
+
+    def __init__(self, greetings=GREETINGS, off_topic=OFF_TOPIC_KEYWORDS, bot_questions=BOT_QUESTIONS,
+                 emotions=EMOTION_KEYWORDS):
+        # token tuple -> intent; a phrase listed under several intents keeps the higher priority one
+        self._phrases = {}
+        for intent, phrases in (("greeting", greetings), ("off_topic", off_topic), ("about_bot", bot_questions)):
+            for phrase in phrases:
+                self._phrases.setdefault(tuple(tokenize(phrase.lower())), intent)
+        # first token -> phrase lengths starting with it, so most tokens cost one dict lookup
+        self._starts = {}
+        for key in self._phrases:
+            self._starts.setdefault(key[0], set()).add(len(key))
+        self._starts = {token: sorted(lengths) for token, lengths in self._starts.items()}
+
+        self._emotion_of = {}
+        for emotion, keywords in emotions.items():
+            for keyword in keywords:
+                self._emotion_of.setdefault(keyword.lower(), emotion)
+        self._emotion_rank = {emotion: rank for rank, emotion in enumerate(emotions)}
+        # The scan reports the longest keyword at each position, so a keyword also stands
+        # for every shorter keyword it starts with ("severely" for "severe")
+        self._emotion_of = {
+            keyword: min((e for k, e in self._emotion_of.items() if keyword.startswith(k)),
+                         key=self._emotion_rank.get)
+            for keyword in self._emotion_of
+        }
+        keywords_re = compile_phrases(self._emotion_of)
+        # Lookahead: a match at every position, so overlapping keywords are all seen ("ogopain")
+        self._emotion_re = re.compile(f"(?=({keywords_re.pattern}))") if keywords_re is not None else None
+
+    def _intent(self, tokens):
+        count = len(tokens)
+        if not count or self._starts.keys().isdisjoint(tokens):
+            return "medical"
+        found = set()
+        # A greeting counts at the start of any message, or anywhere in a very short one
+        greeting_positions = range(count) if count <= GREETING_MAX_TOKENS else (0,)
+        for i, token in enumerate(tokens):
+            for n in self._starts.get(token, ()):
+                if i + n > count:
+                    break
+                intent = self._phrases.get(tuple(tokens[i:i + n]))
+                if intent is None or (intent == "greeting" and i not in greeting_positions):
+                    continue
+                if intent == "greeting":
+                    return intent
+                found.add(intent)
+        for intent in INTENT_PRIORITY:
+            if intent in found:
+                return intent
+        return "medical"
+
+    def emotion(self, text, lowered=None):
+        """pain / anxious / sad / neutral from one scan over the lowercased text"""
+        if self._emotion_re is None:
+            return "neutral"
+        best = None
+        for match in self._emotion_re.finditer(text.lower() if lowered is None else lowered):
+            emotion = self._emotion_of[match.group(1)]
+            if best is None or self._emotion_rank[emotion] < self._emotion_rank[best]:
+                best = emotion
+                if self._emotion_rank[best] == 0:
+                    break
+        return best or "neutral"
+
+    def route(self, text):
+        lowered = text.lower().strip()
+        return Route(self._intent(tokenize(lowered)), self.emotion(text, lowered))
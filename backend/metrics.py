@@ -0,0 +1,187 @@
+"""
+In-process request metrics in Prometheus text format
+- Counter and Histogram with labels; an observation is a lock, a bisect and two adds
+- stage("name") / @timed("name") time one pipeline stage into STAGE_SECONDS
+  (and open a tracing span when the request is traced, or run the live
+  profiler when it is limited to that stage)
+- CallbackGauge reads a value at scrape time (cache sizes, model registry, ...);
+  CallbackCounter does the same for running totals kept elsewhere (cache hits, ...)
+- render() is the /metrics body; no client library or external service needed
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+import profiling
+import tracing
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values = {}
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_labels(self.labelnames, key)} {value}" for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labelvalues -> [bucket counts (non-cumulative, +Inf last), sum]
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def snapshot(self, *labelvalues):
+        """(count, sum) for one label set"""
+        with self._lock:
+            series = self._series.get(labelvalues)
+            return (sum(series[0]), series[1]) if series else (0, 0.0)
+
+    def samples(self):
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        lines = []
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class CallbackGauge(_Metric):
+    """Gauge read at scrape time: fn() returns a number, or {labelvalues tuple: number}"""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, fn, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.fn = fn
+
+    def samples(self):
+        try:
+            values = self.fn()
+        except Exception:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f"{self.name}{_labels(self.labelnames, key)} {float(value)}"
+                for key, value in sorted(values.items()) if value is not None]
+
+
+class CallbackCounter(CallbackGauge):
+    """Counter read at scrape time: fn() returns a total that only goes up (name it *_total)"""
+    kind = "counter"
+
+
+STAGE_SECONDS = Histogram("eunoia_stage_seconds", "Time spent in each /chat pipeline stage", ["stage"])
+CHAT_SECONDS = Histogram("eunoia_chat_seconds", "End-to-end /chat latency", ["outcome"])
+CHAT_REQUESTS = Counter("eunoia_chat_requests_total", "/chat requests by how they were answered", ["outcome"])
+FALLBACKS = Counter("eunoia_fallback_responses_total", "Empathetic fallback responses by reason", ["reason"])
+TRANSLATIONS = Counter("eunoia_translation_calls_total", "Translation calls by direction and result",
+                       ["direction", "result"])
+
+
+@contextmanager
+def stage(name):
+    """Time a block as one pipeline stage"""
+    start = time.perf_counter()
+    try:
+        if tracing.active() or profiling.stage_target == name:
+            with tracing.span(name), profiling.live_profiler.profile_stage(name):
+                yield
+        else:
+            yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, name)
+
+
+def timed(name):
+    """Decorator form of stage()"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                if tracing.active() or profiling.stage_target == name:
+                    with tracing.span(name), profiling.live_profiler.profile_stage(name):
+                        return fn(*args, **kwargs)
+                return fn(*args, **kwargs)
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - start, name)
+        return wrapper
+    return decorator
+
+
+def record_stage(name, start, **attrs):
+    """Record a block timed by hand (start = time.perf_counter() before it); returns its duration"""
+    end = time.perf_counter()
+    STAGE_SECONDS.observe(end - start, name)
+    tracing.add_span(name, start, end, **attrs)
+    return end - start
+
+
+def render():
+    """All registered metrics in Prometheus text exposition format 0.0.4"""
+    lines = []
+    for metric in _registry:
+        samples = metric.samples()
+        if samples:
+            lines.extend(metric.header())
+            lines.extend(samples)
+    return "\n".join(lines) + "\n"
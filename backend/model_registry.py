@@ -0,0 +1,214 @@
+"""
+Memory-budgeted model registry
+- Models are registered with a loader and only loaded on first use
+- Last use is tracked; when a load would exceed the RAM budget, idle models are
+  evicted least-recently-used first (models currently in use are never evicted)
+- Models idle for longer than idle_seconds are released on the next registry access
+- A model whose loader fails max_failures times in a row is disabled: it is not
+  retried again and callers can switch to a path without it (is_disabled)
+- Load/evict counts and resident sizes are exposed through stats()
+"""
+import gc
+import threading
+import time
+from contextlib import contextmanager
+from structured_logging import get_logger
+
+log = get_logger("model_registry")
+
+
+class ModelUnavailableError(RuntimeError):
+    """Raised when a model failed to load recently and is not retried yet, or is disabled"""
+
+
+def estimate_size_bytes(value):
+    """Approximate resident size of a loaded model (parameters + buffers)"""
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_size_bytes(v) for v in value)
+    if hasattr(value, "parameters"):
+        size = sum(p.numel() * p.element_size() for p in value.parameters())
+        if hasattr(value, "buffers"):
+            size += sum(b.numel() * b.element_size() for b in value.buffers())
+        return size
+    return 0
+
+
+class ModelRegistry:
+    """Lazy-loading model cache with a RAM budget and idle eviction"""
+
+    def __init__(self, budget_mb=1024, idle_seconds=None, retry_seconds=60, max_failures=3, sizer=estimate_size_bytes):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.idle_seconds = idle_seconds
+        self.retry_seconds = retry_seconds
+        self.max_failures = max_failures
+        self.sizer = sizer
+        self._lock = threading.RLock()
+        self._loaders = {}
+        self._entries = {}
+        self._load_locks = {}
+        self._failed_at = {}
+        self._failures = {}  # Consecutive failed loads per model
+        self._sizes = {}  # Last measured size per model, used to make room before reloading
+        self.load_counts = {}
+        self.evict_counts = {}
+
+    def register(self, name, loader, estimated_mb=None):
+        """Register a loader; it is not called until the model is first used"""
+        with self._lock:
+            self._loaders[name] = loader
+            self._load_locks[name] = threading.Lock()
+            self.load_counts.setdefault(name, 0)
+            self.evict_counts.setdefault(name, 0)
+            if estimated_mb is not None:
+                self._sizes.setdefault(name, int(estimated_mb * 1024 * 1024))
+
+    def is_loaded(self, name):
+        with self._lock:
+            return name in self._entries
+
+    def is_disabled(self, name):
+        """True once the model failed to load max_failures times in a row"""
+        with self._lock:
+            return self.max_failures is not None and self._failures.get(name, 0) >= self.max_failures
+
+    @contextmanager
+    def use(self, name):
+        """Pin a model while it is used so it cannot be evicted mid-generation"""
+        value = self._acquire(name)
+        try:
+            yield value
+        finally:
+            self._release(name)
+
+    def get(self, name):
+        """Load (if needed) and return a model without pinning it"""
+        value = self._acquire(name)
+        self._release(name)
+        return value
+
+    def preload(self, *names):
+        """Load models eagerly (e.g. for batch jobs)"""
+        for name in names or list(self._loaders):
+            self.get(name)
+
+    def _acquire(self, name):
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model: {name}")
+        self.evict_idle()
+
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                entry["in_use"] += 1
+                entry["last_used"] = time.time()
+                return entry["value"]
+
+        # Load outside the registry lock so other models stay usable; one loader per model
+        with self._load_locks[name]:
+            with self._lock:
+                entry = self._entries.get(name)
+                if entry is not None:
+                    entry["in_use"] += 1
+                    entry["last_used"] = time.time()
+                    return entry["value"]
+                if self.is_disabled(name):
+                    raise ModelUnavailableError(f"{name} is disabled after {self._failures[name]} failed loads")
+                failed_at = self._failed_at.get(name)
+                if failed_at is not None and time.time() - failed_at < self.retry_seconds:
+                    raise ModelUnavailableError(f"{name} failed to load {time.time() - failed_at:.0f}s ago")
+                self._make_room(self._sizes.get(name, 0))
+
+            try:
+                value = self._loaders[name]()
+            except Exception:
+                with self._lock:
+                    self._failed_at[name] = time.time()
+                    self._failures[name] = self._failures.get(name, 0) + 1
+                    if self.is_disabled(name):
+                        log.error("Model %s failed to load %d times in a row, disabling it", name, self._failures[name])
+                raise
+
+            size = self.sizer(value)
+            with self._lock:
+                self._failed_at.pop(name, None)
+                self._failures.pop(name, None)
+                self._sizes[name] = size
+                self._entries[name] = {
+                    "value": value,
+                    "size": size,
+                    "loaded_at": time.time(),
+                    "last_used": time.time(),
+                    "in_use": 1,
+                }
+                self.load_counts[name] += 1
+                # The real size may be larger than the estimate used to make room
+                self._make_room(0)
+            return value
+
+    def _release(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                entry["in_use"] = max(0, entry["in_use"] - 1)
+                entry["last_used"] = time.time()
+
+    def resident_bytes(self):
+        with self._lock:
+            return sum(entry["size"] for entry in self._entries.values())
+
+    def _make_room(self, incoming_bytes):
+        """Evict idle models (LRU first) until incoming_bytes fits in the budget"""
+        while self.resident_bytes() + incoming_bytes > self.budget_bytes:
+            idle = [(entry["last_used"], name) for name, entry in self._entries.items() if entry["in_use"] == 0]
+            if not idle:
+                break  # Everything resident is in use; allow going over budget rather than failing
+            self._evict(min(idle)[1])
+
+    def evict_idle(self):
+        """Release models that have not been used for idle_seconds"""
+        if self.idle_seconds is None:
+            return
+        now = time.time()
+        with self._lock:
+            expired = [name for name, entry in self._entries.items()
+                       if entry["in_use"] == 0 and now - entry["last_used"] > self.idle_seconds]
+            for name in expired:
+                self._evict(name)
+
+    def evict(self, name):
+        """Evict a model now if it is not in use"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry["in_use"] > 0:
+                return False
+            self._evict(name)
+            return True
+
+    def _evict(self, name):
+        del self._entries[name]
+        self.evict_counts[name] += 1
+        log.info("Evicted model %s to stay within memory budget", name)
+        gc.collect()
+
+    def stats(self):
+        """Load/evict counts and resident sizes for monitoring"""
+        now = time.time()
+        with self._lock:
+            models = {}
+            for name in self._loaders:
+                entry = self._entries.get(name)
+                models[name] = {
+                    "loaded": entry is not None,
+                    "resident_mb": round(entry["size"] / (1024 * 1024), 1) if entry else 0.0,
+                    "idle_seconds": round(now - entry["last_used"], 1) if entry else None,
+                    "in_use": entry["in_use"] if entry else 0,
+                    "loads": self.load_counts[name],
+                    "load_failures": self._failures.get(name, 0),
+                    "disabled": self.is_disabled(name),
+                    "evictions": self.evict_counts[name],
+                }
+            return {
+                "budget_mb": round(self.budget_bytes / (1024 * 1024), 1),
+                "resident_mb": round(self.resident_bytes() / (1024 * 1024), 1),
+                "models": models,
+            }
@@ -0,0 +1,75 @@
+"""
+Compiled phrase-rewrite engine
+- A phrase table (phrase → replacement) is compiled once into a single regex
+- Phrases are stored as a character trie, so the regex shares prefixes and the
+  cost of matching grows with phrase length, not with the number of phrases
+- Rewrites are applied in one left-to-right pass, longest match first
+"""
+import json
+import re
+
+
+def _trie_regex(trie):
+    """Turn a character trie into a regex that prefers the longest match"""
+    branches = [re.escape(ch) + _trie_regex(child) for ch, child in sorted(trie.items()) if ch]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in trie:
+        # A phrase ends here: the longer continuation is optional (greedy, so tried first)
+        return "(?:" + body + ")?"
+    return body
+
+
+def compile_phrases(phrases, case_sensitive=True):
+    """Compile an iterable of literal phrases into one trie-shaped regex"""
+    trie = {}
+    for phrase in phrases:
+        if not phrase:
+            continue
+        node = trie
+        for ch in phrase if case_sensitive else phrase.lower():
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    if not trie:
+        return None
+    return re.compile(_trie_regex(trie), 0 if case_sensitive else re.IGNORECASE)
+
+
+class PhraseRewriter:
+    """Single-pass, longest-match phrase rewriting over a fixed table"""
+
+    def __init__(self, table, case_sensitive=True):
+        self.case_sensitive = case_sensitive
+        self.table = dict(table) if case_sensitive else {k.lower(): v for k, v in table.items()}
+        self.pattern = compile_phrases(self.table, case_sensitive)
+
+    def _replacement(self, match):
+        key = match.group(0) if self.case_sensitive else match.group(0).lower()
+        return self.table[key]
+
+    def rewrite(self, text):
+        """Replace every phrase occurrence in one pass"""
+        if self.pattern is None or not text:
+            return text
+        return self.pattern.sub(self._replacement, text)
+
+    def first_match(self, text):
+        """Return the replacement for the leftmost (longest) phrase in text, or None"""
+        if self.pattern is None or not text:
+            return None
+        match = self.pattern.search(text)
+        return self._replacement(match) if match else None
+
+    def __len__(self):
+        return len(self.table)
+
+
+def load_phrase_tables(path):
+    """Load named phrase tables from a JSON file and compile each one"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {
+        name: PhraseRewriter(spec["phrases"], case_sensitive=spec.get("case_sensitive", True))
+        for name, spec in data["tables"].items()
+    }
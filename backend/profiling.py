@@ -0,0 +1,241 @@
+"""
+On-demand profiling of live /chat requests
+- An admin arms the profiler for the next N requests, optionally sampling a
+  fraction of them and optionally limited to one metrics stage (generation,
+  validation, retrieval, ...); each profiled request counts towards N
+- mode="cprofile": deterministic profile, aggregated into one pstats.Stats and
+  downloadable as a .pstats file (snakeviz, pstats) or as text. Only one
+  request is under cProfile at a time; concurrent ones are skipped, not queued
+- mode="sampler": a background thread samples the profiled threads' stacks
+  every interval_ms, aggregated as flamegraph.pl / speedscope collapsed stacks;
+  it sees every concurrent request and adds no work to the request thread
+- Disarmed, the cost per request and per stage is one attribute check
+"""
+import contextvars
+import cProfile
+import io
+import marshal
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+MODES = ("cprofile", "sampler")
+DEFAULT_INTERVAL_MS = 5.0
+
+# Name of the stage being profiled while armed with stage=...; read by metrics.stage()/@timed()
+stage_target = None
+
+_selected = contextvars.ContextVar("profile_selected", default=False)
+_region = contextvars.ContextVar("profile_region", default=None)  # This request's cProfile.Profile
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{code.co_name}:{code.co_firstlineno}"
+
+
+class LiveProfiler:
+    def __init__(self):
+        self.armed = False
+        self.mode = "cprofile"
+        self.stage = None
+        self.remaining = 0
+        self.sample_rate = 1.0
+        self.interval = DEFAULT_INTERVAL_MS / 1000
+        self.profiled = 0
+        self.skipped_busy = 0
+        self.armed_at = None
+        self._inflight = 0  # Selected requests still running
+        self._lock = threading.Lock()
+        self._cprofile_lock = threading.Lock()  # One cProfile session at a time
+        self._stats = None  # Aggregated pstats.Stats (cprofile mode)
+        self._stacks = Counter()  # Collapsed stack -> samples (sampler mode)
+        self._samples = 0
+        self._sampled_threads = {}  # thread id -> nesting depth, while inside a profiled region
+        self._sampler_thread = None
+
+    # ---- admin controls ----
+    def arm(self, requests=10, sample_rate=1.0, stage=None, mode="cprofile", interval_ms=DEFAULT_INTERVAL_MS):
+        """Profile the next `requests` /chat requests (each picked with probability sample_rate); clears old results"""
+        global stage_target
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        if requests < 1 or not 0 < sample_rate <= 1 or interval_ms <= 0:
+            raise ValueError("requests must be >= 1, sample_rate in (0, 1], interval_ms > 0")
+        with self._lock:
+            self.mode, self.stage = mode, stage or None
+            self.remaining, self.sample_rate = int(requests), float(sample_rate)
+            self.interval = interval_ms / 1000
+            self.profiled = self.skipped_busy = self._samples = 0
+            self._stats, self._stacks = None, Counter()
+            self.armed_at = time.time()
+            self.armed = True
+            stage_target = self.stage
+            if mode == "sampler" and self._sampler_thread is None:
+                self._sampler_thread = threading.Thread(target=self._sample_loop, name="live-profiler", daemon=True)
+                self._sampler_thread.start()
+        return self.status()
+
+    def disarm(self):
+        """Stop selecting requests; results collected so far stay downloadable"""
+        global stage_target
+        with self._lock:
+            self.armed = False
+            if not self._inflight:
+                stage_target = None
+        return self.status()
+
+    def status(self):
+        with self._lock:
+            return {
+                "armed": self.armed,
+                "mode": self.mode,
+                "stage": self.stage,
+                "remaining": self.remaining,
+                "sample_rate": self.sample_rate,
+                "interval_ms": self.interval * 1000,
+                "profiled_requests": self.profiled,
+                "skipped_busy": self.skipped_busy,
+                "samples": self._samples if self.mode == "sampler" else None,
+                "has_results": self._stats is not None or bool(self._stacks),
+            }
+
+    # ---- request hooks ----
+    def begin_request(self):
+        """Called at the start of /chat; returns True when this request is profiled"""
+        if not self.armed:
+            return False
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return False
+        with self._lock:
+            if not self.armed or self.remaining <= 0:
+                return False
+            if self.stage is None and self.mode == "cprofile" and self._cprofile_lock.locked():
+                self.skipped_busy += 1  # Another request is under cProfile; leave the slot for the next one
+                return False
+            self.remaining -= 1
+            self.profiled += 1
+            self._inflight += 1
+            if self.remaining == 0:
+                self.armed = False  # Requests already selected still finish their profile
+        _selected.set(True)
+        if self.stage is None:
+            self._start_region()
+        return True
+
+    def end_request(self):
+        global stage_target
+        if not _selected.get():
+            return
+        if self.stage is None:
+            self._stop_region()
+        _selected.set(False)
+        with self._lock:
+            self._inflight -= 1
+            if not self.armed and not self._inflight:
+                stage_target = None
+
+    @contextmanager
+    def profile_stage(self, name):
+        """Profile one stage of a selected request when the profiler is limited to that stage"""
+        if name != self.stage or not _selected.get():
+            yield
+            return
+        self._start_region()
+        try:
+            yield
+        finally:
+            self._stop_region()
+
+    # ---- regions ----
+    def _start_region(self):
+        if self.mode == "sampler":
+            thread_id = threading.get_ident()
+            self._sampled_threads[thread_id] = self._sampled_threads.get(thread_id, 0) + 1
+            return
+        if not self._cprofile_lock.acquire(blocking=False):
+            self.skipped_busy += 1
+            _region.set(None)
+            return
+        profiler = cProfile.Profile()
+        _region.set(profiler)
+        profiler.enable()
+
+    def _stop_region(self):
+        if self.mode == "sampler":
+            thread_id = threading.get_ident()
+            depth = self._sampled_threads.get(thread_id, 0) - 1
+            if depth > 0:
+                self._sampled_threads[thread_id] = depth
+            else:
+                self._sampled_threads.pop(thread_id, None)
+            return
+        profiler = _region.get()
+        if profiler is None:
+            return
+        profiler.disable()
+        _region.set(None)
+        self._cprofile_lock.release()
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profiler)
+            else:
+                self._stats.add(profiler)
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            if not self._sampled_threads:
+                with self._lock:
+                    if not self.armed and not self._inflight:
+                        self._sampler_thread = None  # arm() starts a new one
+                        return
+                continue
+            frames = sys._current_frames()
+            collected = []
+            for thread_id in list(self._sampled_threads):
+                frame = frames.get(thread_id)
+                if frame is None or thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                collected.append(";".join(reversed(stack)))
+            with self._lock:
+                self._stacks.update(collected)
+                self._samples += len(collected)
+
+    # ---- results ----
+    def pstats_bytes(self):
+        """Aggregated profile in the marshal format of pstats.Stats.dump_stats (cprofile mode)"""
+        with self._lock:
+            if self._stats is None:
+                return None
+            return marshal.dumps(self._stats.stats)
+
+    def pstats_text(self, sort="cumulative", limit=60):
+        with self._lock:
+            if self._stats is None:
+                return None
+            out = io.StringIO()
+            self._stats.stream = out
+            self._stats.sort_stats(sort).print_stats(limit)
+            self._stats.stream = sys.stdout
+        return out.getvalue()
+
+    def collapsed_stacks(self):
+        """'frame;frame;frame count' lines (sampler mode)"""
+        with self._lock:
+            if not self._stacks:
+                return None
+            return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+
+live_profiler = LiveProfiler()
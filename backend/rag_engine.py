@@ -0,0 +1,1010 @@
+"""
+The /chat answering pipeline as an importable engine
+- RagEngine.respond(message, language) runs routing, language detection,
+  retrieval, context filtering, the prompt, generation, the output checks and
+  the empathetic fallback, and returns a Reply; it has no Flask or conversation
+  storage dependency
+- Components are passed in: generator (called like the transformers
+  text2text pipeline), tokenizer, embedder (SentenceTransformer.encode),
+  FAISS index and CorpusStore, optional Swahili/multilingual indexes,
+  Translator, domain gate, language identifier and sentence annotations.
+  Stubs (stub_models.py) or fakes can take the place of any of them
+- build_engine() loads the production components from ./model, the CSVs and
+  the saved indexes, the same way app.py always has (STUB_MODELS=1: stubs)
+Used by app.py, evaluate_model_rag.py and the benchmarks, so they all measure
+the code that serves users.
+"""
+import logging
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from langdetect import detect, DetectorFactory
+from context_processing import filter_candidates, drop_excluded_sentences, summarize_context
+from empathetic_response import create_empathetic_response
+from message_router import MessageRouter
+from metrics import stage, timed, record_stage, FALLBACKS
+from response_validation import validate_response
+from sentence_annotations import FLAG_NON_KENYAN, FLAG_PUBERTY, FLAG_FIRST_PERIOD, flag_terms
+from structured_logging import get_logger, bind_request_context
+import tracing
+
+log = get_logger("rag_engine")
+
+# en → sw and sw → en text functions (translation_utils.py, or stub_models.py)
+# available: optional callable, False once the translation models are disabled (load failures)
+Translator = namedtuple("Translator", ["en_to_sw", "sw_to_en", "available"], defaults=[None])
+
+# A message that needs generation: RagEngine.prepare() → generator(prompt) → RagEngine.complete()
+# fallback_context: the context the empathetic fallback uses when the summarized one is too thin
+Turn = namedtuple("Turn", ["user_input", "language", "emotion", "prompt", "context", "fallback_context",
+                           "context_rows", "exclude_flags"])
+
+# outcome: short_circuit | language_mismatch | off_domain | generated | fallback
+# emotion is None for replies answered without retrieval
+Reply = namedtuple("Reply", ["response", "language", "emotion", "outcome", "fallback_reason",
+                             "context", "context_rows", "prompt"],
+                   defaults=(None, None, None, None, None))
+
+LANGUAGE_ID_MIN_CONFIDENCE = 0.6
+
+GENERATION_KWARGS = dict(
+    repetition_penalty=1.8,       # Strong penalty to prevent repetition
+    no_repeat_ngram_size=5,       # Prevent 5-gram repetition (longer phrases)
+    num_beams=4,
+    early_stopping=True,
+    temperature=0.85,             # Slightly more creative for varied responses
+    top_p=0.9,
+    do_sample=True                # Enable sampling for more variety
+)
+MAX_PROMPT_TOKENS = 400  # Leaves room for generation
+
+LANGUAGE_MISMATCH_RESPONSES = {
+    # User is in English mode but typed in Swahili
+    "en": "I notice you're typing in Swahili! 🌍 To get the best experience, please switch to Swahili mode using the language option in the navbar. This will help me provide more accurate responses in Swahili.",
+    # User is in Swahili mode but typed in English
+    "sw": "Nimeona unaandika kwa Kiingereza! 🌍 Ili upate uzoefu bora, tafadhali badilisha kwa hali ya Kiingereza kwa kutumia chaguo la lugha kwenye menyu ya juu. Hii itanisaidia kutoa majibu sahihi zaidi kwa Kiingereza.",
+}
+
+# Emotion-specific tone wrapper (English in both modes: Swahili answers are generated in English, then translated)
+EMOTION_INSTRUCTIONS = {
+    "pain": "The user is in physical pain. Be soothing, practical, and offer immediate comfort. Acknowledge their pain first, then provide helpful solutions.",
+    "anxious": "The user is anxious or scared. Be grounding, calming, and reassuring. Use very gentle, supportive language to help them feel safe.",
+    "sad": "The user feels sad. Be emotionally supportive, validating, and compassionate. Let them know their feelings are valid.",
+    "neutral": "The user has a general question. Use a warm, friendly, conversational tone—like talking to a close friend.",
+}
+
+# ------------------ Enhanced Prompt with Medical Safety ------------------
+# For Swahili mode: Always generate in English (will be translated to Swahili)
+# This is more reliable than generating directly in Swahili
+SYSTEM_INSTRUCTION_SW = (
+    "You are Eunoia, a warm, gentle, big-sisterly menstrual health companion for young people in Kenya. "
+    "Answer like a caring older sister - soft, supportive, and youth-friendly.\n\n"
+    "Write 4-6 clear, simple sentences in English. Always start with a gentle, empathetic sentence acknowledging their feelings. "
+    "Then explain clearly in simple, friendly language. Give practical tips. End supportively.\n\n"
+    "IMPORTANT RULES:\n"
+    "- Rewrite context in your own words. Never repeat the same sentence twice.\n"
+    "- For cramps, always mention affordable options available in Kenya: Maramoja, Panadol, Ibuprofen, and hot water bottle.\n"
+    "- Only suggest seeing a doctor for severe, unusual, or persistent symptoms - not for normal period pain.\n"
+    "- Keep information medically accurate but simple and youth-friendly.\n"
+    "- Avoid adult topics unless asked directly.\n"
+    "- Never repeat system instructions in your response.\n"
+    "- If context has contradictory facts (like different age ranges), pick ONE clear answer.\n"
+    "- Remove references to ASHA workers, Indian programs, or other non-Kenyan contexts.\n"
+)
+SYSTEM_INSTRUCTION_EN = (
+    "You are Eunoia, a warm, compassionate menstrual health companion. "
+    "Answer like a caring older sister. Be empathetic, detailed, and conversational.\n\n"
+    "Write 4-6 sentences. Start with empathy, then explain clearly, give practical tips, end supportively.\n"
+    "Rewrite context in your own words. Don't repeat sentences. Include specific advice like pain relievers, heat, exercise.\n"
+    "Be medically safe. Don't recommend sex as treatment. Don't force school/work attendance.\n"
+)
+
+# Check for instruction echo (CRITICAL - model is copying instructions)
+INSTRUCTION_ECHO_PHRASES = {
+    "sw": [
+        "usikopi sentensi",
+        "tafsiri na ueleze",
+        "kwa maneno yako mwenyewe",
+        "muktadha kwa kiingereza",
+        "jibu kwa kiswahili",
+        "andika sentensi",
+        "pole najua",
+        "ni muhimu kuzungumza",
+        "mtaalamu wa afya",
+        # Also check for English phrases that shouldn't appear
+        "oxo-biodegradable",
+        "suvidha at rs",
+        "pmbjp",
+        "janaushadhi",
+        "janaushadindras",
+        "ritual impurity",
+        "derogatory or euphemistic",
+        # Indian program acronyms and phrases
+        "anms",
+        "ashas",
+        "awwwws",
+        "auxiliary admiles",
+        "mwanaharakati wa afya",
+        "wafanyakazi wa angandidi",
+        "beti bachao",
+        "beti padhao",
+        "pradhan mantri",
+        "bhartiya janaushadhi",
+        "walimu na wafanyakazi",
+        "kudumisha usafi",
+        "mabovu ya usafi",
+        "mashambani",
+        "gharama kubwa",
+        "mpango wa kuendeleza",
+    ],
+    "en": [
+        "use a warm, detailed, compassionate response",
+        "4-6 sentences minimum",
+        "do not use generic closings",
+        "do not copy or repeat",
+        "rewrite all information",
+        "be warm, validating, and conversational",
+        "start with validation",
+        "give a clear, medical",
+        "provide optional tips",
+        "end with a gentle",
+        "follow this exactly",
+        "response structure",
+        "critical rules",
+        "do not give generic responses",
+        "maintain a healthy lifestyle",
+        "exercise regularly and get enough sleep",
+        "be patient and patient-friendly",
+        "don't be afraid to talk",
+        "make sure you understand",
+        "talk to a healthcare provider or healthcare provider",  # Duplicate phrase
+        "be patient and patient",  # Repetitive
+        "avoid over-the-counter pain relievers",  # Wrong advice (should be "use", not "avoid")
+    ],
+}
+
+# Obvious context copying (English phrases in a Swahili response), counted as instruction echo
+COPIED_CONTEXT_PHRASES_SW = [
+    "oxo-biodegradable", "suvidha", "pmbjp", "janaushadhi", "janaushadindras", "rs.",
+    "ritual impurity", "derogatory", "euphemistic", "abstaining from sexual",
+    "natural biological process", "sanitary napkins named",
+    # Indian program acronyms
+    "anms", "ashas", "awwwws", "auxiliary", "admiles",
+    "mwanaharakati wa afya ya kijamii", "wafanyakazi wa angandidi",
+    "beti bachao", "beti padhao", "pradhan mantri", "bhartiya",
+    "walimu na wafanyakazi", "kudumisha usafi", "mabovu ya usafi",
+    "mashambani", "gharama kubwa", "mpango wa kuendeleza"
+]
+
+# English phrases that shouldn't be in a Swahili response (checked after the echo check)
+ENGLISH_PHRASES_SW = [
+    "oxo-biodegradable", "suvidha", "pmbjp", "janaushadhi", "janaushadindras", "rs.", "rs ",
+    "ritual impurity", "derogatory", "euphemistic", "abstaining from sexual",
+    "natural biological process", "sanitary napkins named", "ensures access",
+    "affordable sanitary", "quality medicines", "per pad", "promoting menstrual",
+    "birth control pills", "manage symptoms", "no cure", "your doctor might",
+    # Indian program acronyms
+    "anms", "ashas", "awwwws", "auxiliary", "admiles",
+    "beti bachao", "beti padhao", "pradhan mantri", "bhartiya",
+    "walimu na wafanyakazi", "kudumisha usafi", "mabovu ya usafi",
+    "mashambani", "gharama kubwa", "mpango wa kuendeleza"
+]
+
+GENERIC_PHRASES = [
+    "talk to a trusted teacher",
+    "talk to a school nurse",
+    "talk to your doctor",
+    "consult a healthcare professional"
+]
+
+
+def short_circuit_response(intent, language, user_name=""):
+    """Canned reply for intents answered without retrieval or generation"""
+    if intent == "greeting":
+        if language == "sw":
+            return "Hujambo! 👋 Mimi ni Eunoia, msaidizi wako wa afya ya hedhi. Nipo hapa kukusaidia na maswali yoyote kuhusu mzunguko wako, afya ya hedhi, au ustawi wa uzazi. Nini naweza kukusaidia leo?"
+        if user_name:
+            return f"Hello {user_name}! 👋 I'm Eunoia, your menstrual health companion. I'm here to support you with any questions about your cycle, period health, or reproductive wellness. What can I help you with today?"
+        return "Hey there! 👋 I'm Eunoia, your menstrual health companion. I'm here to support you with any questions about your cycle, period health, or reproductive wellness. What can I help you with today?"
+    if intent == "off_topic":
+        if language == "sw":
+            return "Nipo hapa kusaidia hasa na maswali kuhusu afya ya hedhi na uzazi! 💛 Ingawa ningependa kuzungumza kuhusu kila kitu, bora zaidi ninaweza kukusaidia na maswala yanayohusiana na hedhi, kufuatilia mzunguko, na ustawi wa uzazi. Kuna kitu kuhusu mzunguko wako au afya yako ungependa kujua?"
+        return "I'm here specifically to help with menstrual and reproductive health questions! 💛 While I'd love to chat about everything, I'm best at supporting you with period-related concerns, cycle tracking, and reproductive wellness. Is there something about your cycle or health you'd like to know?"
+    # about_bot
+    if language == "sw":
+        return "Mimi ni Eunoia, msaidizi wako wa afya ya hedhi! 💛 Eunoia inamaanisha 'mawazo mazuri' au 'akili bora'—nipo hapa kukusaidia na majibu ya kina na ya kujali kuhusu afya yako ya hedhi. Nini naweza kukusaidia leo?"
+    return "I'm Eunoia, your menstrual health companion! 💛 Eunoia means 'beautiful thinking' or 'well mind'—I'm here to support you with thoughtful, caring answers about your menstrual health. What can I help you with today?"
+
+
+def build_prompt(context, question, emotion, language):
+    """Generation prompt; always answered in English (Swahili mode translates the answer)
+    question: the user's message, or its English translation in Swahili mode"""
+    # Simplified prompt to prevent instruction leakage
+    system_instruction = SYSTEM_INSTRUCTION_SW if language == "sw" else SYSTEM_INSTRUCTION_EN
+    emotion_instruction = EMOTION_INSTRUCTIONS.get(emotion, EMOTION_INSTRUCTIONS["neutral"])
+    if language == "sw":
+        return (
+            f"{system_instruction}\n"
+            f"{emotion_instruction}\n"
+            f"Context: {context}\n"
+            f"Question (user wrote in Swahili, translated to English): {question}\n"
+            f"Answer in English (will be translated to Swahili):"
+        )
+    return (
+        f"{system_instruction}\n"
+        f"{emotion_instruction}\n"
+        f"Context: {context}\n"
+        f"Question: {question}\n"
+        f"Answer:"
+    )
+
+
+def query_exclusions(query):
+    """Context terms that are irrelevant for this query, and the same filter as annotation flags
+    (the terms are derived from the flags, so both filters drop the same sentences)"""
+    query_lower = query.lower()
+    if "pcos" in query_lower or "polycystic" in query_lower or "endometriosis" in query_lower:
+        flags = FLAG_NON_KENYAN | FLAG_PUBERTY
+    elif "swim" in query_lower:
+        flags = FLAG_NON_KENYAN | FLAG_FIRST_PERIOD
+    else:
+        flags = FLAG_NON_KENYAN
+    # Non-Kenyan sentences are already gone (drop_excluded_sentences in retrieve_context)
+    return flag_terms(flags & ~FLAG_NON_KENYAN), flags
+
+
+class RagEngine:
+    """Answers messages with retrieval-augmented generation
+    generator: callable(prompt, **GENERATION_KWARGS) -> [{"generated_text": ...}]
+    tokenizer: .encode(text) -> token ids (prompt length checks)
+    embedder / index / store: English query encoder, its FAISS index and the row-id → answer store
+    translator: Translator, or None when translation is unavailable (treated as None once translator.available()
+        is False, so Swahili requests take the untranslated path instead of retrying the models)
+    store_sw / index_sw: Swahili answers and their index (index_sw may be None)
+    multilingual_embedder / index_multi: multilingual encoder over the English answers (EMBEDDING_MODE=multilingual)
+    annotations: SentenceAnnotations of store, for the empathetic fallback
+    domain_gate: DomainGate checked with the query vector, or None
+    language_identifier: LanguageIdentifier, or None for langdetect"""
+
+    def __init__(self, generator, tokenizer, embedder, index, store, translator=None, store_sw=None,
+                 index_sw=None, multilingual_embedder=None, index_multi=None, annotations=None,
+                 domain_gate=None, language_identifier=None, router=None):
+        self.generator = generator
+        self.tokenizer = tokenizer
+        self.embedder = embedder
+        self.index = index
+        self.store = store
+        self._translator = translator
+        self._translation_disabled = False
+        self.store_sw = store_sw
+        self.index_sw = index_sw
+        self.multilingual_embedder = multilingual_embedder
+        self.index_multi = index_multi
+        self.annotations = annotations
+        self.domain_gate = domain_gate
+        self.language_identifier = language_identifier
+        self.router = router or MessageRouter()
+
+        self.has_swahili_corpus = store_sw is not None and len(store_sw) > 0
+        self.use_multilingual_index = index_multi is not None and multilingual_embedder is not None
+        if language_identifier is None:
+            DetectorFactory.seed = 0  # Make langdetect deterministic
+        # Runs the sw→en question translation while multilingual retrieval is in flight
+        self._translation_executor = None
+
+    @property
+    def translator(self):
+        """The Translator, or None when there is none or its models were disabled"""
+        translator = self._translator
+        if translator is None or self._translation_disabled:
+            return None
+        if translator.available is not None and not translator.available():
+            self._translation_disabled = True
+            log.warning("Translation models are unavailable - runtime translation disabled, "
+                        "Swahili requests use the untranslated path")
+            return None
+        return translator
+
+    @property
+    def use_runtime_translation(self):
+        """Runtime translation of queries and context (only if Swahili translations don't exist)"""
+        return not self.has_swahili_corpus and self.translator is not None
+
+    # ------------------ Language + emotion ------------------
+    @timed("language_detection")
+    def detect_language(self, text):
+        """Detect en/sw with the corpus-trained identifier, falling back to langdetect"""
+        if self.language_identifier is not None:
+            lang, confidence = self.language_identifier.classify(text)
+            # Too ambiguous to call (e.g. "ok") - default to English like before
+            return lang if confidence >= LANGUAGE_ID_MIN_CONFIDENCE else "en"
+        try:
+            lang = detect(text)
+            return "sw" if lang in ["sw", "swahili"] else "en"
+        except:
+            return "en"
+
+    def detect_emotion(self, text):
+        return self.router.emotion(text)
+
+    @timed("translate_query")
+    def translate_query_to_english(self, user_input):
+        """Translate a Swahili question to English and fix common translation errors"""
+        query_en = self.translator.sw_to_en(user_input)
+        log.debug("Translated: %.50r -> %.50r", user_input, query_en)
+
+        # Post-process translation to fix common errors
+        query_en_lower = query_en.lower()
+        if "help to come" in query_en_lower or "help come" in query_en_lower:
+            query_en = query_en.replace("help to come", "how to help with").replace("help come", "how to help with")
+            log.debug("Fixed translation: %.50r", query_en)
+
+        if "labor pain" in query_en_lower and ("hedhi" in user_input.lower() or "period" in query_en_lower):
+            query_en = query_en.replace("labor pain", "period pain").replace("labor pains", "period pain")
+            log.debug("Fixed translation: %.50r", query_en)
+
+        return query_en
+
+    # ------------------ Retrieve and summarize context ------------------
+    @timed("embedding")
+    def embed_query(self, query):
+        """Query vector for the active index (computed once, shared by the domain gate and FAISS)"""
+        if self.use_multilingual_index:
+            return self.multilingual_embedder.encode([query], convert_to_numpy=True, normalize_embeddings=True)
+        return self.embedder.encode([query], convert_to_numpy=True)
+
+    @timed("domain_gate")
+    def is_off_domain(self, query_vec):
+        """Semantic off-domain check on an already computed query vector"""
+        if self.domain_gate is None:
+            return False
+        verdict = self.domain_gate.check(query_vec)
+        if verdict.off_domain:
+            log.info("Off-domain query (closest topic: %s, in-domain %.2f vs off-domain %.2f) - "
+                     "skipping retrieval and generation", verdict.topic, verdict.in_domain_score, verdict.off_domain_score)
+        return verdict.off_domain
+
+    @timed("retrieval")
+    def retrieve_context(self, query, top_k=5, similarity_threshold=0.5, language="en", query_vec=None, with_rows=False):
+        """Retrieve context with semantic similarity filtering
+        query_vec: embed_query(query), when the caller already has it
+        with_rows: also return the English corpus row ids used (None for other corpora)"""
+        # For Swahili queries, try to use Swahili corpus if available
+        use_swahili_corpus = (language == "sw" and self.has_swahili_corpus)
+
+        if self.use_multilingual_index:
+            # Multilingual encoder over the English answers: the query is embedded as-is, no translation
+            current_store = self.store
+            current_index = self.index_multi
+        elif use_swahili_corpus and self.index_sw is not None:
+            # Use Swahili corpus with Swahili index
+            current_store = self.store_sw
+            current_index = self.index_sw
+            log.debug("Searching in Swahili corpus with Swahili index")
+        else:
+            # Use English corpus (or translate Swahili query to English)
+            current_store = self.store
+            current_index = self.index
+
+            # If query is in Swahili but no Swahili corpus, translate query to English
+            if language == "sw" and self.use_runtime_translation:
+                try:
+                    query_en = self.translator.sw_to_en(query)
+                    log.debug("Translated query: %r -> %.50r", query, query_en)
+
+                    # Verify translation actually worked (should be different from original)
+                    if query_en.strip().lower() == query.strip().lower():
+                        log.warning("Query translation returned the same text - "
+                                    "the English corpus will be searched with Swahili text")
+                    else:
+                        query = query_en  # Use translated query for search
+                except Exception as e:
+                    log.warning("Query translation failed, searching the English corpus with Swahili text: %s", e)
+
+        if query_vec is None:
+            query_vec = self.embed_query(query)
+
+        with stage("faiss_search"):
+            distances, indices = current_index.search(query_vec, top_k * 3)  # Get more candidates
+        candidates = zip(indices[0], distances[0])
+
+        filter_start = time.perf_counter()
+        traced_candidates = [] if tracing.active() else None
+        retrieved_texts, retrieved_rows = filter_candidates(
+            candidates, current_store, query, top_k, similarity_threshold, traced_candidates)
+        # Filter out Indian program references from result (post-filtering)
+        result = drop_excluded_sentences("\n".join(retrieved_texts))
+        record_stage("retrieval_filter", filter_start, candidates=traced_candidates, kept_rows=retrieved_rows)
+
+        # If we retrieved English context but need Swahili, translate it
+        if language == "sw" and not use_swahili_corpus and self.use_runtime_translation and result:
+            try:
+                log.debug("Translating retrieved context to Swahili")
+                # Translate in chunks to avoid token limits
+                sentences = result.split('.')
+                translated_sentences = []
+                with stage("translate_context"):
+                    for sent in sentences[:10]:  # Limit to first 10 sentences
+                        if sent.strip():
+                            translated = self.translator.en_to_sw(sent.strip())
+                            translated_sentences.append(translated)
+                result = '. '.join(translated_sentences)
+                log.debug("Context translated to Swahili")
+            except Exception as e:
+                log.warning("Context translation failed: %s", e)
+                # Return English context - model will handle it
+
+        if with_rows:
+            # Rows only describe the result when it is untranslated English corpus text
+            rows = retrieved_rows if current_store is self.store and language != "sw" else None
+            return result, rows
+        return result
+
+    @timed("summarize")
+    def summarize_context(self, context, max_words=120):
+        return summarize_context(context, max_words)  # context_processing.py
+
+    def _translate_query_async(self, user_input):
+        if self._translation_executor is None:
+            self._translation_executor = ThreadPoolExecutor(max_workers=2)
+        return self._translation_executor.submit(bind_request_context(self.translate_query_to_english), user_input)
+
+    # ------------------ Empathetic fallback ------------------
+    @timed("fallback")
+    def empathetic_response(self, user_input, context, emotion, language="en", context_rows=None,
+                            exclude_flags=FLAG_NON_KENYAN):
+        """Empathetic fallback (empathetic_response.py) with this engine's annotations and translator"""
+        return create_empathetic_response(
+            user_input, context, emotion, language, context_rows, exclude_flags, annotations=self.annotations,
+            translate=self.translator.en_to_sw if self.translator is not None else None)
+
+    @staticmethod
+    def _use_fallback(reason):
+        FALLBACKS.inc(reason)
+        tracing.event("fallback", reason=reason)
+        return reason
+
+    # ------------------ Respond ------------------
+    def respond(self, message, language="en", user_name=""):
+        """Answer one user message
+        language: the language the user chose in the app ("en"/"sw"; None/"" auto-detects)
+        Returns a Reply; conversation history is the caller's job"""
+        turn = self.prepare(message, language, user_name)
+        if isinstance(turn, Reply):
+            return turn
+
+        # ------------------ Generate ------------------
+        try:
+            log.debug("Starting response generation")
+            generation_start = time.perf_counter()
+            with stage("generation"):
+                generated = self.generator(turn.prompt, **GENERATION_KWARGS)[0]["generated_text"]
+            generation_seconds = time.perf_counter() - generation_start
+            if self.domain_gate is not None:
+                self.domain_gate.observe_generation(generation_seconds)
+        except Exception:
+            log.exception("Error in generation, falling back to empathetic response", extra={"fallback_reason": "generation_error"})
+            return self.complete(turn, None)
+        return self.complete(turn, generated, generation_seconds)
+
+    def prepare(self, message, language="en", user_name=""):
+        """Everything before generation: routing, language, retrieval, context and the prompt
+        Returns a Reply for messages answered without generation, otherwise a Turn whose
+        prompt goes to the generator (batch jobs can generate many prompts at once)"""
+        user_input = message.strip()
+        user_language_preference = language
+
+        # Intent and emotion in one pass over the message (no model work)
+        with stage("route"):
+            route = self.router.route(user_input)
+
+        # Detect input language (not needed to answer a greeting/off-topic/about-bot message
+        # when the app language is already set)
+        detected_lang = None
+        if not (route.short_circuit and user_language_preference in ("en", "sw")):
+            detected_lang = self.detect_language(user_input)
+            log.debug("Detected language: %s, user preference: %s", detected_lang, user_language_preference)
+
+        # Use user preference if set, otherwise auto-detect
+        # If user writes in Swahili but app is in English, respect user preference (respond in English)
+        # If user preference is Swahili, always respond in Swahili
+        if user_language_preference == "sw":
+            language = "sw"
+        elif detected_lang == "sw" and user_language_preference == "en":
+            # User wrote in Swahili but app is in English - respond in English (respect preference)
+            language = "en"
+        else:
+            language = user_language_preference or detected_lang
+
+        log.debug("Using language: %s", language)
+        tracing.annotate(intent=route.intent, language=language, detected_language=detected_lang)
+
+        # FIRST: Handle greetings, off-topic and about-the-bot questions (before any processing)
+        if route.short_circuit:
+            return Reply(short_circuit_response(route.intent, language, user_name), language, None, "short_circuit")
+
+        # Check for language mismatch: if user types in different language than their mode preference
+        if user_language_preference == "en" and detected_lang == "sw":
+            return Reply(LANGUAGE_MISMATCH_RESPONSES["en"], "en", None, "language_mismatch")
+        elif user_language_preference == "sw" and detected_lang == "en":
+            return Reply(LANGUAGE_MISMATCH_RESPONSES["sw"], "sw", None, "language_mismatch")
+
+        # Set by the semantic domain gate (only where the query vector is in the gate's embedding space)
+        off_domain = False
+        raw_context_unfiltered = ""
+        # English corpus rows behind the context, for the annotated empathetic fallback (None if unknown)
+        context_rows = None
+
+        # For Swahili mode: Always translate to English, search English corpus, generate in English, then translate to Swahili
+        # For English mode: Use existing retrieval (unchanged)
+        if language == "sw":
+            if self.use_multilingual_index:
+                # Multilingual index: the Swahili query retrieves English context directly (generation is in
+                # English). The English question is only needed for the prompt, so translate it alongside retrieval.
+                translation_future = self._translate_query_async(user_input) if self.translator is not None else None
+                log.debug("Searching multilingual index with Swahili query")
+                query_vec = self.embed_query(user_input)
+                off_domain = self.is_off_domain(query_vec)
+                if not off_domain:
+                    raw_context_unfiltered, context_rows = self.retrieve_context(
+                        user_input, top_k=5, similarity_threshold=0.5, language="en", query_vec=query_vec, with_rows=True)
+                query_for_generation = user_input
+                if translation_future is not None and off_domain:
+                    translation_future.cancel()  # The redirect doesn't need the English question
+                elif translation_future is not None:
+                    try:
+                        query_for_generation = translation_future.result()
+                    except Exception as e:
+                        log.warning("Query translation failed, using the Swahili question in the prompt: %s", e)
+            # Always use English corpus for retrieval when generating in English
+            # Translate query to English first
+            elif self.translator is None:
+                log.warning("Translation not available, falling back to direct Swahili search")
+                raw_context_unfiltered = self.retrieve_context(user_input, top_k=5, similarity_threshold=0.4, language="sw")
+                query_for_generation = user_input
+            else:
+                try:
+                    log.debug("Translating Swahili query to English")
+                    query_en = self.translate_query_to_english(user_input)
+
+                    # Search English corpus with translated query (model needs English context)
+                    log.debug("Searching English corpus with translated query")
+                    query_vec = self.embed_query(query_en)
+                    off_domain = self.is_off_domain(query_vec)
+                    if not off_domain:
+                        raw_context_unfiltered, context_rows = self.retrieve_context(
+                            query_en, top_k=5, similarity_threshold=0.5, language="en", query_vec=query_vec, with_rows=True)
+                    query_for_generation = query_en
+                except Exception as e:
+                    log.warning("Query translation failed, using direct Swahili search: %s", e)
+                    raw_context_unfiltered = self.retrieve_context(user_input, top_k=5, similarity_threshold=0.4, language="sw")
+                    query_for_generation = user_input
+        else:
+            # English mode - use existing retrieval (unchanged)
+            log.debug("Processing English query: %.100r", user_input)
+            query_vec = self.embed_query(user_input)
+            off_domain = self.is_off_domain(query_vec)
+            if not off_domain:
+                raw_context_unfiltered, context_rows = self.retrieve_context(
+                    user_input, top_k=5, similarity_threshold=0.5, language=language, query_vec=query_vec, with_rows=True)
+            if raw_context_unfiltered:
+                log.debug("Retrieved context (%d characters): %.150r", len(raw_context_unfiltered), raw_context_unfiltered)
+            else:
+                log.info("No context retrieved")
+            query_for_generation = user_input
+
+        if off_domain:
+            # Clearly outside menstrual health: redirect without building a prompt or calling the generator
+            return Reply(short_circuit_response("off_topic", language), language, None, "off_domain")
+
+        # Additional filtering: remove irrelevant context
+        filter_start = time.perf_counter()
+        raw_context = raw_context_unfiltered
+        exclude_flags = FLAG_NON_KENYAN
+        if raw_context:
+            # Remove sentences that contain irrelevant terms for this query
+            # (exclude_flags: the same filter for annotated sentences)
+            irrelevant_terms, exclude_flags = query_exclusions(user_input)
+            filtered_sentences = []
+            for sent in raw_context.split('.'):
+                sent = sent.strip()
+                if not sent:
+                    continue
+                # Skip if sentence contains irrelevant terms
+                if irrelevant_terms and any(term in sent.lower() for term in irrelevant_terms):
+                    continue
+                filtered_sentences.append(sent)
+            raw_context = '. '.join(filtered_sentences)
+        record_stage("context_filter", filter_start)
+
+        # Summarize context to 80-120 words
+        context = self.summarize_context(raw_context, max_words=120)
+
+        if language == "en" and log.isEnabledFor(logging.DEBUG):
+            log.debug("Summarized context (%d characters, %d words): %.150r", len(context), len(context.split()), context)
+
+        # Store raw_context for fallback use (before summarization)
+        raw_context_for_fallback = raw_context if raw_context else raw_context_unfiltered
+
+        # For Swahili: if context is very limited, still try to generate (model has knowledge)
+        if language == "sw" and (not context or len(context.split()) < 20):
+            log.debug("Limited context for Swahili query, but proceeding with generation")
+            # Don't use fallback immediately - let the model try to generate
+
+        tracing.annotate(context_rows=context_rows)
+
+        # Emotion came with the route (use translated query for Swahili to get better emotion detection)
+        if language == "sw" and query_for_generation != user_input:
+            # Use translated query for better emotion detection in English
+            emotion = self.detect_emotion(query_for_generation)
+        else:
+            emotion = route.emotion
+
+        log.debug("Detected emotion: %s", emotion)
+
+        # Removed few-shot examples to prevent instruction leakage - model will learn from system instruction
+        # For Swahili mode: Always generate in English (will be translated to Swahili)
+        question = query_for_generation if language == "sw" else user_input
+        prompt = build_prompt(context, question, emotion, language)
+
+        # Check and truncate prompt if too long (max 400 tokens to leave room for generation)
+        tokenize_start = time.perf_counter()
+        prompt_tokens = initial_prompt_tokens = None
+        try:
+            prompt_tokens = initial_prompt_tokens = len(self.tokenizer.encode(prompt))
+            log.debug("Initial prompt token count: %d", prompt_tokens)
+            if prompt_tokens > MAX_PROMPT_TOKENS:
+                log.debug("Prompt too long (%d tokens), truncating", prompt_tokens)
+                # Truncate context more aggressively
+                context_truncated = self.summarize_context(raw_context_for_fallback, max_words=80) if raw_context_for_fallback else context
+                prompt = build_prompt(context_truncated, question, emotion, language)
+                prompt_tokens = len(self.tokenizer.encode(prompt))
+                log.debug("Truncated prompt token count: %d", prompt_tokens)
+        except Exception as e:
+            log.warning("Error counting tokens, proceeding anyway: %s", e)
+        record_stage("prompt_tokenization", tokenize_start,
+                     initial_prompt_tokens=initial_prompt_tokens, prompt_tokens=prompt_tokens)
+        tracing.annotate(emotion=emotion, prompt_tokens=prompt_tokens, prompt=prompt)
+
+        return Turn(user_input, language, emotion, prompt, context, raw_context_for_fallback, context_rows,
+                    exclude_flags)
+
+    def complete(self, turn, generated, generation_seconds=None):
+        """Output checks, translation and validation of the generated text for a prepared Turn,
+        with the empathetic fallback where they fail; generated=None when generation failed"""
+        user_input, language, emotion = turn.user_input, turn.language, turn.emotion
+        context, context_rows, exclude_flags = turn.context, turn.context_rows, turn.exclude_flags
+        fallback_reason = None
+
+        def fallback(reason):
+            nonlocal context, fallback_reason
+            # Use raw_context if context is empty or too filtered
+            if not context or len(context.split()) < 20:
+                context = turn.fallback_context
+            fallback_reason = self._use_fallback(reason)
+            return self.empathetic_response(user_input, context, emotion, language, context_rows, exclude_flags)
+
+        if generated is None:
+            # Generation failed (logged by the caller)
+            response = fallback("generation_error")
+            return self._reply(turn, response, context, fallback_reason)
+
+        try:
+            response = generated.strip()
+            if tracing.active():
+                tracing.annotate(decode_steps=len(self.tokenizer.encode(response)), generated=response)
+
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Generated response (%d characters, %d words) in %.2fs: %.150r",
+                          len(response), len(response.split()), generation_seconds or 0.0, response)
+
+            # For Swahili mode: Always translate (we always generate in English)
+            # For English mode: Response stays in English (unchanged)
+            if language == "sw":
+                try:
+                    if self.translator is None:
+                        log.warning("Translation not available, keeping English response")
+                    else:
+                        with stage("translate_response"):
+                            response = self.translator.en_to_sw(response)
+                        log.debug("Response translated to Swahili")
+                except Exception as e:
+                    log.warning("Response translation failed, keeping English response: %s", e)
+                    # Response stays in English as fallback
+
+            instruction_echo_phrases = INSTRUCTION_ECHO_PHRASES["sw" if language == "sw" else "en"]
+            is_echoing_instructions = any(phrase in response.lower() for phrase in instruction_echo_phrases)
+
+            # Also check for obvious context copying (English phrases in Swahili response)
+            if language == "sw":
+                has_english_context = any(phrase in response.lower() for phrase in COPIED_CONTEXT_PHRASES_SW)
+                if has_english_context:
+                    log.debug("Swahili response contains copied English context")
+                    is_echoing_instructions = True
+
+            if is_echoing_instructions:
+                if tracing.active():
+                    response_lower = response.lower()
+                    tracing.event("instruction_echo", phrases=[phrase for phrase in instruction_echo_phrases
+                                                               if phrase in response_lower])
+                log.info("Model is echoing instructions or copying context, using empathetic fallback",
+                         extra={"fallback_reason": "instruction_echo"})
+                response = fallback("instruction_echo")
+
+            # For Swahili: Check if response contains English phrases that shouldn't be there
+            if language == "sw":
+                has_english = any(phrase in response.lower() for phrase in ENGLISH_PHRASES_SW)
+                if has_english:
+                    log.info("Swahili response contains English context, using empathetic fallback",
+                             extra={"fallback_reason": "english_in_swahili"})
+                    response = fallback("english_in_swahili")
+
+            # Check if response is too generic or poor quality
+            is_too_generic = (
+                any(phrase in response.lower() for phrase in GENERIC_PHRASES)
+                and (
+                    len(response.split()) < 50  # Increased threshold
+                    or response.lower().count("talk to") >= 2  # Multiple "talk to" phrases
+                    or (response.lower().count("talk to") >= 1 and len(response.split()) < 30)  # Even one "talk to" if very short
+                )
+            )
+
+            # Check if response is too short, too generic, or doesn't answer the question
+            word_count = len(response.split())
+            sentence_count = len([s for s in response.split('.') if s.strip()])
+
+            # For Swahili, be more lenient with response length (model might generate shorter responses)
+            min_words = 20 if language == "sw" else 30
+            min_sentences = 2 if language == "sw" else 3
+
+            if word_count < min_words or sentence_count < min_sentences or is_too_generic:
+                # Use empathetic fallback module
+                log.info("Response too generic/short (words: %d, sentences: %d), using empathetic fallback",
+                         word_count, sentence_count, extra={"fallback_reason": "too_short_or_generic"})
+                response = fallback("too_short_or_generic")
+            else:
+                # Validate and clean response
+                with stage("validation"):
+                    response, fired_rules = validate_response(response, user_input)
+                if fired_rules:
+                    log.info("Safety rules fired: %s", ", ".join(fired_rules), extra={"rules": fired_rules})
+                    tracing.annotate(rules_fired=fired_rules)
+
+                # Final check: if response is still too short after validation
+                word_count_after = len(response.split())
+                sentence_count_after = len([s for s in response.split('.') if s.strip()])
+                if word_count_after < min_words or sentence_count_after < min_sentences:
+                    log.info("Response still too short after validation (words: %d, sentences: %d), using empathetic fallback",
+                             word_count_after, sentence_count_after, extra={"fallback_reason": "too_short_after_validation"})
+                    response = fallback("too_short_after_validation")
+
+        except Exception:
+            log.exception("Error in generation, falling back to empathetic response", extra={"fallback_reason": "generation_error"})
+            # Use empathetic fallback on error
+            response = fallback("generation_error")
+
+        return self._reply(turn, response, context, fallback_reason)
+
+    @staticmethod
+    def _reply(turn, response, context, fallback_reason):
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Final response (%s, emotion %s, %d characters, %d words): %.200r",
+                      turn.language, turn.emotion, len(response), len(response.split()), response)
+        return Reply(response, turn.language, turn.emotion, "fallback" if fallback_reason else "generated",
+                     fallback_reason, context, turn.context_rows, turn.prompt)
+
+
+# ------------------ Loading the production components ------------------
+def build_engine(stub_models=None, embedding_mode=None):
+    """RagEngine with the models, corpora and indexes from the backend directory
+    stub_models: STUB_MODELS=1 by default; stub generator, embedder and translators (stub_models.py)
+    embedding_mode: EMBEDDING_MODE by default ("monolingual" | "multilingual")
+    Model libraries are imported here, so importing this module loads nothing"""
+    import numpy as np
+    import pandas as pd
+    import faiss
+    from corpus_store import CorpusStore, new_id_index, add_with_row_ids, is_id_mapped
+    from domain_gate import DomainGate, DEFAULT_MARGIN, DEFAULT_MAX_IN_DOMAIN
+    from language_id import LanguageIdentifier
+    from sentence_annotations import SentenceAnnotations
+
+    if stub_models is None:
+        stub_models = os.getenv("STUB_MODELS", "0") == "1"
+    if embedding_mode is None:
+        embedding_mode = os.environ.get("EMBEDDING_MODE", "monolingual")
+
+    # ------------------ 1️⃣ Translation + fine-tuned Flan-T5 ------------------
+    if stub_models:
+        from stub_models import (StubTokenizer, StubGenerator, StubEmbedder, stub_translate_en_to_sw,
+                                 stub_translate_sw_to_en)
+        translator = Translator(stub_translate_en_to_sw, stub_translate_sw_to_en)
+        tokenizer, generator = StubTokenizer(), StubGenerator()
+        log.warning("STUB_MODELS=1: using stub generator, embedder and translators")
+    else:
+        import torch
+        from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
+        from sentence_transformers import SentenceTransformer
+        try:
+            from translation_utils import translate_en_to_sw, translate_sw_to_en, translation_available
+            translator = Translator(translate_en_to_sw, translate_sw_to_en, translation_available)
+        except ImportError:
+            log.warning("Translation utilities not available. Install transformers: pip install transformers")
+            translator = None
+
+        model_name = "./model"
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+        model.eval()
+
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        model.to(device)
+
+        generator = pipeline(
+            "text2text-generation",
+            model=model,
+            tokenizer=tokenizer,
+            max_new_tokens=500,  # Increased for detailed responses
+            device=0 if torch.cuda.is_available() else -1
+        )
+
+    # ------------------ 2️⃣ Load dataset ------------------
+    df = pd.read_csv("./menstrual_data.csv")
+    # Use only answers for retrieval, not questions; FAISS ids are original CSV row ids
+    store = CorpusStore.from_texts(df["answer"].fillna("").tolist())
+
+    # Try to load Swahili translations if available
+    store_sw = None
+    if os.path.exists("./menstrual_data_sw.csv"):
+        try:
+            df_sw = pd.read_csv("./menstrual_data_sw.csv")
+            # Only translated rows are kept, under their original row ids
+            store_sw = CorpusStore.from_texts(df_sw["answer_sw"].fillna("").tolist())
+            log.info("Loaded %d Swahili translations from menstrual_data_sw.csv", len(store_sw))
+        except Exception as e:
+            log.warning("Could not load Swahili translations: %s - runtime translation will be used instead", e)
+    else:
+        log.info("No Swahili translations found, using runtime translation. "
+                 "Run translate_csv.py to create menstrual_data_sw.csv for better performance")
+    has_swahili_corpus = store_sw is not None and len(store_sw) > 0
+
+    # Sentence categories for the empathetic fallback, computed once per corpus sentence
+    # (python sentence_annotations.py; rebuilt here if the corpus changed)
+    annotations = None
+    try:
+        annotations, rebuilt = SentenceAnnotations.load_or_build(store)
+        log.info("%s sentence annotations (%d sentences)", "Built" if rebuilt else "Loaded", len(annotations))
+    except Exception as e:
+        log.warning("Could not load sentence annotations: %s", e)
+
+    # ------------------ 3️⃣ Load or build FAISS index ------------------
+    embedder = None
+    if stub_models:
+        # Stub vectors are indexed in memory; the saved index files are left alone
+        embedder = StubEmbedder()
+        embeddings = embedder.encode(store.texts, convert_to_numpy=True)
+        index = new_id_index(embeddings.shape[1])
+        add_with_row_ids(index, embeddings, store.row_ids)
+    elif os.path.exists("embeddings.npy") and os.path.exists("menstrual_index.faiss"):
+        index = faiss.read_index("menstrual_index.faiss")
+        log.info("Loaded saved embeddings and FAISS index")
+    else:
+        log.info("Creating embeddings and FAISS index...")
+        embedder = SentenceTransformer("all-MiniLM-L6-v2")
+        embeddings = embedder.encode(store.texts, convert_to_numpy=True, show_progress_bar=True)
+
+        index = new_id_index(embeddings.shape[1])
+        add_with_row_ids(index, embeddings, store.row_ids)
+
+        np.save("embeddings.npy", embeddings)
+        faiss.write_index(index, "menstrual_index.faiss")
+        log.info("Saved embeddings and index")
+
+    if embedder is None:
+        embedder = SentenceTransformer("all-MiniLM-L6-v2")
+
+    # Load Swahili FAISS index if available
+    index_sw = None
+    if has_swahili_corpus and not stub_models:
+        if os.path.exists("embeddings_sw.npy") and os.path.exists("menstrual_index_sw.faiss"):
+            try:
+                index_sw = faiss.read_index("menstrual_index_sw.faiss")
+                if is_id_mapped(index_sw):
+                    log.info("Loaded Swahili FAISS index (%d rows)", index_sw.ntotal)
+                else:
+                    # Old indexes were built from the filtered list, so positions don't match CSV rows
+                    log.warning("Swahili index has no row ids and may not match the CSV - ignoring it. "
+                                "Run build_swahili_index.py --rebuild to recreate it")
+                    index_sw = None
+            except Exception as e:
+                log.warning("Could not load Swahili index: %s - run build_swahili_index.py to create it", e)
+        else:
+            log.info("Swahili FAISS index not found. Run build_swahili_index.py after translating CSV")
+
+    # Optional multilingual mode: English answers embedded with a multilingual encoder, so Swahili queries
+    # retrieve without translation
+    # Build it with build_multilingual_index.py, then start with EMBEDDING_MODE=multilingual
+    multilingual_embedder_path = "./multilingual_embedder"
+    index_multi = None
+    multilingual_embedder = None
+    if embedding_mode == "multilingual" and not stub_models:
+        if os.path.exists(multilingual_embedder_path) and os.path.exists("menstrual_index_multilingual.faiss"):
+            try:
+                multilingual_embedder = SentenceTransformer(multilingual_embedder_path)
+                index_multi = faiss.read_index("menstrual_index_multilingual.faiss")
+                log.info("Loaded multilingual encoder and index (%d vectors)", index_multi.ntotal)
+            except Exception as e:
+                multilingual_embedder = index_multi = None
+                log.warning("Could not load multilingual index: %s - falling back to monolingual retrieval", e)
+        else:
+            log.warning("EMBEDDING_MODE=multilingual but no multilingual index found (run build_multilingual_index.py) - "
+                        "falling back to monolingual retrieval")
+
+    # Runtime translation (only if Swahili translations don't exist)
+    # Translation models are loaded lazily on first Swahili request and evicted when idle
+    if not has_swahili_corpus and translator is not None:
+        log.info("Runtime translation enabled - translation models load on first use")
+
+    # Language identifier trained on our own corpora (train_language_id.py); langdetect is the fallback
+    language_identifier = None
+    if os.path.exists("language_id_model.npz"):
+        language_identifier = LanguageIdentifier.load("language_id_model.npz")
+        log.info("Loaded language identifier")
+    else:
+        log.info("language_id_model.npz not found, using langdetect. Run train_language_id.py to create it")
+
+    # Semantic off-domain gate: compares the retrieval query vector with topic centroids
+    # built from domain_prototypes.json. Off by default: the default thresholds have no measured
+    # false-gate rate on the real corpus yet (benchmarks/bench_domain_gate.py); DOMAIN_GATE=on enables it.
+    domain_gate = None
+    if os.environ.get("DOMAIN_GATE", "off") == "on":
+        try:
+            if index_multi is not None:
+                gate_encoder = lambda texts: multilingual_embedder.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+                gate_encoder_id, gate_cache = multilingual_embedder_path, "domain_gate_multi.npz"
+            else:
+                gate_encoder = lambda texts: embedder.encode(texts, convert_to_numpy=True)
+                gate_encoder_id, gate_cache = "all-MiniLM-L6-v2", "domain_gate_en.npz"
+            if stub_models:
+                gate_encoder_id, gate_cache = "stub", None
+            domain_gate = DomainGate.build(
+                gate_encoder,
+                cache_path=gate_cache,
+                encoder_id=gate_encoder_id,
+                margin=float(os.environ.get("DOMAIN_GATE_MARGIN", DEFAULT_MARGIN)),
+                max_in_domain=float(os.environ.get("DOMAIN_GATE_MAX_IN_DOMAIN", DEFAULT_MAX_IN_DOMAIN)),
+            )
+            log.info("Domain gate ready (%d in-domain / %d off-domain topics)",
+                     len(domain_gate.in_names), len(domain_gate.off_names))
+        except Exception as e:
+            log.warning("Could not build domain gate: %s", e)
+
+    return RagEngine(generator, tokenizer, embedder, index, store, translator=translator, store_sw=store_sw,
+                     index_sw=index_sw, multilingual_embedder=multilingual_embedder, index_multi=index_multi,
+                     annotations=annotations, domain_gate=domain_gate, language_identifier=language_identifier)
+
+
+if __name__ == "__main__":
+    # Batch job: answer a file of questions (one per line) with the serving pipeline
+    # python rag_engine.py questions.txt [--language sw] [--output replies.jsonl]
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Answer questions from a file with the /chat pipeline")
+    parser.add_argument("questions", help="Text file, one question per line")
+    parser.add_argument("--language", default="en", choices=["en", "sw"])
+    parser.add_argument("--output", help="JSON lines output (default: stdout)")
+    args = parser.parse_args()
+
+    engine = build_engine()
+    with open(args.questions, encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    out = open(args.output, "w", encoding="utf-8") if args.output else None
+    try:
+        for question in questions:
+            reply = engine.respond(question, args.language)
+            record = {"question": question, **reply._asdict()}
+            print(json.dumps(record, ensure_ascii=False, default=int), file=out)
+    finally:
+        if out is not None:
+            out.close()
@@ -0,0 +1,220 @@
+"""
+Medical safety checks and the final validation layer for generated responses
+- Safety rules are data (safety_rules.json), compiled once by safety_rules.py
+- The response is split into sentence records once; each rule stage is a single
+  linear pass over the records
+- Records carry precomputed lowercase text, normalized form and token set
+- Duplicates are found by hashing normalized forms plus an inverted token index,
+  so a sentence is only compared with earlier sentences that share a word
+"""
+import random
+import re
+from safety_rules import SafetyRuleEngine
+from structured_logging import get_logger
+
+log = get_logger("response_validation")
+
+EMPTY_RESPONSE_FALLBACK = "I'm here to help you with your menstrual health questions. Could you tell me more about what you're experiencing?"
+UNSAFE_RESPONSE_FALLBACK = "I want to make sure I give you accurate and safe information. For specific medical concerns, it's best to speak with a healthcare provider who can give you personalized advice."
+
+# ------------------ 7️⃣ Medical Safety Validation ------------------
+# Detect / rewrite / drop-sentence / contradiction rules: see safety_rules.json
+SAFETY_RULES = SafetyRuleEngine.load()
+
+def check_unsafe_content(text, rules=None):
+    """Check for unsafe medical advice"""
+    rule_id = (rules or SAFETY_RULES).detect(text)
+    if rule_id:
+        return True, f"Unsafe medical advice detected: {rule_id}"
+    return False, None
+
+def fix_tampon_safety_info(text, rules=None):
+    """Fix incorrect tampon/pad safety information (and the other rewrite rules)"""
+    return (rules or SAFETY_RULES).rewrite(text)[0]
+
+# ------------------ 8️⃣ Final Validation Layer ------------------
+# Generic overused closings (compared without the final period - sentences are split on '.')
+GENERIC_CLOSINGS = [
+    "Remember, you're not alone in this, and it's okay to ask questions",
+    "I hope this helps! Feel free to ask if you have more questions—I'm here to support you",
+]
+
+VARIED_CLOSINGS = [
+    "I'm here if you need to talk more about this.",
+    "Feel free to reach out if you have other questions.",
+    "You're doing great by asking questions and taking care of yourself.",
+    "I'm always here to support you with whatever you need.",
+]
+
+MENARCHE_QUERY_TERMS = ["menarche", "first period", "puberty"]
+MENARCHE_SENTENCE_TERMS = ["menarche", "first menstrual period", "ages of 10 and 16", "typically occurs between"]
+MENARCHE_WORDS = ["menarche", "first period", "puberty", "ages of 10 and 16"]
+SEX_CONTEXTS = ["intercourse", "sexual", "partner", "relationship", "swim"]
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+class Sentence:
+    """One sentence of the response with its precomputed comparison forms"""
+    __slots__ = ("text", "lower", "_normalized", "_tokens")
+
+    def __init__(self, text):
+        self.set_text(text)
+
+    def set_text(self, text):
+        self.text = text
+        self.lower = text.lower()
+        self._normalized = None
+        self._tokens = None
+
+    @property
+    def normalized(self):
+        """Lowercase, single-spaced, punctuation removed"""
+        if self._normalized is None:
+            self._normalized = _PUNCTUATION.sub('', ' '.join(self.lower.split()))
+        return self._normalized
+
+    @property
+    def tokens(self):
+        if self._tokens is None:
+            self._tokens = frozenset(self.normalized.split())
+        return self._tokens
+
+
+def _split_sentences(text):
+    return [Sentence(part.strip()) for part in text.split('.') if part.strip()]
+
+def _join_sentences(sentences):
+    """'. ' between sentences, or just a space after one that already ends in '!' or '?'"""
+    parts = []
+    for sent in sentences:
+        if parts:
+            parts.append(' ' if parts[-1].endswith(('!', '?')) else '. ')
+        parts.append(sent.text)
+    return ''.join(parts)
+
+def _remove_duplicates(sentences):
+    """Drop short fragments, exact duplicates and near-duplicates (>70% word overlap or subset)"""
+    seen_normalized = set()
+    postings = {}  # token -> indices of kept long sentences containing it
+    kept = []
+    for sent in sentences:
+        if len(sent.text) < 10:
+            continue
+        normalized = sent.normalized
+        if normalized in seen_normalized:
+            continue
+
+        if len(normalized) > 20:
+            tokens = sent.tokens
+            shared = {}
+            for token in tokens:
+                for j in postings.get(token, ()):
+                    shared[j] = shared.get(j, 0) + 1
+            is_duplicate = False
+            for j, overlap in shared.items():
+                other = len(kept[j].tokens)
+                if overlap / max(len(tokens), other) > 0.7 or overlap == len(tokens) or overlap == other:
+                    is_duplicate = True
+                    break
+            if is_duplicate:
+                continue
+            for token in tokens:
+                postings.setdefault(token, []).append(len(kept))
+
+        # Exact duplicates (including consecutive repeats) are caught by the hash set
+        seen_normalized.add(normalized)
+        kept.append(sent)
+    return kept
+
+def validate_response(response, user_input, rules=None):
+    """Final validation: remove repeats, contradictions, unsafe content, ensure warm tone
+    Returns (response, ids of the safety rules that fired)"""
+    rules = rules or SAFETY_RULES
+    fired = []
+    if not response:
+        return EMPTY_RESPONSE_FALLBACK, fired
+
+    # 1. Remove sentences matching drop rules (CRITICAL - model copying instructions)
+    sentences = []
+    for sent in _split_sentences(response):
+        rule_id = rules.drop_match(sent.text, sent.lower)
+        if rule_id is None:
+            sentences.append(sent)
+        elif rule_id not in fired:
+            fired.append(rule_id)
+    if not sentences:
+        # If all sentences were instruction echoes, return fallback
+        return EMPTY_RESPONSE_FALLBACK, fired
+    text = _join_sentences(sentences)
+
+    # 2. Check for unsafe content
+    rule_id = rules.detect(text)
+    if rule_id:
+        fired.append(rule_id)
+        log.warning("Unsafe content detected: %s", rule_id)
+        # Return safe fallback
+        return UNSAFE_RESPONSE_FALLBACK, fired
+
+    # 3. Rewrite rules: tampon safety info, typos, cold phrasing (re-split only if something changed)
+    rewritten, rewrite_fired = rules.rewrite(text)
+    if rewrite_fired:
+        fired.extend(rewrite_fired)
+        sentences = _split_sentences(rewritten)
+
+    # 4. Remove repeated sentences (exact and near-duplicates)
+    sentences = _remove_duplicates(sentences)
+
+    # 5. Remove the incorrect half of contradictory statements
+    contradictions = rules.contradictions(_join_sentences(sentences))
+    if contradictions:
+        fired.extend(rule.id for rule in contradictions)
+        for sent in sentences:
+            new_text = sent.text
+            for rule in contradictions:
+                new_text = rule.wrong.sub('', new_text)
+            if new_text != sent.text:
+                sent.set_text(new_text.strip())
+        sentences = [s for s in sentences if s.text]
+
+    # 6. Remove generic overused closings
+    if sentences:
+        last = sentences[-1]
+        for closing in GENERIC_CLOSINGS:
+            if last.text.endswith(closing):
+                last.set_text(last.text[:-len(closing)].strip())
+                if not last.text:
+                    sentences.pop()
+                break
+
+    # 7. Ensure minimum length (4-6 sentences) - add varied empathetic closing if too short
+    if len(sentences) < 4:
+        sentences.append(Sentence(random.choice(VARIED_CLOSINGS).rstrip('.')))
+
+    # 8-9. Sentence filters: irrelevant menarche info, sex mentions when not relevant
+    user_input_lower = user_input.lower()
+    drop_menarche = not any(term in user_input_lower for term in MENARCHE_QUERY_TERMS)
+    drop_sex = not any(ctx in user_input_lower for ctx in SEX_CONTEXTS)
+    filtered = []
+    for sent in sentences:
+        # Only remove if sentence is primarily about menarche (>30% of its words)
+        if drop_menarche and any(term in sent.lower for term in MENARCHE_SENTENCE_TERMS):
+            menarche_count = sum(1 for term in MENARCHE_WORDS if term in sent.lower)
+            if menarche_count > 0 and menarche_count / max(len(sent.text.split()), 1) > 0.3:
+                continue
+        if drop_sex and "sex" in sent.lower and "swim" not in sent.lower:
+            continue
+        filtered.append(sent)
+    if filtered:
+        sentences = filtered
+
+    # 10. Ensure proper sentence endings
+    response = _join_sentences(sentences).strip()
+    if response and not response.endswith(('.', '!', '?')):
+        response += '.'
+
+    return response.strip(), fired
+
+def validate_and_clean_response(response, user_input):
+    """Final validation; returns only the cleaned response"""
+    return validate_response(response, user_input)[0]
@@ -0,0 +1,196 @@
+"""
+Declarative medical-safety rule engine
+- Rules live in safety_rules.json (versioned) and are compiled once at load
+- Literal phrases of all rules of one type are merged into one trie-shaped
+  regex (see phrase_rewriter.py), so adding phrase rules does not add passes or
+  per-character work; regex rules of one type share a single alternation
+- Every operation reports the ids of the rules that fired
+
+Run `python safety_rules.py [path]` to check a rules file after editing it.
+"""
+import json
+import os
+import re
+import sys
+from phrase_rewriter import compile_phrases
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "safety_rules.json")
+RULE_TYPES = ("detect", "rewrite", "drop_sentence", "contradiction")
+
+
+class SafetyRule:
+    """One rule: an id, a type and either literal phrases or a regex pattern"""
+
+    def __init__(self, spec):
+        self.id = spec["id"]
+        self.type = spec["type"]
+        if self.type not in RULE_TYPES:
+            raise ValueError(f"Rule {self.id}: unknown type {self.type!r}")
+        self.ignore_case = spec.get("ignore_case", False)
+        self.replacement = spec.get("replacement")
+        self.phrases = None
+        self.pattern = None
+        if self.type == "contradiction":
+            self.wrong = self._compile(spec["wrong"])
+            self.right = self._compile(spec["right"])
+            return
+        if "phrases" in spec:
+            phrases = spec["phrases"]
+            if not isinstance(phrases, dict):
+                phrases = {phrase: self.replacement for phrase in phrases}
+            self.phrases = {(k.lower() if self.ignore_case else k): v for k, v in phrases.items() if k}
+        else:
+            self.pattern = spec["pattern"]
+            self._compile(self.pattern)
+        replacements = [self.replacement] if self.phrases is None else list(self.phrases.values())
+        if self.type == "rewrite" and None in replacements:
+            raise ValueError(f"Rule {self.id}: rewrite rules need a replacement")
+
+    def _compile(self, source):
+        """Compile alone first so a bad rule is reported by id, not as a broken combined pattern"""
+        try:
+            compiled = re.compile(source, re.IGNORECASE if self.ignore_case else 0)
+        except re.error as e:
+            raise ValueError(f"Rule {self.id}: invalid pattern: {e}") from e
+        if compiled.groupindex:
+            raise ValueError(f"Rule {self.id}: named groups are not allowed")
+        return compiled
+
+    def scoped(self, source):
+        return f"(?i:{source})" if self.ignore_case else f"(?:{source})"
+
+
+class _RuleSet:
+    """All rules of one type compiled together"""
+
+    def __init__(self, rules):
+        self.rules = rules
+        # phrase -> (rule, replacement); case-insensitive phrases are stored lowercase
+        self.exact = {}
+        self.folded = {}
+        pattern_rules = []
+        for rule in rules:
+            if rule.phrases is None:
+                pattern_rules.append(rule)
+                continue
+            table = self.folded if rule.ignore_case else self.exact
+            for phrase, replacement in rule.phrases.items():
+                table.setdefault(phrase, (rule, replacement))
+        self.exact_re = compile_phrases(self.exact)
+        self.folded_re = compile_phrases(self.folded)  # Run against lowercased text
+        self.by_group = {f"r{i}": rule for i, rule in enumerate(pattern_rules)}
+        self.pattern_re = re.compile("|".join(f"(?P<{group}>{rule.scoped(rule.pattern)})"
+                                              for group, rule in self.by_group.items())) if pattern_rules else None
+
+        # Everything in one alternation, used when matches must be replaced in place
+        branches = []
+        if self.exact_re is not None:
+            branches.append(f"(?P<exact>{self.exact_re.pattern})")
+        if self.folded_re is not None:
+            branches.append(f"(?P<folded>(?i:{self.folded_re.pattern}))")
+        if self.pattern_re is not None:
+            branches.append(self.pattern_re.pattern)
+        self.combined_re = re.compile("|".join(branches)) if branches else None
+
+    def search(self, text, lower=None):
+        """Return the rule of any match in text, or None (lower: text.lower(), if already at hand)"""
+        if self.exact_re is not None:
+            match = self.exact_re.search(text)
+            if match:
+                return self.exact[match.group(0)][0]
+        if self.folded_re is not None:
+            match = self.folded_re.search(text.lower() if lower is None else lower)
+            if match:
+                return self.folded[match.group(0)][0]
+        if self.pattern_re is not None:
+            match = self.pattern_re.search(text)
+            if match:
+                return self.by_group[match.lastgroup]
+        return None
+
+    def _resolve(self, match):
+        """(rule, replacement) for a match of combined_re"""
+        group = match.lastgroup
+        if group == "exact":
+            return self.exact[match.group(0)]
+        if group == "folded":
+            return self.folded[match.group(0).lower()]
+        rule = self.by_group[group]
+        return rule, rule.replacement
+
+    def sub(self, text):
+        """Replace every match in one left-to-right pass; returns (text, fired rule ids)"""
+        fired = []
+        # Cheap searches first: most responses trigger no rewrite at all
+        if self.combined_re is None or self.search(text) is None:
+            return text, fired
+
+        def replace(match):
+            rule, replacement = self._resolve(match)
+            if rule.id not in fired:
+                fired.append(rule.id)
+            return replacement
+
+        return self.combined_re.sub(replace, text), fired
+
+
+class SafetyRuleEngine:
+    """Compiled rule set; each operation is one scan per rule type"""
+
+    def __init__(self, rules, version=None):
+        self.version = version
+        self.rules = [rule if isinstance(rule, SafetyRule) else SafetyRule(rule) for rule in rules]
+        ids = [rule.id for rule in self.rules]
+        if len(ids) != len(set(ids)):
+            raise ValueError("Rule ids must be unique")
+        of_type = {t: [rule for rule in self.rules if rule.type == t] for t in RULE_TYPES}
+        self._detect = _RuleSet(of_type["detect"])
+        self._rewrite = _RuleSet(of_type["rewrite"])
+        self._drop = _RuleSet(of_type["drop_sentence"])
+        self._contradictions = of_type["contradiction"]
+        # Prefilter: any half of any pair; in the common case this one scan is all that runs
+        self._contradiction_any = re.compile("|".join(
+            rule.scoped(half.pattern) for rule in self._contradictions for half in (rule.wrong, rule.right)
+        )) if self._contradictions else None
+
+    @classmethod
+    def load(cls, path=RULES_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["rules"], version=data.get("version"))
+
+    def detect(self, text, lower=None):
+        """Return the id of a detect rule matching text, or None"""
+        if not text:
+            return None
+        rule = self._detect.search(text, lower)
+        return rule.id if rule else None
+
+    def rewrite(self, text):
+        """Apply every rewrite rule in one left-to-right pass; returns (text, fired rule ids)"""
+        if not text:
+            return text, []
+        return self._rewrite.sub(text)
+
+    def drop_match(self, sentence, lower=None):
+        """Return the id of the drop_sentence rule matching sentence, or None"""
+        if not sentence:
+            return None
+        rule = self._drop.search(sentence, lower)
+        return rule.id if rule else None
+
+    def contradictions(self, text):
+        """Return the contradiction rules whose wrong and right statements both occur in text"""
+        if self._contradiction_any is None or not text or not self._contradiction_any.search(text):
+            return []
+        return [rule for rule in self._contradictions if rule.wrong.search(text) and rule.right.search(text)]
+
+    def summary(self):
+        counts = {t: sum(1 for rule in self.rules if rule.type == t) for t in RULE_TYPES}
+        return {"version": self.version, "rules": len(self.rules), "by_type": counts}
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else RULES_PATH
+    engine = SafetyRuleEngine.load(path)
+    print(f"✅ {path}: {json.dumps(engine.summary())}")
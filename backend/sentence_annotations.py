@@ -0,0 +1,243 @@
+"""
+Precomputed sentence annotations for the empathetic fallback response
+- Every corpus answer is split into '.'-separated sentences once (offline or at
+  startup); each sentence gets a category (tip / explanation / dropped / short),
+  a word count and filter flags, stored as compact arrays with char offsets
+- At request time the fallback picks sentences by retrieved row id alone:
+  array lookups and slicing, no per-request keyword scanning
+- The keyword lists are the ones create_empathetic_response used to scan at
+  request time; the categories reproduce those rules. FLAG_TERMS is also what
+  the context filters use (context_processing.drop_excluded_sentences,
+  rag_engine.query_exclusions), so a flagged sentence is exactly one the
+  context filter would drop
+
+Build offline with `python sentence_annotations.py` (app.py rebuilds the file
+when the corpus changes).
+"""
+import hashlib
+import numpy as np
+
+ANNOTATIONS_PATH = "sentence_annotations.npz"
+
+# Categories
+DROPPED = 0       # Generic advice only, or nothing worth keeping
+TIP = 1           # Actionable
+EXPLANATION = 2   # Informative / explanatory
+SHORT = 3         # 20 characters or less: never used, doesn't count toward the sentence window
+
+# Filter flags
+FLAG_NON_KENYAN = 1       # Indian program references (always filtered out)
+FLAG_PUBERTY = 2          # menarche / first period / puberty / ages of 10 and 16
+FLAG_FIRST_PERIOD = 4     # menarche / first period
+
+GENERIC_PHRASES = [
+    "talk to your doctor", "consult a healthcare professional",
+    "maintain a healthy lifestyle", "it's important to",
+    "talk to a trusted teacher", "talk to a school nurse",
+]
+ACTIONABLE_WORDS = [
+    "can", "may", "help", "try", "use", "apply", "take", "reduce", "relief", "manage", "alleviate", "include",
+    "methods", "through", "applying", "heating", "exercise", "relaxation", "dietary", "pain relievers",
+    "ibuprofen", "heat", "warm", "bath", "pad",
+]
+INFORMATIVE_WORDS = [
+    "is", "are", "characterized", "symptoms", "causes", "means", "refers to", "involves", "alleviated",
+    "various", "disorder", "condition",
+]
+NON_KENYAN_PHRASES = [
+    "anms", "ashas", "awwwws", "auxiliary nurse", "auxiliary admiles",
+    "pradhan mantri", "bhartiya janaushadhi", "pmbjp", "janaushadhi",
+    "beti bachao", "beti padhao", "rural india", "indian cities",
+    "indian villages", "hdi gender inequality", "gender equality in india",
+    "walimu na wafanyakazi", "kudumisha usafi", "mabovu ya usafi",
+    "mashambani", "gharama kubwa", "mpango wa kuendeleza",
+]
+PUBERTY_TERMS = ["menarche", "first period", "puberty", "ages of 10 and 16"]
+FIRST_PERIOD_TERMS = ["menarche", "first period"]
+FLAG_TERMS = {FLAG_NON_KENYAN: NON_KENYAN_PHRASES, FLAG_PUBERTY: PUBERTY_TERMS, FLAG_FIRST_PERIOD: FIRST_PERIOD_TERMS}
+
+MAX_FALLBACK_SENTENCES = 10
+
+
+def sentence_spans(text):
+    """(start, end) of each non-empty '.'-separated piece of text, whitespace trimmed"""
+    spans = []
+    start = 0
+    length = len(text)
+    while start <= length:
+        end = text.find(".", start)
+        if end < 0:
+            end = length
+        piece = text[start:end]
+        stripped = piece.strip()
+        if stripped:
+            lead = len(piece) - len(piece.lstrip())
+            spans.append((start + lead, start + lead + len(stripped)))
+        start = end + 1
+    return spans
+
+
+def categorize(sentence):
+    """Category of one stripped sentence (the fallback's request-time rules)"""
+    if len(sentence) <= 20:
+        return SHORT
+    lower = sentence.lower()
+    has_generic_phrase = any(phrase in lower for phrase in GENERIC_PHRASES)
+    has_actionable = any(word in lower for word in ACTIONABLE_WORDS)
+    is_informative = any(word in lower for word in INFORMATIVE_WORDS)
+    # Only skip if it's ONLY generic and has no actionable/informative content
+    if has_generic_phrase and not has_actionable and not is_informative and len(sentence) < 60:
+        return DROPPED
+    if has_actionable:
+        return TIP
+    if is_informative or len(sentence) > 40:
+        return EXPLANATION
+    return DROPPED
+
+
+def sentence_flags(sentence):
+    lower = sentence.lower()
+    flags = 0
+    for flag, terms in FLAG_TERMS.items():
+        if any(term in lower for term in terms):
+            flags |= flag
+    return flags
+
+
+def flag_terms(flags):
+    """The terms behind every flag set in flags (what a text filter for those flags matches)"""
+    return [term for flag, terms in FLAG_TERMS.items() if flags & flag for term in terms]
+
+
+def classify_text(context):
+    """(explanations, tips) from free text - used when the context did not come from annotated rows"""
+    explanations, tips = [], []
+    sentences = [piece.strip() for piece in context.split('.')]
+    sentences = [sent for sent in sentences if len(sent) > 20][:MAX_FALLBACK_SENTENCES]
+    for sent in sentences:
+        category = categorize(sent)
+        if category == TIP:
+            tips.append(sent)
+        elif category == EXPLANATION:
+            explanations.append(sent)
+    return explanations, tips
+
+
+def corpus_fingerprint(texts):
+    digest = hashlib.sha1()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class SentenceAnnotations:
+    """Per-sentence arrays for a CorpusStore; sentences of store position p are row_ptr[p]:row_ptr[p+1]"""
+
+    def __init__(self, row_ids, row_ptr, starts, ends, category, flags, words, fingerprint, texts=None):
+        self.row_ids = np.asarray(row_ids, dtype=np.int64)
+        self.row_ptr = np.asarray(row_ptr, dtype=np.int64)
+        self.starts = np.asarray(starts, dtype=np.int32)
+        self.ends = np.asarray(ends, dtype=np.int32)
+        self.category = np.asarray(category, dtype=np.uint8)
+        self.flags = np.asarray(flags, dtype=np.uint8)
+        self.words = np.asarray(words, dtype=np.uint16)
+        self.fingerprint = fingerprint
+        self.texts = texts  # The store's texts, attached at load time
+
+    @classmethod
+    def build(cls, store):
+        row_ptr = [0]
+        starts, ends, category, flags, words = [], [], [], [], []
+        for text in store.texts:
+            for start, end in sentence_spans(text):
+                sentence = text[start:end]
+                starts.append(start)
+                ends.append(end)
+                category.append(categorize(sentence))
+                flags.append(sentence_flags(sentence))
+                words.append(min(len(sentence.split()), 65535))
+            row_ptr.append(len(starts))
+        return cls(store.row_ids, row_ptr, starts, ends, category, flags, words,
+                   corpus_fingerprint(store.texts), store.texts)
+
+    def save(self, path=ANNOTATIONS_PATH):
+        np.savez_compressed(path, row_ids=self.row_ids, row_ptr=self.row_ptr, starts=self.starts, ends=self.ends,
+                            category=self.category, flags=self.flags, words=self.words,
+                            fingerprint=np.array(self.fingerprint))
+
+    @classmethod
+    def load(cls, path, store):
+        """Load annotations for store; None if the file was built from a different corpus"""
+        data = np.load(path)
+        fingerprint = str(data["fingerprint"])
+        if fingerprint != corpus_fingerprint(store.texts):
+            return None
+        return cls(data["row_ids"], data["row_ptr"], data["starts"], data["ends"], data["category"],
+                   data["flags"], data["words"], fingerprint, store.texts)
+
+    @classmethod
+    def load_or_build(cls, store, path=ANNOTATIONS_PATH):
+        try:
+            annotations = cls.load(path, store)
+            if annotations is not None:
+                return annotations, False
+        except (OSError, KeyError, ValueError):
+            pass
+        annotations = cls.build(store)
+        annotations.save(path)
+        return annotations, True
+
+    def __len__(self):
+        return len(self.category)
+
+    def text(self, sentence_id):
+        position = int(np.searchsorted(self.row_ptr, sentence_id, side="right")) - 1
+        return self.texts[position][self.starts[sentence_id]:self.ends[sentence_id]]
+
+    def sentence_ids(self, row_ids):
+        """Sentence ids of the given rows, in row order then sentence order"""
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        positions = np.searchsorted(self.row_ids, row_ids)
+        found = positions < len(self.row_ids)
+        found[found] = self.row_ids[positions[found]] == row_ids[found]
+        positions = positions[found]
+        if len(positions) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([np.arange(self.row_ptr[p], self.row_ptr[p + 1]) for p in positions])
+
+    def fallback_sentences(self, row_ids, exclude_flags=FLAG_NON_KENYAN, max_words=120, min_words=20):
+        """(explanation sentence ids, tip sentence ids) for the fallback response
+
+        Mirrors the request-time path: drop flagged sentences, keep a ~max_words
+        summary window (or everything when that leaves fewer than min_words),
+        then look at the first MAX_FALLBACK_SENTENCES sentences over 20 chars.
+        Sentences are split per row: a row whose last sentence has no final '.'
+        is not merged with the next row's first sentence, as it is in the
+        newline-joined context text.
+        """
+        ids = self.sentence_ids(row_ids)
+        if len(ids) == 0:
+            return ids, ids
+        ids = ids[(self.flags[ids] & exclude_flags) == 0]
+        within_budget = ids[np.cumsum(self.words[ids].astype(np.int64)) <= max_words]
+        if self.words[within_budget].sum() >= min_words:
+            ids = within_budget
+        ids = ids[self.category[ids] != SHORT][:MAX_FALLBACK_SENTENCES]
+        return ids[self.category[ids] == EXPLANATION], ids[self.category[ids] == TIP]
+
+
+if __name__ == "__main__":
+    import time
+    import pandas as pd
+    from corpus_store import CorpusStore
+
+    df = pd.read_csv("./menstrual_data.csv")
+    store = CorpusStore.from_texts(df["answer"].fillna("").tolist())
+    start = time.perf_counter()
+    annotations = SentenceAnnotations.build(store)
+    annotations.save(ANNOTATIONS_PATH)
+    counts = np.bincount(annotations.category, minlength=4)
+    print(f"✅ Annotated {len(annotations)} sentences from {len(store)} answers in {time.perf_counter() - start:.1f}s "
+          f"(tips {counts[TIP]}, explanations {counts[EXPLANATION]}, dropped {counts[DROPPED]}, short {counts[SHORT]})")
+    print(f"   Saved {ANNOTATIONS_PATH}")
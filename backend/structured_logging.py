@@ -0,0 +1,139 @@
+"""
+Leveled, structured logging for the backend
+- One JSON object per line (LOG_FORMAT=text for a human-readable console),
+  tagged with the request id of the /chat request that produced it
+- Records go through a bounded queue to a background listener thread, so a
+  request never waits on stderr; when the queue is full records are dropped
+  and counted in eunoia_log_records_dropped_total instead of blocking
+- DEBUG records (prompt/context previews, token counts, ...) are kept for a
+  sampled fraction of requests (LOG_DEBUG_SAMPLE_RATE), all-or-nothing per
+  request so a sampled request can be followed end to end
+- Log calls use %-style arguments, so a disabled level never formats anything;
+  LOG_LEVEL=INFO (the default) makes the verbose paths cost one level check
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import uuid
+from datetime import datetime, timezone
+from metrics import Counter
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json").lower()
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+
+LOG_RECORDS_DROPPED = Counter("eunoia_log_records_dropped_total", "Log records dropped because the log queue was full")
+
+# Attributes every LogRecord has; anything else came in through extra= and is a structured field
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+_debug_sampled = contextvars.ContextVar("debug_sampled", default=True)
+_listener = None
+
+
+def start_request(request_id=None):
+    """Tag this context's records with a request id and decide whether its DEBUG records are kept"""
+    request_id = request_id or uuid.uuid4().hex[:16]
+    _request_id.set(request_id)
+    _debug_sampled.set(LOG_DEBUG_SAMPLE_RATE >= 1.0 or random.random() < LOG_DEBUG_SAMPLE_RATE)
+    return request_id
+
+
+def end_request():
+    _request_id.set(None)
+    _debug_sampled.set(True)
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def bind_request_context(fn):
+    """Run fn in a copy of the caller's context, e.g. on an executor thread, keeping its request id"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps the request id and applies per-request DEBUG sampling"""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return record.levelno >= logging.INFO or _debug_sampled.get()
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread; formatting happens there, not on the request thread"""
+
+    def prepare(self, record):
+        # The stock prepare() formats the message here; the listener's handler formats it later
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = None
+        return super().format(record)
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """Route every "eunoia.*" logger through the queue; safe to call more than once"""
+    global _listener
+    logger = logging.getLogger("eunoia")
+    logger.setLevel(level)
+    if _listener is not None:
+        return logger
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)  # Drain what is queued on shutdown
+    return logger
+
+
+def get_logger(name):
+    """Logger under the "eunoia" namespace, e.g. get_logger("app") -> eunoia.app"""
+    return logging.getLogger(f"eunoia.{name}")
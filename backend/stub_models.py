@@ -0,0 +1,92 @@
+"""
+Deterministic stand-ins for the model components (STUB_MODELS=1)
+- StubTokenizer: whitespace tokens, for prompt token counts
+- StubGenerator: replaces the generator; answers with sentences from the prompt's
+  Context line picked by a hash of the prompt, and can sleep STUB_GENERATION_MS
+  to stand in for decode time
+- StubEmbedder: hashed bag-of-words vectors with SentenceTransformer.encode's
+  signature; texts sharing words get close vectors, so FAISS retrieval and the
+  filters after it do real work
+- stub_translate_en_to_sw / stub_translate_sw_to_en: only the phrase tables in
+  swahili_text, no translation model
+Lets retrieval, validation and storage be benchmarked without model weights.
+The answers are not meant to be good, only repeatable.
+"""
+import os
+import random
+import re
+import time
+import zlib
+import numpy as np
+from swahili_text import preprocess_swahili_query
+
+STUB_EMBEDDING_DIM = 384
+STUB_GENERATION_MS = float(os.environ.get("STUB_GENERATION_MS", "0"))
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+FILLER_SENTENCES = [
+    "I'm really sorry you're dealing with this, and it's completely okay to ask about it",
+    "Many young people go through the same thing, so you are not alone",
+    "A hot water bottle on your lower tummy and some gentle stretching can help you feel better",
+    "Drinking enough water and getting some rest also makes a difference",
+    "If the pain becomes severe or keeps coming back, it's a good idea to visit a clinic",
+]
+
+
+def _seed(text):
+    return zlib.crc32(text.encode("utf-8"))
+
+
+class StubTokenizer:
+    def encode(self, text, **kwargs):
+        return [_seed(word) % 32000 for word in text.split()]
+
+
+class StubGenerator:
+    """Called like the transformers text2text pipeline: stub(prompt, **generate_kwargs)"""
+
+    def __init__(self, generation_ms=STUB_GENERATION_MS):
+        self.generation_ms = generation_ms
+
+    def __call__(self, prompt, **kwargs):
+        if isinstance(prompt, list):
+            return [self(p, **kwargs) for p in prompt]
+        if self.generation_ms:
+            time.sleep(self.generation_ms / 1000)
+        context = ""
+        for line in prompt.splitlines():
+            if line.startswith("Context:"):
+                context = line[len("Context:"):]
+                break
+        sentences = [s.strip() for s in context.split(".") if len(s.strip().split()) >= 4]
+        rng = random.Random(_seed(prompt))
+        picked = rng.sample(sentences, min(3, len(sentences)))
+        text = ". ".join([FILLER_SENTENCES[0]] + picked + FILLER_SENTENCES[len(picked) + 1:4]) + "."
+        return [{"generated_text": text}]
+
+
+class StubEmbedder:
+    def __init__(self, dim=STUB_EMBEDDING_DIM):
+        self.dim = dim
+
+    def _vector(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD_RE.findall(text.lower()):
+            h = _seed(word)
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, texts, convert_to_numpy=True, normalize_embeddings=False, show_progress_bar=False, **kwargs):
+        if isinstance(texts, str):
+            return self._vector(texts)
+        return np.stack([self._vector(text) for text in texts]) if texts else np.zeros((0, self.dim), np.float32)
+
+
+def stub_translate_en_to_sw(text, **kwargs):
+    return text
+
+
+def stub_translate_sw_to_en(text, **kwargs):
+    return preprocess_swahili_query(text)
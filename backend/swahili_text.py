@@ -0,0 +1,84 @@
+"""
+Swahili text pre/post-processing around the translation models
+- Phrase tables live in swahili_phrases.json and are compiled once at import
+- No model dependencies, so these can be used (and benchmarked) without torch
+"""
+import os
+from phrase_rewriter import load_phrase_tables
+
+PHRASES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "swahili_phrases.json")
+PHRASE_TABLES = load_phrase_tables(PHRASES_PATH)
+
+def _capitalize(sent):
+    return sent[0].upper() + sent[1:] if len(sent) > 1 else sent.upper()
+
+def _clean_text(text):
+    """Collapse whitespace and fix spacing around punctuation
+    Runs on the joined text: joining sentences that already end in '.' leaves '..'"""
+    text = " ".join(text.split())
+    return text.replace("..", ".").replace(" .", ".").replace(" ,", ",")
+
+def naturalize_swahili(text):
+    """Make Swahili translation more casual and natural (Kenyan Kiswahili style)"""
+    if not text:
+        return text
+
+    # Replace formal phrases with casual equivalents (single pass, longest phrase wins)
+    result = PHRASE_TABLES["naturalize"].rewrite(text)
+
+    # Break long sentences (more than 25 words) at the first conjunction
+    pieces = []
+    for sent in result.split(". "):
+        sent = sent.strip()
+        if not sent:
+            continue
+        words = sent.split()
+        if len(words) > 25 and " au " in sent:
+            first, rest = sent.split(" au ", 1)
+            pieces += [first.strip() + ".", "Au " + rest.strip()]
+        elif len(words) > 25 and " na " in sent:
+            first, rest = sent.split(" na ", 1)
+            pieces += [first.strip() + ".", "Na " + rest.strip()]
+        else:
+            pieces.append(sent)
+
+    # Clean up spacing and punctuation once, then capitalize every sentence
+    result = _clean_text(". ".join(pieces))
+    return ". ".join(_capitalize(sent) for sent in (s.strip() for s in result.split(". ")) if sent).strip()
+
+def preprocess_swahili_query(text):
+    """Preprocess Swahili query to improve translation quality"""
+    if not text:
+        return text
+
+    original_text = text
+    text_lower = text.strip().lower()
+
+    # Direct mappings for common Swahili queries (substring match, longest phrase wins)
+    direct = PHRASE_TABLES["query_direct"].first_match(text_lower)
+    if direct is not None:
+        return direct
+
+    # Common Swahili question patterns that need better translation
+    result = PHRASE_TABLES["query_rewrite"].rewrite(text_lower)
+
+    # If the query starts with a question word pattern, ensure it's a proper question
+    if result.startswith("how") or result.startswith("why") or result.startswith("what"):
+        # Already good
+        pass
+    elif "how" in result or "why" in result or "what" in result:
+        # Has question word, might be okay
+        pass
+    else:
+        # Try to add context if it's about pain/periods
+        if "pain" in result or "cramp" in result or "period" in result:
+            if "help" not in result:
+                result = "how to help with " + result
+            elif "how" not in result:
+                result = "how " + result
+
+    # If preprocessing didn't change much, return original (let model translate)
+    if result == text_lower and len(result.split()) == len(original_text.split()):
+        return original_text
+
+    return result
@@ -0,0 +1,31 @@
+"""
+Shared setup for the backend tests: the backend modules are imported from backend/
+
+Usage (from backend/):
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from conversation_store import open_store, STORE_KINDS  # noqa: E402
+
+
+def store_in(directory, kind):
+    return open_store(kind, os.path.join(directory, "conversations"), os.path.join(directory, "conversations.db"))
+
+
+@pytest.fixture(params=STORE_KINDS)
+def store(request, tmp_path):
+    """Each test using it runs once per backend"""
+    return store_in(str(tmp_path), request.param)
+
+
+@pytest.fixture
+def stores(tmp_path):
+    """Both backends side by side, for parity checks"""
+    return {kind: store_in(str(tmp_path), kind) for kind in STORE_KINDS}
@@ -0,0 +1,27 @@
+"""Conversation builders shared by the store, cache and endpoint tests"""
+from datetime import datetime, timedelta
+
+START = datetime(2024, 1, 1)
+
+
+def ts(seconds):
+    """ISO timestamp `seconds` after START"""
+    return (START + timedelta(seconds=seconds)).isoformat()
+
+
+def fill(store, user_id, conversation_id, count, start=0):
+    """Create a conversation with count alternating User/Assistant messages, one second apart"""
+    store.create_conversation(user_id, conversation_id, ts(start))
+    for i in range(count):
+        store.append_message(user_id, conversation_id, "User" if i % 2 == 0 else "Assistant",
+                             f"message {start + i}", ts(start + i + 1))
+
+
+def walk_messages(store, conversation_id, limit, user_id="u"):
+    """Every message page from the newest back, as lists of texts"""
+    pages, before = [], None
+    while True:
+        page, before = store.message_page(user_id, conversation_id, limit, before)
+        pages.append([m["text"] for m in page])
+        if before is None:
+            return pages
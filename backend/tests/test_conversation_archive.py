@@ -0,0 +1,77 @@
+"""
+Archive tier: archive → restore round trip on both stores, retention on restore,
+compaction of idle conversations and tolerance of a truncated archive file
+"""
+from datetime import datetime
+
+import pytest
+
+from conversation_archive import ConversationArchive, compact
+from conversation_store import MAX_STORED_MESSAGES
+from helpers import ts, fill
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return ConversationArchive(str(tmp_path / "archive"))
+
+
+def test_archive_restore_round_trip(store, archive):
+    fill(store, "u", "c", 6)
+    fill(store, "u", "other", 2, start=100)
+    before = store.messages("u", "c")
+
+    assert store.archive_conversation("u", "c", archive)
+    assert not store.archive_conversation("u", "c", archive)  # Already archived
+    info = store.conversation_info("u", "c")
+    assert info["archived"] and info["message_count"] == 6
+    assert store.messages("u", "c") == []
+    assert archive.get("u", "c")["messages"] == before
+    assert store.messages("u", "other")  # Other conversations stay hot
+
+    store.append_message("u", "c", "User", "while archived", ts(300))
+    assert store.restore_conversation("u", "c", archive)
+    assert not store.restore_conversation("u", "c", archive)  # Not archived any more
+    assert store.messages("u", "c") == before + [{"role": "User", "text": "while archived", "timestamp": ts(300)}]
+    assert not store.conversation_info("u", "c")["archived"]
+    assert archive.get("u", "c") is None
+
+
+def test_restore_keeps_newest_messages(store, archive):
+    fill(store, "u", "c", MAX_STORED_MESSAGES)
+    assert store.archive_conversation("u", "c", archive)
+    for i in range(5):
+        store.append_message("u", "c", "User", f"late {i}", ts(500 + i))
+    assert store.restore_conversation("u", "c", archive)
+    messages = store.messages("u", "c")
+    assert len(messages) == MAX_STORED_MESSAGES
+    assert messages[0]["text"] == "message 5"
+    assert messages[-1]["text"] == "late 4"
+
+
+def test_compact_archives_only_idle_conversations(store, archive):
+    fill(store, "u", "idle", 4)  # Timestamps in 2024
+    store.create_conversation("u", "recent", datetime.now().isoformat())
+    store.append_message("u", "recent", "User", "hello", datetime.now().isoformat())
+
+    report = compact(store, archive, max_idle_days=30)
+    assert report["conversations_archived"] == 1
+    assert report["users_compacted"] == 1
+    assert store.conversation_info("u", "idle")["archived"]
+    assert not store.conversation_info("u", "recent")["archived"]
+    assert compact(store, archive, max_idle_days=30)["conversations_archived"] == 0
+
+
+def test_truncated_archive_keeps_complete_records(store, archive):
+    fill(store, "u", "a", 2)
+    fill(store, "u", "b", 2, start=100)
+    assert store.archive_conversation("u", "a", archive)
+    assert store.archive_conversation("u", "b", archive)
+    path = archive.user_file("u")
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:-10])  # Crash in the middle of the second append
+    assert archive.get("u", "a")["messages"] == [{"role": "User", "text": "message 0", "timestamp": ts(1)},
+                                                 {"role": "Assistant", "text": "message 1", "timestamp": ts(2)}]
+    assert archive.get("u", "b") is None
@@ -0,0 +1,93 @@
+"""
+CachedConversationStore: reads served from memory, queued writes reach the
+backing store in order on flush
+"""
+import threading
+
+import pytest
+
+from conversation_store import CachedConversationStore, MAX_STORED_MESSAGES
+from helpers import ts, fill, walk_messages
+
+
+@pytest.fixture
+def cached(store):
+    # The writer only runs on an explicit flush()/close() in these tests
+    cache = CachedConversationStore(store, flush_interval=3600, max_pending=10 ** 6)
+    yield cache
+    cache.close()
+
+
+def test_writes_are_queued_until_flush(cached, store):
+    fill(cached, "u", "c", 4)
+    assert [m["text"] for m in cached.messages("u", "c")] == [f"message {i}" for i in range(4)]
+    assert store.messages("u", "c") == []
+    assert cached.stats()["pending_ops"] == 5
+
+    cached.flush()
+    assert cached.stats()["pending_ops"] == 0
+    assert store.messages("u", "c") == cached.messages("u", "c")
+    assert store.list_conversations("u") == cached.list_conversations("u")
+
+
+def test_reads_existing_conversations_from_backing_store(cached, store):
+    fill(store, "u", "c", 3)
+    cached.append_message("u", "c", "User", "after restart", ts(100))
+    assert [m["text"] for m in cached.messages("u", "c")] == ["message 0", "message 1", "message 2", "after restart"]
+    assert cached.stats()["misses"] == 1
+    cached.flush()
+    assert store.messages("u", "c") == cached.messages("u", "c")
+
+
+def test_retention_and_pages_match_backing_store(cached, store):
+    fill(cached, "u", "c", MAX_STORED_MESSAGES + 5)
+    cached.flush()
+    assert store.messages("u", "c") == cached.messages("u", "c")
+    assert len(cached.messages("u", "c")) == MAX_STORED_MESSAGES
+    assert walk_messages(cached, "c", 20) == walk_messages(store, "c", 20)
+
+
+def test_concurrent_appends_flush_in_order(cached, store):
+    threads, per_thread = 4, 10
+    barrier = threading.Barrier(threads)
+
+    def worker(n):
+        barrier.wait()
+        for i in range(per_thread):
+            cached.append_message("u", "c", "User", f"{n}:{i}")
+            if i % 3 == 0:
+                cached.flush()  # Flushes race with the appends
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    cached.flush()
+
+    texts = [m["text"] for m in cached.messages("u", "c")]
+    assert texts == [m["text"] for m in store.messages("u", "c")]
+    assert len(texts) == threads * per_thread
+    for n in range(threads):
+        assert [t for t in texts if t.startswith(f"{n}:")] == [f"{n}:{i}" for i in range(per_thread)]
+    assert store.conversation_info("u", "c")["message_count"] == threads * per_thread
+
+
+def test_failed_flush_is_retried_in_order(cached, store, monkeypatch):
+    fill(cached, "u", "c", 2)
+    write_batch = store.write_batch
+    calls = []
+
+    def fail_once(user_id, ops):
+        calls.append(len(ops))
+        if len(calls) == 1:
+            raise OSError("disk full")
+        write_batch(user_id, ops)
+
+    monkeypatch.setattr(store, "write_batch", fail_once)
+    cached.flush()
+    assert cached.stats()["flush_errors"] == 1
+    cached.append_message("u", "c", "User", "after the failure", ts(10))
+    cached.flush()
+    assert calls == [3, 4]
+    assert [m["text"] for m in store.messages("u", "c")] == ["message 0", "message 1", "after the failure"]
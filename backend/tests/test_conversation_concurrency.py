@@ -0,0 +1,77 @@
+"""
+Concurrent writers lose nothing, JSON files are replaced atomically and an
+unreadable JSON file is moved aside instead of being overwritten
+"""
+import glob
+import json
+import os
+import threading
+
+from conversation_store import JsonConversationStore, atomic_write_json
+from helpers import ts
+
+THREADS = 8
+PER_THREAD = 5
+
+
+def append_concurrently(store, user_id, conversation_id):
+    barrier = threading.Barrier(THREADS)
+
+    def worker(n):
+        barrier.wait()
+        for i in range(PER_THREAD):
+            store.append_message(user_id, conversation_id, "User", f"t{n} message {i}", ts(n * PER_THREAD + i + 1))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_appends_lose_nothing(store):
+    store.create_conversation("u", "c", ts(0))
+    append_concurrently(store, "u", "c")
+    texts = [m["text"] for m in store.messages("u", "c")]
+    assert sorted(texts) == sorted(f"t{n} message {i}" for n in range(THREADS) for i in range(PER_THREAD))
+    # Each thread's own messages stay in the order it wrote them
+    for n in range(THREADS):
+        mine = [text for text in texts if text.startswith(f"t{n} ")]
+        assert mine == [f"t{n} message {i}" for i in range(PER_THREAD)]
+
+
+def test_concurrent_new_conversations_for_one_user(store):
+    def worker(n):
+        store.create_conversation("u", f"c{n}", ts(n))
+        store.append_message("u", f"c{n}", "User", f"first in c{n}", ts(n + 1))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(c["conversation_id"] for c in store.list_conversations("u")) == sorted(f"c{n}" for n in range(THREADS))
+
+
+def test_atomic_write_leaves_no_temp_files(tmp_path):
+    path = str(tmp_path / "user.json")
+    atomic_write_json(path, {"a": 1})
+    atomic_write_json(path, {"a": 2})
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == {"a": 2}
+    assert os.listdir(tmp_path) == ["user.json"]
+
+
+def test_unreadable_file_is_moved_aside(tmp_path):
+    store = JsonConversationStore(str(tmp_path / "conversations"))
+    with open(store.user_file("u"), "w", encoding="utf-8") as f:
+        f.write('{"conversations": {"c": ')  # Truncated by a crash mid-write
+    assert store.load_user("u")["conversations"] == {}
+    assert not os.path.exists(store.user_file("u"))
+    (corrupt_path,) = glob.glob(store.user_file("u") + ".corrupt-*")
+    with open(corrupt_path, encoding="utf-8") as f:
+        assert f.read() == '{"conversations": {"c": '
+    # The next write starts a fresh file and leaves the old contents alone
+    store.create_conversation("u", "c", ts(0))
+    assert [c["conversation_id"] for c in store.list_conversations("u")] == ["c"]
+    assert os.path.exists(corrupt_path)
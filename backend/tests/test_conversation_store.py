@@ -0,0 +1,137 @@
+"""
+JSON and SQLite conversation stores: same results for the same writes
+(appends, titles, retention, message pages) and the JSON → SQLite migration
+"""
+import pytest
+
+from conversation_store import (MAX_STORED_MESSAGES, DEFAULT_TITLE, JsonConversationStore, SqliteConversationStore,
+                                migrate_json_to_sqlite)
+from helpers import ts, fill, walk_messages
+
+
+def test_append_parity(stores):
+    for store in stores.values():
+        fill(store, "u", "c1", 5)
+        fill(store, "u", "c2", 3, start=100)
+        store.append_message("u", "c1", "User", "back to the first one", ts(200))
+    json_store, sqlite_store = stores["json"], stores["sqlite"]
+    assert json_store.list_conversations("u") == sqlite_store.list_conversations("u")
+    for conversation_id in ("c1", "c2", None):
+        assert json_store.messages("u", conversation_id) == sqlite_store.messages("u", conversation_id)
+    assert json_store.get_conversation("u", "c1") == sqlite_store.get_conversation("u", "c1")
+
+
+def test_list_most_recent_first(store):
+    fill(store, "u", "old", 2)
+    fill(store, "u", "new", 2, start=100)
+    conversations = store.list_conversations("u")
+    assert [c["conversation_id"] for c in conversations] == ["new", "old"]
+    assert conversations[0]["title"] == "message 100"
+    assert conversations[0]["message_count"] == 2
+    assert store.messages("u")[-1]["text"] == "message 101"  # Latest conversation by default
+
+
+def test_title_from_first_user_message(store):
+    store.create_conversation("u", "c", ts(0))
+    assert store.conversation_info("u", "c")["title"] == DEFAULT_TITLE
+    store.append_message("u", "c", "Assistant", "Hello!", ts(1))
+    store.append_message("u", "c", "User", "Why are my cramps so bad?", ts(2))
+    store.append_message("u", "c", "User", "Second question", ts(3))
+    assert store.conversation_info("u", "c")["title"] == "Why are my cramps so bad?"
+
+
+def test_retention_keeps_newest_messages(stores):
+    total = MAX_STORED_MESSAGES + 15
+    for store in stores.values():
+        fill(store, "u", "c", total)
+        messages = store.messages("u", "c")
+        assert len(messages) == MAX_STORED_MESSAGES
+        assert messages[0]["text"] == f"message {total - MAX_STORED_MESSAGES}"
+        assert messages[-1]["text"] == f"message {total - 1}"
+        assert store.conversation_info("u", "c")["message_count"] == MAX_STORED_MESSAGES
+    assert stores["json"].messages("u", "c") == stores["sqlite"].messages("u", "c")
+
+
+def walk_conversations(store, limit, user_id="u"):
+    """Every conversation page in list order, as lists of ids"""
+    pages, cursor = [], None
+    while True:
+        page, cursor = store.conversation_page(user_id, limit, cursor)
+        pages.append([c["conversation_id"] for c in page])
+        if cursor is None:
+            return pages
+
+
+def test_conversation_pages_parity(stores):
+    for store in stores.values():
+        for n in range(7):
+            fill(store, "u", f"c{n}", 1, start=n * 10)
+    pages = {kind: walk_conversations(store, 3) for kind, store in stores.items()}
+    assert pages["json"] == pages["sqlite"]
+    assert pages["json"] == [["c6", "c5", "c4"], ["c3", "c2", "c1"], ["c0"]]
+
+
+def test_conversation_pages_with_equal_update_times(store):
+    for n in range(5):
+        store.create_conversation("u", f"c{n}", ts(0))
+    # Ties on updated_at are broken by id, so no conversation is skipped or repeated
+    assert walk_conversations(store, 2) == [["c4", "c3"], ["c2", "c1"], ["c0"]]
+
+
+def test_conversation_info(store):
+    assert store.conversation_info("u") is None
+    fill(store, "u", "old", 2)
+    fill(store, "u", "new", 3, start=100)
+    assert store.conversation_info("u")["conversation_id"] == "new"
+    assert store.conversation_info("u", "old")["message_count"] == 2
+    assert store.conversation_info("u", "missing") is None
+
+
+def test_message_pages_parity(stores):
+    for store in stores.values():
+        fill(store, "u", "c", 23)
+    pages = {kind: walk_messages(store, "c", 10) for kind, store in stores.items()}
+    assert pages["json"] == pages["sqlite"]
+    # Newest page first, each page oldest first; together they are the whole stored tail
+    assert [len(page) for page in pages["json"]] == [10, 10, 3]
+    assert [text for page in reversed(pages["json"]) for text in page] == [f"message {i}" for i in range(23)]
+
+
+def test_message_pages_with_equal_timestamps(store):
+    store.create_conversation("u", "c", ts(0))
+    for i in range(12):
+        # Three messages per timestamp, so page boundaries fall inside a run of equal timestamps
+        store.append_message("u", "c", "User", f"message {i}", ts(1 + i // 3))
+    pages = walk_messages(store, "c", 5)
+    assert [text for page in reversed(pages) for text in page] == [f"message {i}" for i in range(12)]
+
+
+def test_imported_messages_without_timestamps_page_fully(tmp_path):
+    """import_user gives every message without a timestamp the conversation's created_at"""
+    store = SqliteConversationStore(str(tmp_path / "conversations.db"))
+    store.import_user("u", {"conversations": {"c": {
+        "title": "Imported", "created_at": ts(0), "updated_at": ts(0),
+        "messages": [{"role": "User", "text": f"message {i}"} for i in range(7)],
+    }}})
+    pages = walk_messages(store, "c", 3)
+    assert [text for page in reversed(pages) for text in page] == [f"message {i}" for i in range(7)]
+
+
+def test_invalid_message_cursor(store):
+    fill(store, "u", "c", 3)
+    with pytest.raises(ValueError):
+        store.message_page("u", "c", 2, "not a cursor")
+
+
+def test_migrate_json_to_sqlite(tmp_path):
+    source = JsonConversationStore(str(tmp_path / "conversations"))
+    fill(source, "a", "c1", 4)
+    fill(source, "a", "c2", 2, start=100)
+    fill(source, "b", "c1", 3)
+    target = SqliteConversationStore(str(tmp_path / "conversations.db"))
+    assert migrate_json_to_sqlite(source.directory, target) == (2, 3)
+    for user_id in ("a", "b"):
+        assert target.list_conversations(user_id) == source.list_conversations(user_id)
+        for conversation in source.list_conversations(user_id):
+            conversation_id = conversation["conversation_id"]
+            assert target.messages(user_id, conversation_id) == source.messages(user_id, conversation_id)
@@ -0,0 +1,82 @@
+"""
+DomainGate with a keyword encoder: only clearly off-domain query vectors are
+gated, centroids are cached per prototypes + encoder, and counters add up
+"""
+import json
+
+import numpy as np
+import pytest
+
+from domain_gate import DomainGate, PROTOTYPES_PATH
+
+AXES = ["period", "cramp", "football", "car"]
+
+
+class KeywordEncoder:
+    """One dimension per keyword in AXES; counts its calls"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, texts):
+        self.calls += 1
+        return np.array([vector(text) for text in texts], dtype=np.float32)
+
+
+def vector(text):
+    return [float(axis in text.lower()) + 0.01 for axis in AXES]
+
+
+@pytest.fixture
+def prototypes(tmp_path):
+    path = tmp_path / "domain_prototypes.json"
+    path.write_text(json.dumps({
+        "in_domain": {"periods": ["my period is late", "period blood"], "cramps": ["bad cramp", "cramp relief"]},
+        "off_domain": {"sports": ["football scores", "football match"], "cars": ["fix my car"]},
+    }))
+    return str(path)
+
+
+def test_only_clearly_off_domain_queries_are_gated(prototypes):
+    gate = DomainGate.build(KeywordEncoder(), prototypes)
+    verdict = gate.check(vector("who won the football"))
+    assert verdict.off_domain and verdict.topic == "sports"
+    assert verdict.off_domain_score > verdict.in_domain_score
+    assert not gate.check(vector("period pain")).off_domain
+    # Close to both sides: not gated
+    assert not gate.check(vector("period cramps during football")).off_domain
+    # A high in-domain similarity blocks the gate even with a large margin
+    strict = DomainGate(gate.in_names, gate.in_centroids, gate.off_names, gate.off_centroids, max_in_domain=0.0)
+    assert not strict.check(vector("football")).off_domain
+
+
+def test_centroids_are_cached_per_prototypes_and_encoder(prototypes, tmp_path):
+    cache = str(tmp_path / "gate.npz")
+    encoder = KeywordEncoder()
+    first = DomainGate.build(encoder, prototypes, cache_path=cache, encoder_id="keywords")
+    second = DomainGate.build(encoder, prototypes, cache_path=cache, encoder_id="keywords")
+    assert encoder.calls == 2  # In-domain and off-domain topics, once
+    assert second.in_names == first.in_names and second.off_names == first.off_names
+    np.testing.assert_allclose(second.in_centroids, first.in_centroids)
+    DomainGate.build(encoder, prototypes, cache_path=cache, encoder_id="another encoder")
+    assert encoder.calls == 4
+
+
+def test_stats(prototypes):
+    gate = DomainGate.build(KeywordEncoder(), prototypes)
+    gate.check(vector("football"))
+    gate.check(vector("period"))
+    assert gate.stats()["avg_generation_seconds"] is None
+    gate.observe_generation(2.0)
+    gate.observe_generation(4.0)
+    stats = gate.stats()
+    assert (stats["checked"], stats["gated"], stats["gated_fraction"]) == (2, 1, 0.5)
+    assert stats["avg_generation_seconds"] == 3.0
+    assert stats["generation_seconds_avoided"] == 3.0
+
+
+def test_shipped_prototypes_have_both_sides():
+    with open(PROTOTYPES_PATH, encoding="utf-8") as f:
+        prototypes = json.load(f)
+    assert prototypes["in_domain"] and prototypes["off_domain"]
+    assert all(prototypes["in_domain"].values()) and all(prototypes["off_domain"].values())
@@ -0,0 +1,129 @@
+"""
+GET /chat/history: cursor pages, ?since= deltas, the full-history fallback and
+304 revalidation
+app.py is imported with stub models (STUB_MODELS=1) from a temporary working
+directory holding a small fixture corpus, so no model weights or real data are needed.
+"""
+import csv
+
+import pytest
+
+from conversation_store import MAX_STORED_MESSAGES
+from helpers import ts, fill
+
+CORPUS = [
+    ("What is menstruation?",
+     "Menstruation is the monthly shedding of the lining of the uterus. It usually lasts three to seven days."),
+    ("How do I ease cramps?",
+     "A hot water bottle on your lower belly can ease cramps. Gentle exercise and rest also help."),
+    ("How often should I change a pad?",
+     "Change your pad every four to six hours, or sooner if it feels full."),
+    ("Is it normal to have an irregular cycle?",
+     "Cycles are often irregular in the first years after your first period. Talk to a nurse if it worries you."),
+]
+
+
+@pytest.fixture(scope="module")
+def app_module(tmp_path_factory):
+    pytest.importorskip("faiss")
+    directory = tmp_path_factory.mktemp("app")
+    with open(directory / "menstrual_data.csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["question", "answer"])
+        writer.writerows(CORPUS)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("STUB_MODELS", "1")
+        patch.setenv("CONVERSATIONS_DIR", str(directory / "conversations"))
+        patch.setenv("CONVERSATION_ARCHIVE_DIR", str(directory / "archive"))
+        for name in ("CONVERSATION_STORE", "CONVERSATION_CACHE", "DOMAIN_GATE", "EMBEDDING_MODE"):
+            patch.delenv(name, raising=False)
+        patch.chdir(directory)  # build_engine reads the corpus from the working directory
+        import app
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def history(client, user_id, conversation_id, **params):
+    response = client.get("/chat/history", query_string={"user_id": user_id, "conversation_id": conversation_id,
+                                                          **params})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def texts(body):
+    return [m["text"] for m in body["messages"]]
+
+
+def test_history_pages(app_module, client):
+    fill(app_module.conversation_store, "pages", "c", 7)
+    first = history(client, "pages", "c", limit=3)
+    assert texts(first) == ["message 4", "message 5", "message 6"]
+    second = history(client, "pages", "c", limit=3, before=first["next_cursor"])
+    assert texts(second) == ["message 1", "message 2", "message 3"]
+    last = history(client, "pages", "c", limit=3, before=second["next_cursor"])
+    assert texts(last) == ["message 0"]
+    assert last["next_cursor"] is None
+
+
+def test_since_returns_only_newer_messages(app_module, client):
+    fill(app_module.conversation_store, "delta", "c", 6)
+    body = history(client, "delta", "c", since=ts(3))
+    assert body["delta"] is True
+    assert texts(body) == ["message 3", "message 4", "message 5"]
+    assert history(client, "delta", "c", since=ts(6))["messages"] == []
+
+
+def test_since_before_a_short_conversation_is_a_delta(app_module, client):
+    fill(app_module.conversation_store, "short", "c", 4, start=10)
+    body = history(client, "short", "c", since=ts(0))
+    assert body["delta"] is True
+    assert len(body["messages"]) == 4
+
+
+def test_since_older_than_stored_tail_falls_back_to_full_history(app_module, client):
+    total = MAX_STORED_MESSAGES + 10
+    fill(app_module.conversation_store, "trimmed", "c", total)
+    # Messages up to ts(10) were dropped by retention: the client must replace its copy
+    body = history(client, "trimmed", "c", since=ts(2))
+    assert body["delta"] is False
+    assert texts(body) == [f"message {i}" for i in range(total - MAX_STORED_MESSAGES, total)]
+    # Since the oldest stored message: nothing is missing, so a delta again
+    body = history(client, "trimmed", "c", since=ts(total - MAX_STORED_MESSAGES + 1))
+    assert body["delta"] is True
+    assert len(body["messages"]) == MAX_STORED_MESSAGES - 1
+
+
+def test_unchanged_history_is_not_modified(app_module, client):
+    store = app_module.conversation_store
+    fill(store, "etag", "c", 2)
+    query = {"user_id": "etag", "conversation_id": "c"}
+    first = client.get("/chat/history", query_string=query)
+    etag = first.headers["ETag"]
+
+    again = client.get("/chat/history", query_string=query, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.data == b""
+    assert again.headers["ETag"] == etag
+
+    # A delta request is a different representation
+    delta = client.get("/chat/history", query_string={**query, "since": ts(1)}, headers={"If-None-Match": etag})
+    assert delta.status_code == 200
+
+    store.append_message("etag", "c", "User", "new message", ts(100))
+    changed = client.get("/chat/history", query_string=query, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert texts(changed.get_json())[-1] == "new message"
+
+
+def test_chat_reply_is_added_to_history(app_module, client):
+    response = client.post("/chat", json={"message": "How do I ease cramps?", "user_id": "chat",
+                                          "conversation_id": "c"})
+    assert response.status_code == 200
+    reply = response.get_json()["response"]
+    assert reply
+    assert texts(history(client, "chat", "c")) == ["How do I ease cramps?", reply]
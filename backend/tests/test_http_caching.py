@@ -0,0 +1,56 @@
+"""
+ETags, If-None-Match and response compression for the history endpoints
+"""
+import gzip
+
+from flask import Flask, jsonify
+
+from http_caching import make_etag, is_not_modified, not_modified_response, finalize_response, COMPRESS_MIN_BYTES
+
+app = Flask(__name__)
+
+
+def finalized(payload, headers=None, etag=None):
+    with app.test_request_context(headers=headers or {}) as context:
+        return finalize_response(jsonify(payload), context.request, etag)
+
+
+def test_etag_depends_on_every_part():
+    ts = "2024-01-01T00:00:00"
+    assert make_etag("history", "u", ("c", ts, 3)) == make_etag("history", "u", ("c", ts, 3))
+    assert make_etag("history", "u", ("c", ts, 3)) != make_etag("history", "u", ("c", ts, 4))
+    assert make_etag("history", "u", None, "10") != make_etag("history", "u", None, None)
+
+
+def test_if_none_match():
+    etag = make_etag("x")
+    for header in (f'"{etag}"', f'W/"{etag}"', f'"other", "{etag}"'):
+        with app.test_request_context(headers={"If-None-Match": header}) as context:
+            assert is_not_modified(context.request, etag)
+    with app.test_request_context(headers={"If-None-Match": '"other"'}) as context:
+        assert not is_not_modified(context.request, etag)
+    with app.test_request_context() as context:
+        assert not is_not_modified(context.request, etag)
+
+
+def test_not_modified_response():
+    response = not_modified_response("abc")
+    assert response.status_code == 304
+    assert response.get_etag() == ("abc", False)
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+
+def test_small_bodies_are_not_compressed():
+    response = finalized({"messages": []}, {"Accept-Encoding": "gzip"}, etag="abc")
+    assert "Content-Encoding" not in response.headers
+    assert response.get_etag() == ("abc", False)
+    assert "Accept-Encoding" in response.vary
+
+
+def test_large_bodies_are_compressed_when_accepted():
+    payload = {"messages": [{"text": f"message {i}"} for i in range(COMPRESS_MIN_BYTES // 10)]}
+    plain = finalized(payload)
+    assert "Content-Encoding" not in plain.headers
+    compressed = finalized(payload, {"Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(compressed.get_data()) == plain.get_data()
@@ -0,0 +1,95 @@
+"""
+Character n-gram language identifier: the vectorized hashing matches a plain
+per-n-gram loop, and a model trained on a few sentences per language tells
+English from Swahili, also after a save/load round trip
+"""
+import numpy as np
+
+from language_id import LanguageIdentifier, ngram_buckets, normalize, NGRAM_ORDERS, HASH_BITS
+from rag_engine import RagEngine, LANGUAGE_ID_MIN_CONFIDENCE
+
+MASK = (1 << 64) - 1
+
+ENGLISH = [
+    "How can I ease period pain at home?",
+    "My period is late this month, is that normal?",
+    "What should I do when cramps are very strong?",
+    "How often should I change my pad during the day?",
+    "Is it safe to exercise during my period?",
+]
+SWAHILI = [
+    "Ninawezaje kupunguza maumivu ya hedhi nyumbani?",
+    "Hedhi yangu imechelewa mwezi huu, je ni kawaida?",
+    "Nifanye nini maumivu ya tumbo yakiwa makali sana?",
+    "Ni mara ngapi ninapaswa kubadilisha pedi kwa siku?",
+    "Je ni salama kufanya mazoezi wakati wa hedhi?",
+]
+
+
+def reference_buckets(text, orders=NGRAM_ORDERS, hash_bits=HASH_BITS):
+    """The same hash computed one n-gram at a time"""
+    padded = normalize(text)
+    if len(padded) <= 2:
+        return []
+    buckets = []
+    for n in orders:
+        for i in range(len(padded) - n + 1):
+            h = 0
+            for ch in padded[i:i + n]:
+                h = (h * 1099511628211 + ord(ch)) & MASK
+            buckets.append((((h + n) & MASK) * 0x9E3779B97F4A7C15 & MASK) >> (64 - hash_bits))
+    return buckets
+
+
+def test_normalize():
+    assert normalize("Hello, WORLD 42!") == " hello world "
+    assert normalize("...") == "  "
+
+
+def test_buckets_match_reference():
+    for text in ["a", "Hi", "Maumivu ya hedhi", "Naweza kupata msaada? Ndiyo!", "ñandú café", "", "123"]:
+        assert ngram_buckets(text).tolist() == reference_buckets(text)
+
+
+def test_bucket_range():
+    buckets = ngram_buckets(" ".join(ENGLISH + SWAHILI), hash_bits=10)
+    assert buckets.min() >= 0 and buckets.max() < 1 << 10
+
+
+def test_classifies_held_out_sentences():
+    model = LanguageIdentifier.train({"en": ENGLISH, "sw": SWAHILI}, hash_bits=12)
+    assert model.labels == ["en", "sw"]
+    label, confidence = model.classify("Why are my cramps so painful?")
+    assert label == "en" and 0.5 < confidence <= 1.0
+    assert model.classify("Kwa nini maumivu yangu ni makali?")[0] == "sw"
+
+
+def test_text_without_letters_gets_default_label():
+    model = LanguageIdentifier.train({"en": ENGLISH, "sw": SWAHILI}, hash_bits=12)
+    assert model.classify("?!") == ("en", 0.0)
+
+
+def test_save_load_round_trip(tmp_path):
+    model = LanguageIdentifier.train({"en": ENGLISH, "sw": SWAHILI}, hash_bits=12)
+    path = str(tmp_path / "language_id_model.npz")
+    model.save(path)
+    loaded = LanguageIdentifier.load(path)
+    assert loaded.labels == model.labels
+    assert loaded.orders == model.orders and loaded.hash_bits == 12
+    np.testing.assert_array_equal(loaded.log_probs, model.log_probs)
+    for text in ENGLISH + SWAHILI:
+        assert loaded.classify(text) == model.classify(text)
+
+
+def test_engine_uses_identifier_above_confidence_threshold():
+    class FixedIdentifier:
+        def __init__(self, confidence):
+            self.confidence = confidence
+
+        def classify(self, text):
+            return "sw", self.confidence
+
+    engine = RagEngine(None, None, None, None, None, language_identifier=FixedIdentifier(LANGUAGE_ID_MIN_CONFIDENCE))
+    assert engine.detect_language("sawa") == "sw"
+    engine.language_identifier = FixedIdentifier(LANGUAGE_ID_MIN_CONFIDENCE - 0.01)
+    assert engine.detect_language("ok") == "en"  # Too ambiguous: English, like langdetect failures
@@ -0,0 +1,66 @@
+"""
+MessageRouter: emotions match the keyword scans of the original app.py, intents
+match its greeting / off-topic / about-bot checks except where whole-token
+matching fixes a false hit
+"""
+import pytest
+
+from message_router import MessageRouter
+
+router = MessageRouter()
+
+# (message, intent and emotion from the original chat() checks and detect_emotion)
+BASELINE_CASES = [
+    ("Hi", "greeting", "neutral"),
+    ("hello there!", "greeting", "neutral"),
+    ("Habari yako", "greeting", "neutral"),
+    ("Mambo vipi", "greeting", "neutral"),
+    ("Good morning, I have cramps", "greeting", "pain"),
+    ("Hi, who are you", "greeting", "neutral"),
+    ("What is the weather like?", "off_topic", "neutral"),
+    ("Do you like football", "off_topic", "neutral"),
+    ("I love music and my period hurts", "off_topic", "pain"),
+    ("Who are you?", "about_bot", "neutral"),
+    ("What does Eunoia mean?", "about_bot", "neutral"),
+    ("wewe ni nani", "about_bot", "neutral"),
+    ("Why is my period late?", "medical", "neutral"),
+    ("Nina maumivu ya tumbo", "medical", "pain"),
+    ("I'm so worried and crying", "medical", "anxious"),
+    ("Nimehuzunika, nina huzuni", "medical", "sad"),
+    ("My cramping is severely painful", "medical", "pain"),
+    ("", "medical", "neutral"),
+]
+
+
+@pytest.mark.parametrize("message, intent, emotion", BASELINE_CASES)
+def test_route_matches_original(message, intent, emotion):
+    assert router.route(message) == (intent, emotion)
+
+
+@pytest.mark.parametrize("message", [
+    "How do I take care of myself?",  # "car" in "care"
+    "his period is late",  # "hi" at the start of "his"
+    "I'm scared my cycle is irregular",  # "car" in "scared"
+])
+def test_intent_phrases_match_whole_tokens(message):
+    # The original substring checks short-circuited these as greetings or off-topic
+    assert router.route(message).intent == "medical"
+
+
+def test_short_circuit_intents():
+    assert router.route("hey").short_circuit
+    assert not router.route("Why do I get cramps?").short_circuit
+
+
+def test_overlapping_emotion_keywords():
+    # "ogopa" (anxious) overlaps "pain" in "ogopain": the higher priority emotion still wins
+    assert router.emotion("naogopaing") == "pain"
+    assert router.emotion("naogopa") == "anxious"
+
+
+def test_emotion_priority_follows_lexicon_order():
+    custom = MessageRouter(emotions={"sad": ["sad"], "pain": ["pain", "sadly painful"]})
+    assert custom.emotion("painful") == "pain"
+    # "sadly painful" starts with "sad", which ranks first, so the scan still reports sad
+    assert custom.emotion("sadly painful") == "sad"
+    assert MessageRouter(emotions={}).emotion("pain") == "neutral"
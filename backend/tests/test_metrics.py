@@ -0,0 +1,84 @@
+"""
+Metrics: counters, histograms and scrape-time callbacks render valid
+Prometheus text; stage() and @timed record into STAGE_SECONDS
+"""
+import threading
+
+import pytest
+
+from metrics import (Counter, Histogram, CallbackGauge, CallbackCounter, STAGE_SECONDS, stage, timed, record_stage,
+                     render)
+
+
+def test_counter():
+    counter = Counter("test_requests_total", "Requests", ["outcome"])
+    counter.inc("ok")
+    counter.inc("ok", amount=2)
+    counter.inc('say "hi"\n')
+    assert counter.value("ok") == 3
+    assert counter.value("missing") == 0
+    assert counter.samples() == ['test_requests_total{outcome="ok"} 3',
+                                 'test_requests_total{outcome="say \\"hi\\"\\n"} 1']
+    text = render()
+    assert "# HELP test_requests_total Requests\n# TYPE test_requests_total counter\n" in text
+
+
+def test_counter_is_thread_safe():
+    counter = Counter("test_threads_total", "Increments from threads")
+
+    def worker():
+        for _ in range(1000):
+            counter.inc()
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.value() == 8000
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_latency_seconds", "Latency", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, "gen")
+    assert histogram.snapshot("gen") == (4, pytest.approx(3.65))
+    assert histogram.snapshot("other") == (0, 0.0)
+    assert histogram.samples() == [
+        'test_latency_seconds_bucket{stage="gen",le="0.1"} 2',
+        'test_latency_seconds_bucket{stage="gen",le="1.0"} 3',
+        'test_latency_seconds_bucket{stage="gen",le="+Inf"} 4',
+        'test_latency_seconds_sum{stage="gen"} 3.65',
+        'test_latency_seconds_count{stage="gen"} 4',
+    ]
+
+
+def test_callback_metrics_are_read_at_scrape_time():
+    sizes = {"users": 1}
+    gauge = CallbackGauge("test_cache_size", "Cache size", lambda: sizes["users"])
+    hits = CallbackCounter("test_cache_hits_total", "Cache hits", lambda: {("hot",): 5, ("cold",): None}, ["tier"])
+    CallbackGauge("test_broken", "Raises", lambda: 1 / 0)
+    sizes["users"] = 7
+    assert gauge.samples() == ["test_cache_size 7.0"]
+    assert hits.samples() == ['test_cache_hits_total{tier="hot"} 5.0']
+    text = render()
+    assert "# TYPE test_cache_size gauge\ntest_cache_size 7.0\n" in text
+    assert "# TYPE test_cache_hits_total counter\n" in text
+    assert "test_broken" not in text  # A failing callback is skipped, not a broken scrape
+
+
+def test_stage_timing():
+    before = STAGE_SECONDS.snapshot("test_stage")[0]
+    with stage("test_stage"):
+        pass
+
+    @timed("test_stage")
+    def work(x):
+        return x * 2
+
+    assert work(21) == 42
+    with pytest.raises(ZeroDivisionError):
+        with stage("test_stage"):
+            1 / 0
+    assert record_stage("test_stage", 0.0) > 0
+    assert STAGE_SECONDS.snapshot("test_stage")[0] == before + 4
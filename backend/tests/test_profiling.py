@@ -0,0 +1,103 @@
+"""
+Live profiler: armed for N requests it profiles exactly those (whole request
+or one stage), skips a request that would overlap a running cProfile session,
+and collects collapsed stacks in sampler mode
+"""
+import marshal
+import threading
+import time
+
+import pytest
+
+import profiling
+from profiling import LiveProfiler
+
+
+def busy_work(seconds=0.0):
+    end = time.perf_counter() + seconds
+    total = sum(range(1000))
+    while time.perf_counter() < end:
+        total += 1
+    return total
+
+
+def other_work():
+    return sum(range(1000))
+
+
+def profiled_function_names(profiler):
+    return {function for (_, _, function) in marshal.loads(profiler.pstats_bytes())}
+
+
+@pytest.fixture
+def profiler():
+    profiler = LiveProfiler()
+    yield profiler
+    profiler.disarm()
+
+
+def test_disarmed_profiler_selects_nothing(profiler):
+    assert not profiler.begin_request()
+    profiler.end_request()
+    assert profiler.pstats_bytes() is None and profiler.collapsed_stacks() is None
+    assert not profiler.status()["has_results"]
+
+
+@pytest.mark.parametrize("options", [{"mode": "perf"}, {"requests": 0}, {"sample_rate": 0}, {"interval_ms": 0}])
+def test_invalid_arm(profiler, options):
+    with pytest.raises(ValueError):
+        profiler.arm(**options)
+
+
+def test_profiles_the_next_n_requests(profiler):
+    profiler.arm(requests=2)
+    for _ in range(3):
+        if profiler.begin_request():
+            busy_work()
+            profiler.end_request()
+    status = profiler.status()
+    assert (status["armed"], status["remaining"], status["profiled_requests"]) == (False, 0, 2)
+    assert "busy_work" in profiled_function_names(profiler)
+    assert "busy_work" in profiler.pstats_text(limit=20)
+    assert profiling.stage_target is None
+
+
+def test_stage_limited_profile(profiler):
+    profiler.arm(requests=1, stage="generation")
+    assert profiling.stage_target == "generation"
+    assert profiler.begin_request()
+    with profiler.profile_stage("retrieval"):
+        other_work()
+    with profiler.profile_stage("generation"):
+        busy_work()
+    profiler.end_request()
+    names = profiled_function_names(profiler)
+    assert "busy_work" in names and "other_work" not in names
+    assert profiling.stage_target is None  # Reset once the last selected request finished
+
+
+def test_overlapping_cprofile_requests_are_skipped(profiler):
+    profiler.arm(requests=5)
+    assert profiler.begin_request()
+    result = []
+    # Another request (its own thread and context) arrives while the first is under cProfile
+    thread = threading.Thread(target=lambda: result.append(profiler.begin_request()))
+    thread.start()
+    thread.join()
+    profiler.end_request()
+    assert result == [False]
+    status = profiler.status()
+    assert (status["skipped_busy"], status["profiled_requests"], status["remaining"]) == (1, 1, 4)
+
+
+def test_sampler_collects_stacks(profiler):
+    profiler.arm(requests=1, mode="sampler", interval_ms=1)
+    assert profiler.begin_request()
+    busy_work(0.2)
+    profiler.end_request()
+    stacks = profiler.collapsed_stacks()
+    assert stacks and "busy_work" in stacks
+    assert profiler.status()["samples"] > 0
+    for line in stacks.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0 and ";" in stack
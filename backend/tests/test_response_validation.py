@@ -0,0 +1,77 @@
+"""
+validate_and_clean_response: same responses as the validation in the original app.py
+Expected outputs were produced by the original implementation (whitespace normalized:
+it left double spaces where sentences were rejoined), with random seeded for the closing.
+"""
+import random
+
+import pytest
+
+from response_validation import (validate_and_clean_response, validate_response, EMPTY_RESPONSE_FALLBACK,
+                                 UNSAFE_RESPONSE_FALLBACK)
+
+CRAMPS = "How do I ease cramps?"
+
+BASELINE_CASES = [
+    ("Ibuprofen can help reduce pain!", CRAMPS,
+     "Ibuprofen can help reduce pain! I'm always here to support you with whatever you need."),
+    ("Does your period hurt every month?", CRAMPS,
+     "Does your period hurt every month? I'm always here to support you with whatever you need."),
+    ("Cramps are common. Heat helps a lot!", CRAMPS,
+     "Cramps are common. Heat helps a lot! I'm always here to support you with whatever you need."),
+    ("Cramps are very common during periods. A hot water bottle helps. Rest when you can. Drink plenty of water too",
+     CRAMPS,
+     "Cramps are very common during periods. A hot water bottle helps. Rest when you can. Drink plenty of water too."),
+    ("Cramps happen. Cramps happen. Cramps happen because the uterus contracts", CRAMPS,
+     "Cramps happen. Cramps happen because the uterus contracts. "
+     "I'm always here to support you with whatever you need."),
+    ("Use a warm, detailed, compassionate response. Cramps are caused by prostaglandins", CRAMPS,
+     "Cramps are caused by prostaglandins. I'm always here to support you with whatever you need."),
+    ("Tampons are safe but polycrystic ovaries need a doctor. Change your sampon often", "What is PCOS?",
+     "Tampons are safe but polycystic ovaries need a doctor. Change your tampon often. "
+     "I'm always here to support you with whatever you need."),
+    ("According to the data, periods last 3-7 days. The dataset shows most cycles are regular",
+     "How long is a period?",
+     "I understand, periods last 3-7 days. I understand most cycles are regular. "
+     "I'm always here to support you with whatever you need."),
+    ("Menarche usually happens between the ages of 10 and 16. Cramps are common in the first years",
+     "When is my first period?",
+     "Menarche usually happens between the ages of 10 and 16. Cramps are common in the first years. "
+     "I'm always here to support you with whatever you need."),
+    ("You can swim during your period with a tampon. Sex during periods is fine. Pads work too. Change them often",
+     "Can I swim on my period?",
+     "You can swim during your period with a tampon. Sex during periods is fine. Pads work too. Change them often."),
+    ("You can swim during your period with a tampon. Sex during periods is fine. Pads work too. Change them often",
+     "Can I go to school?",
+     "You can swim during your period with a tampon. Pads work too. Change them often."),
+    ("Cramps are caused by prostaglandins. Heat can relax the muscles. Rest helps. I hope this helps! "
+     "Feel free to ask if you have more questions—I'm here to support you.", CRAMPS,
+     "Cramps are caused by prostaglandins. Heat can relax the muscles. Rest helps. "
+     "I'm always here to support you with whatever you need."),
+]
+
+
+@pytest.mark.parametrize("response, user_input, expected", BASELINE_CASES)
+def test_matches_original_validation(response, user_input, expected):
+    random.seed(0)
+    assert validate_and_clean_response(response, user_input) == expected
+
+
+@pytest.mark.parametrize("ending", ["!", "?"])
+def test_closing_after_terminal_punctuation(ending):
+    cleaned = validate_and_clean_response(f"Ibuprofen can help reduce pain{ending}", CRAMPS)
+    assert cleaned.startswith(f"Ibuprofen can help reduce pain{ending} ")
+    assert f"{ending}." not in cleaned
+
+
+def test_empty_and_echo_only_responses_fall_back():
+    assert validate_response("", CRAMPS) == (EMPTY_RESPONSE_FALLBACK, [])
+    response, fired = validate_response("Follow this exactly. Do not copy or repeat", CRAMPS)
+    assert response == EMPTY_RESPONSE_FALLBACK
+    assert fired
+
+
+def test_unsafe_content_is_replaced():
+    response, fired = validate_response("Cramps are common. You cannot go to school during your period", CRAMPS)
+    assert response == UNSAFE_RESPONSE_FALLBACK
+    assert fired == ["forbids-school"]
@@ -0,0 +1,107 @@
+"""
+Safety rule engine: the shipped rules flag and rewrite the same texts as the
+hard-coded checks in the original app.py, and the engine compiles, matches and
+validates rules of every type
+"""
+import pytest
+
+from response_validation import check_unsafe_content, fix_tampon_safety_info
+from safety_rules import SafetyRuleEngine
+
+PADS_TSS = "Only tampons left in for more than 8 hours can cause TSS. Pads do not cause TSS."
+PADS_TOXIC_SHOCK = "Only tampons left in for more than 8 hours can cause toxic shock syndrome. Pads do not cause TSS."
+
+# (text, flagged as unsafe by the original check_unsafe_content)
+DETECT_CASES = [
+    ("Sex can help with cramps.", True),
+    ("I recommend having sex to ease pain", True),
+    ("Some use sex as a treatment", True),
+    ("You must not go to school during your period", True),
+    ("You cannot attend work while bleeding", True),
+    ("Pads can cause toxic shock syndrome", True),
+    ("PADS CAN CAUSE TSS. Rest well.", True),
+    ("Pads may cause toxic shock if worn long", False),
+    ("Tampons left in too long can cause TSS", False),
+    ("Sexual health matters", False),
+    ("You can go to school", False),
+]
+
+# (text, output of the original fix_tampon_safety_info)
+PADS_REWRITE_CASES = [
+    ("Pads can cause toxic shock syndrome", PADS_TOXIC_SHOCK + " syndrome"),
+    ("Using pads can lead to TSS in rare cases", f"Using {PADS_TSS} in rare cases"),
+    ("Pads may cause toxic shock if worn long", PADS_TOXIC_SHOCK + " if worn long"),
+    ("PADS CAN CAUSE TSS. Rest well.", PADS_TSS + ". Rest well."),
+    ("Change your pad every 4 hours", "Change your pad every 4 hours"),
+]
+
+
+@pytest.mark.parametrize("text, unsafe", DETECT_CASES)
+def test_detect_matches_original(text, unsafe):
+    assert check_unsafe_content(text)[0] is unsafe
+
+
+@pytest.mark.parametrize("text, expected", PADS_REWRITE_CASES)
+def test_pads_rewrite_matches_original(text, expected):
+    assert fix_tampon_safety_info(text) == expected
+
+
+def engine(*rules):
+    return SafetyRuleEngine(list(rules))
+
+
+def test_rules_of_one_type_report_their_ids():
+    rules = engine(
+        {"id": "phrase", "type": "detect", "phrases": ["Bad Advice"]},
+        {"id": "folded", "type": "detect", "ignore_case": True, "phrases": ["never shower"]},
+        {"id": "pattern", "type": "detect", "pattern": r"skip \w+ meals"},
+    )
+    assert rules.detect("This is Bad Advice") == "phrase"
+    assert rules.detect("this is bad advice") is None  # Case-sensitive phrase
+    assert rules.detect("You should NEVER SHOWER") == "folded"
+    assert rules.detect("skip all meals") == "pattern"
+    assert rules.detect("Drink water") is None
+    assert rules.detect("") is None
+
+
+def test_rewrite_is_one_pass_over_all_rules():
+    rules = engine(
+        {"id": "typos", "type": "rewrite", "phrases": {"sampon": "tampon", "polycrystic": "polycystic"}},
+        {"id": "cold", "type": "rewrite", "ignore_case": True, "replacement": "I understand",
+         "phrases": ["the dataset shows"]},
+        {"id": "unit", "type": "rewrite", "pattern": r"\b(\d+) hrs\b", "replacement": "some hours"},
+    )
+    text, fired = rules.rewrite("The Dataset Shows a sampon lasts 8 hrs. Another sampon.")
+    assert text == "I understand a tampon lasts some hours. Another tampon."
+    assert fired == ["cold", "typos", "unit"]
+    assert rules.rewrite("Nothing to change") == ("Nothing to change", [])
+
+
+def test_drop_and_contradiction_rules():
+    rules = engine(
+        {"id": "echo", "type": "drop_sentence", "ignore_case": True, "phrases": ["follow this exactly"]},
+        {"id": "pads", "type": "contradiction", "ignore_case": True,
+         "wrong": r"pads?\s+(can|cause).*tss", "right": r"pads?\s+(do not|cannot).*tss"},
+    )
+    assert rules.drop_match("Follow this EXACTLY please") == "echo"
+    assert rules.drop_match("Rest well") is None
+    assert rules.contradictions("Pads can cause TSS") == []  # Only one half
+    assert [rule.id for rule in rules.contradictions("Pads can cause TSS. Pads do not cause TSS")] == ["pads"]
+
+
+@pytest.mark.parametrize("rules, message", [
+    ([{"id": "a", "type": "block", "phrases": ["x"]}], "unknown type"),
+    ([{"id": "a", "type": "detect", "pattern": "("}], "invalid pattern"),
+    ([{"id": "a", "type": "detect", "pattern": "(?P<name>x)"}], "named groups"),
+    ([{"id": "a", "type": "rewrite", "phrases": ["x"]}], "need a replacement"),
+    ([{"id": "a", "type": "detect", "phrases": ["x"]}, {"id": "a", "type": "detect", "phrases": ["y"]}], "unique"),
+])
+def test_invalid_rules_are_rejected(rules, message):
+    with pytest.raises(ValueError, match=message):
+        SafetyRuleEngine(rules)
+
+
+def test_shipped_rules_load():
+    summary = SafetyRuleEngine.load().summary()
+    assert summary["rules"] == sum(summary["by_type"].values())
+    assert all(summary["by_type"].values())
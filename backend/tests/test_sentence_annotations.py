@@ -0,0 +1,137 @@
+"""
+Sentence annotations and the empathetic fallback: responses built from the
+precomputed annotations of retrieved rows are the ones the original
+create_empathetic_response built by scanning the summarized context text
+"""
+import random
+from collections import namedtuple
+
+import pytest
+
+from context_processing import drop_excluded_sentences, summarize_context
+from empathetic_response import create_empathetic_response
+from sentence_annotations import (SentenceAnnotations, sentence_spans, categorize, sentence_flags, flag_terms,
+                                  TIP, EXPLANATION, DROPPED, SHORT, FLAG_NON_KENYAN, FLAG_PUBERTY, FLAG_FIRST_PERIOD)
+
+Corpus = namedtuple("Corpus", ["texts", "row_ids"])  # The parts of a CorpusStore the annotations use
+
+ROWS = [
+    "Period cramps are caused by prostaglandins that make the uterus contract. A hot water bottle on your lower "
+    "belly can ease the pain. Gentle exercise such as walking may also help.",
+    "Menstruation is the monthly shedding of the lining of the uterus. It usually lasts between three and seven "
+    "days. Talk to a school nurse.",
+    "ASHAs and auxiliary nurse midwives distribute pads in rural India. Change your pad every four to six hours to "
+    "stay fresh and comfortable.",
+    "Irregular cycles are common in the first years after menarche. Keeping a calendar of your periods helps you "
+    "notice patterns over time.",
+    "Short one. Ok.",
+]
+
+CRAMPS = ("Period cramps are caused by prostaglandins that make the uterus contract. A hot water bottle on your "
+          "lower belly can ease the pain. Gentle exercise such as walking may also help.")
+MENSTRUATION = ("Menstruation is the monthly shedding of the lining of the uterus. It usually lasts between three "
+                "and seven days.")
+
+# (retrieved rows, emotion, response of the original implementation with random.seed(0))
+BASELINE_CASES = [
+    ([0], "pain",
+     "I'm sorry you're dealing with this. Period pain is no joke.. " + CRAMPS + " If your pain is severe or really "
+     "interfering with your daily life, it's worth talking to a healthcare provider who can help you find the best "
+     "solution."),
+    ([1, 0], "neutral",
+     "Of course! I'd be happy to explain.. " + MENSTRUATION + " " + CRAMPS + " I hope this helps! Feel free to ask "
+     "if you have more questions."),
+    ([2, 3], "anxious",
+     "It's okay to feel anxious about this — you're not alone in wondering.. Irregular cycles are common in the "
+     "first years after menarche. Change your pad every four to six hours to stay fresh and comfortable. Keeping a "
+     "calendar of your periods helps you notice patterns over time. If you're really worried, don't hesitate to "
+     "reach out to a healthcare provider who can give you personalized advice."),
+    ([4], "sad",
+     "I hear you, and I want to help you feel better. I want to make sure I give you accurate information. Could "
+     "you tell me a bit more about what specifically you'd like to know? I'm here to support you."),
+    ([3, 2, 1], "neutral",
+     "Of course! I'd be happy to explain.. Irregular cycles are common in the first years after menarche. "
+     "Menstruation is the monthly shedding of the lining of the uterus. Keeping a calendar of your periods helps you "
+     "notice patterns over time. Change your pad every four to six hours to stay fresh and comfortable. I hope this "
+     "helps! Feel free to ask if you have more questions."),
+]
+
+
+@pytest.fixture(scope="module")
+def annotations():
+    return SentenceAnnotations.build(Corpus(ROWS, list(range(len(ROWS)))))
+
+
+def retrieved_context(rows):
+    """The context text chat() passes to the fallback for these rows"""
+    return summarize_context(drop_excluded_sentences("\n".join(ROWS[row] for row in rows)), 120)
+
+
+@pytest.mark.parametrize("rows, emotion, expected", BASELINE_CASES)
+def test_fallback_matches_original(annotations, rows, emotion, expected):
+    context = retrieved_context(rows)
+    random.seed(0)
+    assert create_empathetic_response("q", context, emotion, context_rows=rows, annotations=annotations) == expected
+    # Context that did not come from annotated rows is classified on the fly, with the same rules
+    random.seed(0)
+    assert create_empathetic_response("q", context, emotion) == expected
+
+
+def test_fallback_is_translated_in_swahili_mode(annotations):
+    response = create_empathetic_response("q", retrieved_context([0]), "pain", "sw", [0], annotations=annotations,
+                                          translate=lambda text: f"[sw] {text}")
+    assert response.startswith("[sw] ")
+
+    def failing(text):
+        raise RuntimeError("model not loaded")
+
+    # A failing translation keeps the English response
+    random.seed(0)
+    english = create_empathetic_response("q", "", "neutral", "sw", translate=failing)
+    assert english.endswith("I'm here to support you.")
+
+
+def test_sentence_spans():
+    text = "  First part. Second part .. third"
+    assert [text[start:end] for start, end in sentence_spans(text)] == ["First part", "Second part", "third"]
+    assert sentence_spans("") == []
+
+
+@pytest.mark.parametrize("sentence, category", [
+    ("Too short here", SHORT),
+    ("A warm bath relaxes the muscles of the belly", TIP),
+    ("Dysmenorrhea refers to painful menstruation", EXPLANATION),
+    ("Talk to your doctor about it soon", DROPPED),
+    ("Talk to your doctor, who can help you", TIP),
+    ("Long sentence without any keyword at all in it anywhere", EXPLANATION),
+])
+def test_categorize(sentence, category):
+    assert categorize(sentence) == category
+
+
+def test_flags():
+    assert sentence_flags("Programs in rural India") == FLAG_NON_KENYAN
+    assert sentence_flags("Menarche is the first period") == FLAG_PUBERTY | FLAG_FIRST_PERIOD
+    assert sentence_flags("Puberty brings changes") == FLAG_PUBERTY
+    assert "menarche" in flag_terms(FLAG_FIRST_PERIOD) and "rural india" not in flag_terms(FLAG_FIRST_PERIOD)
+
+
+def test_fallback_sentences_skip_flagged_and_unknown_rows(annotations):
+    explanations, tips = annotations.fallback_sentences([2, 99])
+    assert [annotations.text(i) for i in tips] == ["Change your pad every four to six hours to stay fresh and "
+                                                   "comfortable"]
+    assert len(explanations) == 0
+    assert len(annotations.sentence_ids([99])) == 0
+
+
+def test_load_or_build_rebuilds_for_a_changed_corpus(tmp_path):
+    path = str(tmp_path / "sentence_annotations.npz")
+    corpus = Corpus(ROWS, list(range(len(ROWS))))
+    built, rebuilt = SentenceAnnotations.load_or_build(corpus, path)
+    assert rebuilt
+    loaded, rebuilt = SentenceAnnotations.load_or_build(corpus, path)
+    assert not rebuilt and len(loaded) == len(built)
+    assert [loaded.text(i) for i in range(len(loaded))] == [built.text(i) for i in range(len(built))]
+    changed = Corpus(ROWS[:2], [0, 1])
+    assert SentenceAnnotations.load(path, changed) is None
+    assert SentenceAnnotations.load_or_build(changed, path)[1]
@@ -0,0 +1,100 @@
+"""
+Structured logging: JSON lines carry the request id and extra fields, DEBUG
+sampling is all-or-nothing per request, and a full queue drops and counts
+records instead of blocking
+"""
+import json
+import logging
+import queue
+import sys
+import threading
+
+import pytest
+
+import structured_logging
+from structured_logging import (JsonFormatter, TextFormatter, RequestContextFilter, NonBlockingQueueHandler,
+                                LOG_RECORDS_DROPPED, start_request, end_request, current_request_id,
+                                bind_request_context, get_logger)
+
+
+def make_record(level=logging.INFO, msg="hello %s", args=("world",), **extra):
+    record = logging.LogRecord("eunoia.test", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+@pytest.fixture(autouse=True)
+def clean_request():
+    yield
+    end_request()
+
+
+def test_json_lines():
+    start_request("req-1")
+    record = make_record(stage="retrieve", rows=[1, 2])
+    assert RequestContextFilter().filter(record)
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["msg"] == "hello world"
+    assert (entry["level"], entry["logger"], entry["request_id"]) == ("INFO", "eunoia.test", "req-1")
+    assert (entry["stage"], entry["rows"]) == ("retrieve", [1, 2])
+    assert entry["ts"].endswith("+00:00")
+
+
+def test_exceptions_are_included():
+    try:
+        raise ValueError("bad row")
+    except ValueError:
+        record = logging.LogRecord("eunoia.test", logging.ERROR, __file__, 1, "failed", (), sys.exc_info())
+    entry = json.loads(JsonFormatter().format(record))
+    assert "ValueError: bad row" in entry["exc"]
+    assert "request_id" not in entry
+
+
+def test_text_format():
+    line = TextFormatter().format(make_record())
+    assert line.endswith("INFO    eunoia.test [None] hello world")
+
+
+def test_debug_sampling_is_per_request(monkeypatch):
+    filter_ = RequestContextFilter()
+    monkeypatch.setattr(structured_logging, "LOG_DEBUG_SAMPLE_RATE", 0.0)
+    start_request()
+    assert not filter_.filter(make_record(logging.DEBUG))
+    assert filter_.filter(make_record(logging.INFO))
+    monkeypatch.setattr(structured_logging, "LOG_DEBUG_SAMPLE_RATE", 1.0)
+    start_request()
+    assert filter_.filter(make_record(logging.DEBUG))
+
+
+def test_request_ids():
+    generated = start_request()
+    assert current_request_id() == generated and len(generated) == 16
+    assert start_request("given") == "given"
+    end_request()
+    assert current_request_id() is None
+
+
+def test_request_id_follows_bound_callables_to_other_threads():
+    start_request("req-2")
+    seen = []
+    thread = threading.Thread(target=bind_request_context(lambda: seen.append(current_request_id())))
+    thread.start()
+    thread.join()
+    assert seen == ["req-2"]
+
+
+def test_full_queue_drops_and_counts():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    before = LOG_RECORDS_DROPPED.value()
+    handler.emit(make_record())
+    handler.emit(make_record())
+    assert handler.queue.qsize() == 1
+    assert LOG_RECORDS_DROPPED.value() == before + 1
+    # Formatting is left to the listener thread: the queued record still has its arguments
+    assert handler.queue.get_nowait().args == ("world",)
+
+
+def test_loggers_share_the_namespace():
+    root = logging.getLogger("eunoia")
+    assert get_logger("app").name == "eunoia.app"
+    assert get_logger("app").parent is root
@@ -0,0 +1,71 @@
+"""
+naturalize_swahili / preprocess_swahili_query: same output as the sequential
+replacements in the original translation_utils.py, except where a longer phrase
+now wins over a shorter one that used to fire first
+"""
+import pytest
+
+from phrase_rewriter import PhraseRewriter
+from swahili_text import naturalize_swahili, preprocess_swahili_query
+
+LONG = " ".join(["neno"] * 14)
+
+# (input, output of the original implementation)
+NATURALIZE_CASES = [
+    ("Hilo lasikika kuwa vigumu. Ikiwa una maumivu, ni muhimu kuwafikia wafanyakazi wa afya",
+     "Hii inaonekana kuwa vigumu. Kama una maumivu, ni vizuri kuwasiliana na daktari"),
+    ("Tumia chupa ya maji moto kwa ajili ya kutuliza maumivu. kwa hivyo pumzika",
+     "Tumia chupa ya maji ya moto kwa kupunguza maumivu. Pumzika"),
+    ("huduma za simu kwa ajili ya wasichana zinapatikana. utegemezo na uongozi upo",
+     "Huduma za daktari kupitia simu kwa wasichana zinapatikana. Msaada upo"),
+    (f"{LONG} au {LONG}. fupi", f"Neno {LONG[5:]}. Au {LONG}. Fupi"),
+    (f"{LONG} na {LONG}", f"Neno {LONG[5:]}. Na {LONG}"),
+    ("kitulizo ni sawa.  Hii ni sentensi , yenye nafasi .. nyingi", "Faraja sawa. Hii ni sentensi, yenye nafasi. Nyingi"),
+    ("hivyo basi dalili zitadumu", "Dalili zitaendelea"),
+    ("Hedhi ni kawaida", "Hedhi ni kawaida"),
+    ("a", "A"),
+    ("", ""),
+]
+
+QUERY_CASES = [
+    ("Ninasaidia aje maumivu ya hedhi?", "how to help with period pain"),
+    ("PCOS ni nini", "what is PCOS"),
+    ("mbona hedhi yangu imechelewa sana", "why is my period late"),
+    ("kwa njia gani naweza kupunguza maumivu ya tumbo", "how naweza kupunguza stomach pain"),
+    ("eleza maumivu ya cramps", "how to help with explain menstrual cramps"),
+    ("hedhi imekuja mapema", "hedhi came early"),
+    ("Nina maumivu ya hedhi", "how to help with nina period pain"),
+    ("nawezaje kusaidia rafiki", "how can I help with rafiki"),
+    ("ueleze hedhi", "explain to me hedhi"),
+    ("Kwa nini ninapata cramps", "why ninapata cramps"),
+    ("Habari yako", "Habari yako"),
+    ("", ""),
+]
+
+
+@pytest.mark.parametrize("text, expected", NATURALIZE_CASES)
+def test_naturalize_matches_original(text, expected):
+    assert naturalize_swahili(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", QUERY_CASES)
+def test_query_preprocessing_matches_original(text, expected):
+    assert preprocess_swahili_query(text) == expected
+
+
+def test_longest_phrase_wins():
+    # The sequential replaces rewrote the shorter phrase first ("ni mbaya sana", "what is hii")
+    assert naturalize_swahili("Ikiwa dalili zitadumu au ni mbaya zaidi, ongea na mtaalamu wa afya .") == \
+        "Kama dalili zitaendelea au zikibadilika, ongea na daktari."
+    assert preprocess_swahili_query("ni nini hii") == "what is this"
+    assert preprocess_swahili_query("imekuja mapema sana") == "came very early"
+
+
+def test_phrase_rewriter():
+    rewriter = PhraseRewriter({"ab": "1", "abc": "2", "b": "3"})
+    assert rewriter.rewrite("abcab b") == "21 3"
+    assert rewriter.first_match("xxabc") == "2"
+    assert rewriter.first_match("xyz") is None
+    insensitive = PhraseRewriter({"Hedhi": "period"}, case_sensitive=False)
+    assert insensitive.rewrite("HEDHI yangu") == "period yangu"
+    assert PhraseRewriter({}).rewrite("text") == "text"
@@ -0,0 +1,85 @@
+"""
+Tracing: stages become nested spans only inside a traced request, annotations
+and events land on the innermost span, finished traces go to the ring buffer
+"""
+import time
+
+import pytest
+
+import tracing
+from metrics import stage
+from tracing import TraceBuffer, trace_buffer
+
+
+@pytest.fixture(autouse=True)
+def no_open_trace():
+    yield
+    tracing.finish_trace(None)  # Clears the current span even if a test failed mid-trace
+
+
+def test_untraced_requests_record_nothing():
+    assert not tracing.active()
+    with tracing.span("retrieve") as span:
+        assert span is None
+        tracing.annotate(rows=3)
+        tracing.event("fallback")
+    tracing.add_span("manual", time.perf_counter())
+    assert tracing.finish_trace("never-started") is None
+
+
+def test_stages_form_a_tree():
+    tracing.start_trace("trace-1", "chat", user="u")
+    assert tracing.active()
+    with stage("retrieve"):
+        tracing.annotate(rows=[1, 2])
+        with stage("faiss_search"):
+            tracing.event("retry", attempt=2)
+    tracing.add_span("generation", time.perf_counter() - 0.01, candidates=1)
+    tracing.annotate_root("trace-1", outcome="generated")
+    entry = tracing.finish_trace("trace-1")
+    assert not tracing.active()
+
+    root = entry["root"]
+    assert root["name"] == "chat" and root["attrs"] == {"user": "u", "outcome": "generated"}
+    retrieve, generation = root["children"]
+    assert (retrieve["name"], retrieve["attrs"]) == ("retrieve", {"rows": [1, 2]})
+    (search,) = retrieve["children"]
+    assert search["name"] == "faiss_search"
+    assert [(e["name"], e["attempt"]) for e in search["events"]] == [("retry", 2)]
+    assert generation["attrs"] == {"candidates": 1} and generation["duration_ms"] >= 10
+    assert retrieve["start_ms"] <= search["start_ms"]
+    assert entry["duration_ms"] >= retrieve["duration_ms"]
+    assert trace_buffer.get("trace-1") == entry
+
+
+def test_span_closes_on_error():
+    tracing.start_trace("trace-2")
+    with pytest.raises(RuntimeError):
+        with tracing.span("generate"):
+            raise RuntimeError("out of memory")
+    with tracing.span("fallback"):
+        pass
+    names = [child["name"] for child in tracing.finish_trace("trace-2")["root"]["children"]]
+    assert names == ["generate", "fallback"]  # Siblings: the failed span did not stay open
+
+
+def test_ring_buffer():
+    buffer = TraceBuffer(capacity=2)
+    for i, duration in enumerate([5.0, 50.0, 20.0]):
+        buffer.add({"request_id": f"r{i}", "duration_ms": duration})
+    assert [t["request_id"] for t in buffer.list()] == ["r2", "r1"]
+    assert [t["request_id"] for t in buffer.list(min_ms=30)] == ["r1"]
+    assert buffer.list(limit=1) == [{"request_id": "r2", "duration_ms": 20.0}]
+    assert buffer.get("r0") is None
+    assert buffer.stats() == {"buffered": 2, "capacity": 2, "recorded": 3}
+
+
+@pytest.mark.parametrize("header, traced", [("1", True), (" TRUE ", True), ("on", True), ("0", False), (None, False)])
+def test_should_trace_header(monkeypatch, header, traced):
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 0.0)
+    assert tracing.should_trace(header) is traced
+
+
+def test_sampling(monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 1.0)
+    assert tracing.should_trace(None)
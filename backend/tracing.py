@@ -0,0 +1,180 @@
+"""
+Opt-in per-request tracing for /chat
+- A request is traced when it carries "X-Debug-Trace: 1" or is picked by
+  TRACE_SAMPLE_RATE; every metrics.stage()/@timed() block inside it becomes a
+  span, so the trace is a tree of stage timings
+- Code on the request path adds detail with annotate()/event() (retrieval
+  candidates and scores, prompt token counts, decode steps, rules fired, ...);
+  both are no-ops, and active() is False, when the request is not traced
+- Finished traces go into a bounded ring buffer (TRACE_BUFFER_SIZE) that
+  /admin/traces serves as JSON
+"""
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0"))
+TRACE_BUFFER_SIZE = int(os.environ.get("TRACE_BUFFER_SIZE", "200"))
+TRACE_HEADER = "X-Debug-Trace"
+
+_current_span = contextvars.ContextVar("trace_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "start", "end", "attrs", "events", "children")
+
+    def __init__(self, name, start=None, attrs=None):
+        self.name = name
+        self.start = time.perf_counter() if start is None else start
+        self.end = None
+        self.attrs = attrs or {}
+        self.events = []
+        self.children = []
+
+    def to_dict(self, origin):
+        end = self.end if self.end is not None else time.perf_counter()
+        entry = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+        }
+        if self.attrs:
+            entry["attrs"] = self.attrs
+        if self.events:
+            entry["events"] = [{"name": name, "at_ms": round((at - origin) * 1000, 3), **attrs}
+                               for name, at, attrs in self.events]
+        if self.children:
+            entry["children"] = [child.to_dict(origin) for child in self.children]
+        return entry
+
+
+class Trace:
+    def __init__(self, request_id, root):
+        self.request_id = request_id
+        self.started_at = datetime.now().isoformat()
+        self.root = root
+
+    def to_dict(self):
+        root = self.root.to_dict(self.root.start)
+        return {
+            "request_id": self.request_id,
+            "started_at": self.started_at,
+            "duration_ms": root["duration_ms"],
+            "root": root,
+        }
+
+
+class TraceBuffer:
+    """The last `capacity` finished traces, newest last"""
+
+    def __init__(self, capacity=TRACE_BUFFER_SIZE):
+        self._traces = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+    def add(self, trace):
+        with self._lock:
+            self._traces.append(trace)
+            self.recorded += 1
+
+    def get(self, request_id):
+        with self._lock:
+            for trace in reversed(self._traces):
+                if trace["request_id"] == request_id:
+                    return trace
+        return None
+
+    def list(self, limit=50, min_ms=0.0):
+        with self._lock:
+            traces = [trace for trace in reversed(self._traces) if trace["duration_ms"] >= min_ms]
+        return traces[:limit]
+
+    def stats(self):
+        with self._lock:
+            return {"buffered": len(self._traces), "capacity": self._traces.maxlen, "recorded": self.recorded}
+
+
+trace_buffer = TraceBuffer()
+_active_traces = {}  # request_id -> Trace, while the request runs
+
+
+def should_trace(header_value=None):
+    if header_value and header_value.strip().lower() in ("1", "true", "on", "yes"):
+        return True
+    return TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+
+
+def start_trace(request_id, name="request", **attrs):
+    """Make this context's request a trace root; spans opened below it attach to it"""
+    root = Span(name, attrs=attrs)
+    _active_traces[request_id] = Trace(request_id, root)
+    _current_span.set(root)
+    return root
+
+
+def finish_trace(request_id):
+    """Close the trace started for request_id (if any) and move it into the ring buffer"""
+    _current_span.set(None)
+    trace = _active_traces.pop(request_id, None)
+    if trace is None:
+        return None
+    trace.root.end = time.perf_counter()
+    entry = trace.to_dict()
+    trace_buffer.add(entry)
+    return entry
+
+
+def active():
+    """True inside a traced request; guard any work done only to annotate the trace"""
+    return _current_span.get() is not None
+
+
+@contextmanager
+def span(name, **attrs):
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, attrs=attrs)
+    parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def add_span(name, start, end=None, **attrs):
+    """Attach an already timed block (perf_counter start/end) as a child of the current span"""
+    parent = _current_span.get()
+    if parent is None:
+        return
+    child = Span(name, start=start, attrs=attrs)
+    child.end = time.perf_counter() if end is None else end
+    parent.children.append(child)
+
+
+def annotate(**attrs):
+    """Set attributes on the innermost open span"""
+    current = _current_span.get()
+    if current is not None:
+        current.attrs.update(attrs)
+
+
+def annotate_root(request_id, **attrs):
+    trace = _active_traces.get(request_id)
+    if trace is not None:
+        trace.root.attrs.update(attrs)
+
+
+def event(name, **attrs):
+    """A point-in-time record on the innermost open span (a fallback decision, a retry, ...)"""
+    current = _current_span.get()
+    if current is not None:
+        current.events.append((name, time.perf_counter(), attrs))
@@ -0,0 +1,79 @@
+"""
+Train the English/Swahili language identifier used by detect_language
+- Training data: menstrual_data.csv (question, answer) and menstrual_data_sw.csv
+  (question_sw, answer_sw); 10% of rows are held out
+- Saves language_id_model.npz and compares accuracy and speed with langdetect
+  on the held-out questions (short, chat-like texts)
+"""
+import time
+import numpy as np
+import pandas as pd
+from langdetect import detect, DetectorFactory
+from language_id import LanguageIdentifier
+
+MODEL_PATH = "language_id_model.npz"
+HELDOUT_FRACTION = 0.1
+RANDOM_SEED = 42
+
+
+def column_texts(df, column, rows):
+    return [text for text in df[column].iloc[rows].fillna("").tolist() if text.strip()]
+
+
+def time_per_call(fn, texts):
+    start = time.perf_counter()
+    results = [fn(text) for text in texts]
+    return results, (time.perf_counter() - start) / max(len(texts), 1) * 1e6
+
+
+def langdetect_label(text):
+    try:
+        return "sw" if detect(text) in ["sw", "swahili"] else "en"
+    except Exception:
+        return "en"
+
+
+if __name__ == "__main__":
+    df = pd.read_csv("./menstrual_data.csv")
+    df_sw = pd.read_csv("./menstrual_data_sw.csv")
+
+    rng = np.random.default_rng(RANDOM_SEED)
+    rows = rng.permutation(len(df_sw))
+    split = int(len(rows) * (1 - HELDOUT_FRACTION))
+    train_rows, heldout_rows = rows[:split], rows[split:]
+    en_train_rows = np.setdiff1d(np.arange(len(df)), heldout_rows)
+
+    texts_by_label = {
+        "en": column_texts(df, "question", en_train_rows) + column_texts(df, "answer", en_train_rows),
+        "sw": column_texts(df_sw, "question_sw", train_rows) + column_texts(df_sw, "answer_sw", train_rows),
+    }
+    print(f"Training on {len(texts_by_label['en'])} English and {len(texts_by_label['sw'])} Swahili texts...")
+    start = time.perf_counter()
+    identifier = LanguageIdentifier.train(texts_by_label)
+    print(f"✅ Trained in {time.perf_counter() - start:.1f}s")
+
+    identifier.save(MODEL_PATH)
+    start = time.perf_counter()
+    identifier = LanguageIdentifier.load(MODEL_PATH)
+    print(f"✅ Saved {MODEL_PATH} (loads in {(time.perf_counter() - start) * 1000:.1f} ms)")
+
+    # Held-out evaluation on short question texts
+    heldout = [(text, "en") for text in column_texts(df, "question", heldout_rows)]
+    heldout += [(text, "sw") for text in column_texts(df_sw, "question_sw", heldout_rows)]
+    texts = [text for text, _ in heldout]
+    expected = [label for _, label in heldout]
+
+    DetectorFactory.seed = 0
+    langdetect_label(texts[0])  # langdetect loads its profiles on first call
+    ours, ours_us = time_per_call(lambda t: identifier.classify(t)[0], texts)
+    theirs, theirs_us = time_per_call(langdetect_label, texts)
+
+    print("\n" + "=" * 60)
+    print(f"Held-out questions: {len(texts)}")
+    print("=" * 60)
+    for name, predictions, micros in [("language_id", ours, ours_us), ("langdetect", theirs, theirs_us)]:
+        accuracy = np.mean([p == e for p, e in zip(predictions, expected)])
+        per_label = {label: np.mean([p == e for p, e in zip(predictions, expected) if e == label])
+                     for label in ("en", "sw")}
+        print(f"{name:12s} accuracy {accuracy:.4f} (en {per_label['en']:.4f}, sw {per_label['sw']:.4f}), "
+              f"{micros:.1f} µs/message")